@@ -14,7 +14,6 @@
 _BASENAME=/usr/bin/basename
 _CAT=/usr/bin/cat
 _CP=/usr/bin/cp
-_CUT=/usr/bin/cut
 _ECHO=/usr/bin/echo
 _FIND=/usr/bin/find
 _LOGGER=/usr/bin/logger
@@ -22,7 +21,9 @@ _JAVA=/usr/bin/java
 _MKDIR=/usr/bin/mkdir
 _RM=/usr/bin/rm
 _RPM=/usr/bin/rpm
+_RETRY=/usr/bin/retry_policy.py
 _RSYSLOG=/sbin/rsyslogd
+_SORT=/usr/bin/sort
 _ZYPPER=/usr/bin/zypper
 SCRIPT_NAME="$(${_BASENAME} "${0}")"
 
@@ -32,6 +33,12 @@ CUSTOM_TO_BE_INSTALLED_DIR="/etc/opt/ericsson/ERICmodeldeployment/data/execution
 MDC_CLASSPATH="/opt/ericsson/ERICmodeldeploymentclient/lib/*"
 MDC_MAIN_CLASS="com.ericsson.oss.itpf.modeling.model.deployment.client.main.ModelDeploymentClientStart"
 
+# Model deployment is retried only for connection failures to the Model Deployment Service,
+# any other failure ends the job at once. At most MDC_RETRY_MAX_ATTEMPTS attempts are made
+# within MDC_RETRY_DEADLINE seconds, both can be overridden from the job environment.
+export MDC_RETRY_MAX_ATTEMPTS="${MDC_RETRY_MAX_ATTEMPTS:-3}"
+export MDC_RETRY_DEADLINE="${MDC_RETRY_DEADLINE:-300}"
+
 
 # Log at DEBUG level to /var/log/messages only.
 #
@@ -142,28 +149,33 @@ installCopiedModelRpms() {
 }
 
 # Create the directory structure needed for model deployment from the jars installed.
+# The owning RPM name and version of every jar is found with a single rpm query.
 createLayout() {
-    listOfJars="$(${_FIND} "${MODEL_JARS_DIR}" -maxdepth 1 -iname '*.jar')"
+    mapfile -t listOfJars < <(${_FIND} "${MODEL_JARS_DIR}" -maxdepth 1 -iname '*.jar' | ${_SORT})
 
-    if [ -n "${listOfJars}" ]; then
+    if [[ ${#listOfJars[@]} -gt 0 ]]; then
         info "Creating model directory structure for jars in '${MODEL_JARS_DIR}'."
-        for jar in ${listOfJars}; do
-            rpmFullName="$(${_RPM} -qf "${jar}")"
-            debug "Model JAR: '${jar}' is associated with ${rpmFullName}"
+        rpmOwners="$(${_RPM} -qf --queryformat '%{NAME} %{VERSION}\n' "${listOfJars[@]}")"
+        if [[ $? != 0 ]]; then
+            error "Unable to retrieve the owning RPMs of the jars in '${MODEL_JARS_DIR}'."
+            exit 1
+        fi
+        mapfile -t listOfOwners <<< "${rpmOwners}"
+        if [[ ${#listOfOwners[@]} -ne ${#listOfJars[@]} ]]; then
+            error "Unable to match the jars in '${MODEL_JARS_DIR}' to a single owning RPM."
+            exit 1
+        fi
+
+        for index in "${!listOfJars[@]}"; do
+            jar="${listOfJars[${index}]}"
+            read -r rpmName rpmVersion <<< "${listOfOwners[${index}]}"
+            debug "Model JAR: '${jar}' is associated with ${rpmName}-${rpmVersion}"
 
-            rpmName="$(${_ECHO} "${rpmFullName}"| ${_CUT} -d'-' -f1)"
             if [[ -z "${rpmName}" ]]; then
                 error "Unable to retrieve the RPM name of '${jar}'."
                 exit 1
             fi
 
-            rpmVersionWithSuffix="$(${_ECHO} "$rpmFullName" | ${_CUT} -d"-" -f2)"
-            if [[ "${rpmVersionWithSuffix}" == *".noarch"* ]]; then
-                rpmVersion="${rpmVersionWithSuffix%.*}"
-            else
-                rpmVersion="${rpmVersionWithSuffix}"
-            fi
-
             if [[ -z "${rpmVersion}" ]]; then
                 error "Unable to retrieve the RPM version of '${jar}'."
                 exit 1
@@ -201,12 +213,13 @@ cleanUp() {
     cleanUpDirContents "${RPM_DIR}"
 }
 
-# Run model deployment
+# Run model deployment, retrying connection failures with the MDC_RETRY_* retry policy
+# shared with trigger_mdt.py.
 runMdt() {
     javaCmdArgs=(-cp "${MDC_CLASSPATH}" ${MDC_MAIN_CLASS} "${CUSTOM_TO_BE_INSTALLED_DIR}")
 
     info "Starting model deployment with command: '${_JAVA} ${javaCmdArgs[@]}'"
-    ${_JAVA} "${javaCmdArgs[@]}"
+    ${_RETRY} ${_JAVA} "${javaCmdArgs[@]}"
 
     if [[ $? != 0 ]]; then
         error "Model deployment did not complete successfully. Please check '/var/log/mdt.log' for more details."
@@ -7,28 +7,225 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+import os
+import signal
 import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import PIPE
-from typing import List, Optional
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from logger_utils import get_logger
 
 """
-Script to execute shell commands
+Script to execute shell commands.
+
+Commands run in their own process group and can be given a timeout, after which the
+whole group is terminated, then killed. Output is streamed line by line into bounded
+buffers and the wall time of every command is recorded. Many commands can be run
+concurrently with a limit on how many run at once.
 """
 
+RPM_QUERY_TIMEOUT_ENV_KEY = 'MODELS_RPM_QUERY_TIMEOUT'
+DEFAULT_RPM_QUERY_TIMEOUT = 300
+TIMEOUT_RETURNCODE = 124
+
+_MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+_MAX_STDERR_LINES = 50
+_KILL_GRACE_SECONDS = 5
+
 
-def execute_subprocess_command(command_to_run: List,
-                               return_output: bool = False) -> Optional[bytes]:
+class OutputTruncatedError(subprocess.SubprocessError):
     """
-    Executes a command that is passed into this method.
+    Raised when the output of a command is returned but exceeded the output limit
+    """
+
+    def __init__(self, command: List, max_output_bytes: int):
+        super().__init__(f'Output of {command} exceeded {max_output_bytes} bytes')
+        self.command = command
+        self.max_output_bytes = max_output_bytes
+
+
+class CommandResult(NamedTuple):
+    """
+    The outcome of a command. A command that timed out has the returncode 124, as
+    reported by the coreutils 'timeout' command.
+    """
+    command: List
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    seconds: float
+    timed_out: bool
+    stdout_truncated: bool
+
+
+def get_timeout(env_key: str, default: Optional[float]) -> Optional[float]:
+    """
+    Get a command timeout from the environment variable 'env_key' if set, otherwise
+    'default'. A timeout of 0 means no timeout.
+
+    :param env_key: environment variable holding the timeout in seconds
+    :param default: timeout to use when the environment variable is not set
+    :return: the timeout in seconds or None for no timeout
+    """
+    value = os.getenv(env_key)
+    if not value:
+        return default
+    try:
+        timeout = float(value)
+    except ValueError as value_error:
+        raise ValueError(f'{env_key} must be a number, "{value}" supplied') from value_error
+    return timeout if timeout > 0 else None
+
+
+def _read_stdout(pipe, output: bytearray, max_output_bytes: int, truncated: List[bool],
+                 line_callback: Optional[Callable[[bytes], None]]):
+    """
+    Reads a pipe line by line, keeping at most 'max_output_bytes' bytes of it
+    """
+    for line in pipe:
+        if line_callback is not None:
+            line_callback(line)
+        if len(output) + len(line) <= max_output_bytes:
+            output.extend(line)
+        else:
+            truncated[0] = True
+
+
+def _read_stderr(pipe, tail: deque, line_callback: Optional[Callable[[bytes], None]]):
+    """
+    Reads a pipe line by line, keeping its last lines
+    """
+    for line in pipe:
+        if line_callback is not None:
+            line_callback(line)
+        tail.append(line)
+
+
+def _stop_process_group(process: subprocess.Popen):
+    """
+    Terminates the process group of a command, then kills it if it has not exited
+    within the grace period
+    """
+    for stop_signal in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, stop_signal)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+        try:
+            process.wait(_KILL_GRACE_SECONDS)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def run_command(command: List, timeout: Optional[float] = None, capture_stdout: bool = True,
+                max_output_bytes: int = _MAX_OUTPUT_BYTES,
+                max_stderr_lines: int = _MAX_STDERR_LINES,
+                stdout_callback: Optional[Callable[[bytes], None]] = None,
+                stderr_callback: Optional[Callable[[bytes], None]] = None) -> CommandResult:
+    """
+    Runs a command in its own process group, streaming its output line by line.
+
+    :param command: the command to run
+    :param timeout: seconds after which the process group of the command is stopped
+    :param capture_stdout: False to pass stdout through to this process's stdout
+    :param max_output_bytes: the number of leading stdout bytes to keep
+    :param max_stderr_lines: the number of trailing stderr lines to keep
+    :param stdout_callback: called with every stdout line as it is written
+    :param stderr_callback: called with every stderr line as it is written
+    :return: the :class:`CommandResult`
+    """
+    start_time = time.monotonic()
+    output = bytearray()
+    stdout_truncated = [False]
+    stderr_tail = deque(maxlen=max_stderr_lines)
+    timed_out = False
+    with subprocess.Popen(command, stdout=PIPE if capture_stdout else None, stderr=PIPE,
+                          start_new_session=True) as process:
+        readers = [threading.Thread(target=_read_stderr,
+                                    args=(process.stderr, stderr_tail, stderr_callback))]
+        if capture_stdout:
+            readers.append(threading.Thread(
+                target=_read_stdout, args=(process.stdout, output, max_output_bytes,
+                                           stdout_truncated, stdout_callback)))
+        for reader in readers:
+            reader.daemon = True
+            reader.start()
+        try:
+            returncode = process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _stop_process_group(process)
+            returncode = TIMEOUT_RETURNCODE
+        for reader in readers:
+            reader.join(_KILL_GRACE_SECONDS if timed_out else None)
+
+    seconds = time.monotonic() - start_time
+    get_logger('CommandExecutor').debug('%s exited with %i in %.3f seconds%s', command[0],
+                                        returncode, seconds, ' (timed out)' if timed_out else '')
+    return CommandResult(command=list(command), returncode=returncode, stdout=bytes(output),
+                         stderr=b''.join(stderr_tail), seconds=seconds, timed_out=timed_out,
+                         stdout_truncated=stdout_truncated[0])
+
+
+def run_commands(commands: List[List], max_concurrent: int, timeout: Optional[float] = None,
+                 **kwargs) -> List[CommandResult]:
+    """
+    Runs commands with at most 'max_concurrent' of them running at once
+
+    :param commands: the commands to run
+    :param max_concurrent: the maximum number of commands running at once
+    :param timeout: seconds after which the process group of a command is stopped
+    :param kwargs: further arguments of :func:`run_command`
+    :return: the :class:`CommandResult` of every command, in the order of 'commands'
+    """
+    if max_concurrent <= 1 or len(commands) <= 1:
+        return [run_command(command, timeout, **kwargs) for command in commands]
+    with ThreadPoolExecutor(max_workers=min(max_concurrent, len(commands))) as executor:
+        return list(executor.map(lambda command: run_command(command, timeout, **kwargs),
+                                 commands))
+
+
+def check_result(result: CommandResult):
+    """
+    Raises the error of a command that failed
+
+    :param result: the :class:`CommandResult` of the command
+    :return: None
+    """
+    if result.timed_out:
+        raise subprocess.TimeoutExpired(result.command, result.seconds, result.stdout,
+                                        result.stderr)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, result.command, result.stdout,
+                                            result.stderr)
+
+
+def execute_subprocess_command(command_to_run: List, return_output: bool = False,
+                               timeout: Optional[float] = None) -> Optional[bytes]:
+    """
+    Executes a command that is passed into this method. Output that exceeds the output
+    limit is never returned partially, OutputTruncatedError is raised instead.
 
     :param   command_to_run - The command to be executed.
     :param   return_output  - Should the command output be returned.
+    :param   timeout        - Seconds after which the command is stopped, None for no limit.
     :return: result of command or None.
     """
-    if return_output:
-        return subprocess.run(command_to_run, stdout=PIPE, stderr=PIPE, check=True).stdout
-    subprocess.run(command_to_run, stdout=PIPE, stderr=PIPE, check=True)
-    return None
+    result = run_command(command_to_run, timeout, max_output_bytes=_MAX_OUTPUT_BYTES)
+    check_result(result)
+    if not return_output:
+        return None
+    if result.stdout_truncated:
+        get_logger('CommandExecutor').error('Output of %s exceeded %i bytes and was truncated',
+                                            command_to_run[0], _MAX_OUTPUT_BYTES)
+        raise OutputTruncatedError(result.command, _MAX_OUTPUT_BYTES)
+    return result.stdout
 
 
 def call_subprocess_command(command_to_run: List) -> int:
@@ -39,3 +236,26 @@ def call_subprocess_command(command_to_run: List) -> int:
     :return: return code of executed command.
     """
     return subprocess.call(command_to_run)
+
+
+def call_subprocess_command_with_stderr(command_to_run: List,
+                                        max_stderr_lines: int = _MAX_STDERR_LINES,
+                                        timeout: Optional[float] = None) -> Tuple[int, str]:
+    """
+    Executes a command that is passed into this method. The command's stderr is passed
+    through to this process's stderr as it is written and its last lines are kept.
+
+    :param   command_to_run   - The command to be executed.
+    :param   max_stderr_lines - The number of trailing stderr lines to keep.
+    :param   timeout          - Seconds after which the command is stopped, None for no limit.
+    :return: Tuple[return code of executed command, 124 if it timed out, last lines of its
+             stderr]
+    """
+    result = run_command(command_to_run, timeout, capture_stdout=False,
+                         max_stderr_lines=max_stderr_lines,
+                         stderr_callback=lambda line: sys.stderr.write(
+                             line.decode(errors='replace')))
+    stderr = result.stderr.decode(errors='replace')
+    if result.timed_out:
+        stderr += f'Command timed out after {timeout} seconds\n'
+    return result.returncode, stderr
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import errno
+import os
+import shutil
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from worker_pool import get_worker_count, map_in_order
+
+"""
+Copy engine that copies a directory tree with several concurrent file streams,
+suited to network storage where the per file latency dominates
+"""
+
+COPY_WORKERS_ENV_KEY = 'MDT_COPY_WORKERS'
+COPY_BUFFER_SIZE_ENV_KEY = 'MDT_COPY_BUFFER_SIZE'
+COPY_RESUME_ENV_KEY = 'MDT_COPY_RESUME'
+
+_DEFAULT_COPY_WORKERS = 8
+_DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+_UNSUPPORTED_ERRNOS = frozenset([errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                 errno.EBADF, errno.ENOTSUP])
+
+
+class CopyStats(NamedTuple):
+    """
+    Statistics of a copy operation
+    """
+    files: int
+    skipped_files: int
+    bytes: int
+    seconds: float
+
+    @property
+    def files_per_second(self) -> float:
+        """
+        :return: files copied per second
+        """
+        return self.files / max(self.seconds, 1e-6)
+
+    @property
+    def megabytes_per_second(self) -> float:
+        """
+        :return: megabytes copied per second
+        """
+        return self.bytes / 1e6 / max(self.seconds, 1e-6)
+
+
+def is_env_enabled(env_key: str, default: bool) -> bool:
+    """
+    :param env_key: environment variable holding a boolean flag
+    :param default: value used when the environment variable is not set
+    :return: True if the flag is set to 'true', 'yes' or '1'
+    """
+    value = os.getenv(env_key)
+    if not value:
+        return default
+    return value.strip().lower() in ('true', 'yes', '1')
+
+
+def is_copy_resume_enabled() -> bool:
+    """
+    Copies are only resumed when MDT_COPY_RESUME is set. Resuming reuses a staging directory
+    left on the shared MDT mount, which is only safe when no other pod can be copying into it.
+
+    :return: True if copies resume from files already present at the destination
+    """
+    return is_env_enabled(COPY_RESUME_ENV_KEY, False)
+
+
+def walk_subdirectories(directory: str,
+                        subdirectories: Optional[Iterable[str]] = None) -> Iterator[Tuple]:
+    """
+    Walks the trees of some of the subdirectories of a directory
+
+    :param directory: the directory to walk
+    :param subdirectories: the subdirectories to walk, relative to 'directory', all of
+                           'directory' if None. Subdirectories that do not exist are skipped.
+    :return: the (root, directory names, file names) of every directory walked
+    """
+    if subdirectories is None:
+        yield from os.walk(directory)
+        return
+    for subdirectory in sorted(set(subdirectories)):
+        yield from os.walk(os.path.join(directory, subdirectory))
+
+
+def is_file_present(source_path: str, destination_path: str) -> bool:
+    """
+    Checks if a file was already fully copied. A completed copy has the size and
+    modification time of its source, a partial copy does not.
+
+    :param source_path: path of the source file
+    :param destination_path: path of the copied file
+    :return: True if the destination is a complete copy of the source
+    """
+    try:
+        destination_stat = os.stat(destination_path)
+    except OSError:
+        return False
+    source_stat = os.stat(source_path)
+    return destination_stat.st_size == source_stat.st_size and \
+        int(destination_stat.st_mtime) == int(source_stat.st_mtime)
+
+
+class ParallelCopier:
+    """
+    Copies files with a configurable number of concurrent file streams using in-kernel
+    transfers where available
+    """
+
+    def __init__(self, workers: Optional[int] = None, buffer_size: Optional[int] = None,
+                 resume: Optional[bool] = None):
+        self.workers = get_worker_count(COPY_WORKERS_ENV_KEY, _DEFAULT_COPY_WORKERS) \
+            if workers is None else workers
+        self.buffer_size = int(os.getenv(COPY_BUFFER_SIZE_ENV_KEY) or _DEFAULT_BUFFER_SIZE) \
+            if buffer_size is None else buffer_size
+        self.resume = is_copy_resume_enabled() if resume is None else resume
+
+    def _copy_contents(self, source_file, destination_file, size: int):
+        """
+        Copies the file contents with copy_file_range, then sendfile, then a buffered copy,
+        moving to the next method when the kernel or filesystem does not support one
+
+        :param source_file: the source file object opened for binary reading
+        :param destination_file: the destination file object opened for binary writing
+        :param size: the size of the source file
+        :return: None
+        """
+        source_fd = source_file.fileno()
+        destination_fd = destination_file.fileno()
+        copied = 0
+
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while copied < size:
+                    sent = os.copy_file_range(source_fd, destination_fd, self.buffer_size,
+                                              copied, copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+                if copied >= size:
+                    return
+            except OSError as os_error:
+                if os_error.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+
+        if hasattr(os, 'sendfile'):
+            try:
+                os.lseek(destination_fd, copied, os.SEEK_SET)
+                while copied < size:
+                    sent = os.sendfile(destination_fd, source_fd, copied, self.buffer_size)
+                    if sent == 0:
+                        break
+                    copied += sent
+                if copied >= size:
+                    return
+            except OSError as os_error:
+                if os_error.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+
+        source_file.seek(copied)
+        destination_file.seek(copied)
+        shutil.copyfileobj(source_file, destination_file, self.buffer_size)
+
+    def copy_file(self, source_path: str, destination_path: str) -> int:
+        """
+        Copies a single file and its modification time
+
+        :param source_path: path of the file to copy
+        :param destination_path: path of the copy
+        :return: the number of bytes copied
+        """
+        size = os.stat(source_path).st_size
+        with open(source_path, 'rb') as source_file, open(destination_path, 'wb') as \
+                destination_file:
+            self._copy_contents(source_file, destination_file, size)
+            destination_file.truncate(size)
+        shutil.copystat(source_path, destination_path)
+        return size
+
+    def _copy_or_skip(self, paths: Tuple[str, str]) -> int:
+        """
+        :param paths: Tuple[source path, destination path]
+        :return: the number of bytes copied, or -1 if the file was already present
+        """
+        source_path, destination_path = paths
+        if self.resume and is_file_present(source_path, destination_path):
+            return -1
+        return self.copy_file(source_path, destination_path)
+
+    def copy_files(self, files: List[Tuple[str, str]]) -> CopyStats:
+        """
+        Copies files on the pool of workers, skipping files already fully present when
+        resuming. Destination directories must exist.
+
+        :param files: list of Tuple[source path, destination path]
+        :return: the :class:`CopyStats` of the copy
+        """
+        start_time = time.monotonic()
+        copied_bytes = map_in_order(self._copy_or_skip, files, self.workers)
+        skipped_files = copied_bytes.count(-1)
+        return CopyStats(files=len(files) - skipped_files,
+                         skipped_files=skipped_files,
+                         bytes=sum(size for size in copied_bytes if size > 0),
+                         seconds=time.monotonic() - start_time)
+
+    def copy_tree(self, source_directory: str, destination_directory: str,
+                  subdirectories: Optional[Iterable[str]] = None) -> CopyStats:
+        """
+        Copies a directory tree. When resuming, files already fully present at the
+        destination are skipped and destination files not copied are removed.
+
+        :param source_directory: the directory to copy
+        :param destination_directory: the directory to copy to
+        :param subdirectories: only copy these directories, relative to 'source_directory',
+                               the whole tree if None
+        :return: the :class:`CopyStats` of the copy
+        """
+        source_directory = str(source_directory)
+        destination_directory = str(destination_directory)
+        if not os.path.isdir(source_directory):
+            raise FileNotFoundError(errno.ENOENT, 'No such directory', source_directory)
+
+        files = []
+        for root, _, file_names in walk_subdirectories(source_directory, subdirectories):
+            destination_root = os.path.join(destination_directory,
+                                            os.path.relpath(root, source_directory))
+            os.makedirs(destination_root, exist_ok=True)
+            files.extend((os.path.join(root, file_name), os.path.join(destination_root, file_name))
+                         for file_name in sorted(file_names))
+
+        if self.resume:
+            self._remove_extra_files(destination_directory,
+                                     {destination_path for _, destination_path in files})
+        return self.copy_files(files)
+
+    @staticmethod
+    def _remove_extra_files(destination_directory: str, destination_paths):
+        """
+        Removes destination files that are not being copied
+
+        :param destination_directory: the directory being copied to
+        :param destination_paths: the paths of the files being copied to
+        :return: None
+        """
+        for root, _, file_names in os.walk(destination_directory):
+            for file_name in file_names:
+                if os.path.join(root, file_name) not in destination_paths:
+                    os.unlink(os.path.join(root, file_name))
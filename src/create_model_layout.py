@@ -7,14 +7,78 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+import argparse
+import json
 import os
 import sys
+import time
 import pathlib
-from typing import Tuple
-from shutil import move
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from shutil import copy2
 
 from logger_utils import get_logger
-from command_executor import execute_subprocess_command
+from command_executor import check_result, DEFAULT_RPM_QUERY_TIMEOUT, get_timeout, \
+    RPM_QUERY_TIMEOUT_ENV_KEY, run_commands
+from metrics import increment, run_tool, span
+from query_cache import execute_cached_query, get_query_cache, get_rpmdb_identity
+from rpm_header import RpmHeaderError, read_rpm_header
+from rpm_payload import ExtractedRpm, RpmPayloadError, extract_rpm_files
+from worker_pool import get_worker_count, map_in_order
+
+LAYOUT_MODE_ENV_KEY = 'MODELS_LAYOUT_MODE'
+MOVE_LAYOUT_MODE = 'move'
+LINK_LAYOUT_MODE = 'link'
+RPM_OWNER_QUERY = ['rpm', '-qf', '--queryformat', '%{NAME} %{VERSION}\\n']
+
+_LAYOUT_MANIFEST_FORMAT_VERSION = 2
+
+
+class LaidOutJar(NamedTuple):
+    """
+    A jar laid out by an earlier run, as recorded in the layout manifest
+    """
+    jar_path: str
+    size: int
+    mtime: int
+    rpm_name: str
+    rpm_version: str
+
+
+def load_layout_manifest(manifest_path: str) -> Dict[str, LaidOutJar]:
+    """
+    Loads a layout manifest. A manifest that is missing or unreadable is ignored.
+
+    :param: manifest_path - path to the layout manifest
+    :return the laid out jars keyed by jar path
+    """
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest['version'] != _LAYOUT_MANIFEST_FORMAT_VERSION:
+            return {}
+        return {entry['jar_path']: LaidOutJar(**entry) for entry in manifest['jars']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def write_layout_manifest(manifest_path: str, laid_out_jars: Iterable[LaidOutJar]):
+    """
+    Writes the layout manifest
+
+    :param: manifest_path - path to the layout manifest
+    :param: laid_out_jars - the jars laid out
+    :return: None
+    """
+    manifest = {
+        'version': _LAYOUT_MANIFEST_FORMAT_VERSION,
+        'jars': [laid_out_jar._asdict() for laid_out_jar in
+                 sorted(laid_out_jars, key=lambda laid_out_jar: laid_out_jar.jar_path)]
+    }
+    temporary_manifest_path = manifest_path + '.tmp'
+    with open(temporary_manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(temporary_manifest_path, manifest_path)
 
 
 def validate_input_directories(model_jar_location: str):
@@ -52,67 +116,414 @@ def get_model_type() -> str:
     raise EnvironmentError('MODELS_TYPE environment variable not found')
 
 
-def decode_rpm_name(source_rpm_information: bytes) -> Tuple[str, str]:
+def get_layout_mode() -> str:
     """
-    Decodes the rpm command output and returns the rpm name and version
+    Get the layout mode from the 'MODELS_LAYOUT_MODE' env value, 'move' by default.
+    In 'link' mode the jars are hard linked (or copied) and the source jars are kept.
 
-    :param: source_rpm_information - rpm command output
-    :return Tuple[rpm_name, rpm_version]
+    :return the layout mode
+    """
+    layout_mode = os.getenv(LAYOUT_MODE_ENV_KEY) or MOVE_LAYOUT_MODE
+    if layout_mode not in (MOVE_LAYOUT_MODE, LINK_LAYOUT_MODE):
+        raise ValueError(f"{LAYOUT_MODE_ENV_KEY} must be '{MOVE_LAYOUT_MODE}' or "
+                         f"'{LINK_LAYOUT_MODE}'. {layout_mode} supplied")
+    return layout_mode
+
+
+def is_same_filesystem(first_path: str, second_path: str) -> bool:
+    """
+    Checks if two existing paths are on the same filesystem
+
+    :param: first_path - an existing path
+    :param: second_path - an existing path
+    :return True if a rename or hard link between the paths is possible
     """
-    rpm_name = str(source_rpm_information.decode()).split('-')[0]
-    rpm_version = str(source_rpm_information.decode()).split('-')[1]
+    return os.stat(first_path).st_dev == os.stat(second_path).st_dev
 
+
+def place_jar(jar_path: str, target_path: str, layout_mode: str, same_filesystem: bool):
+    """
+    Places a jar at its target path. Within a filesystem the jar is renamed, or hard linked
+    in 'link' mode. Across filesystems it is copied and, unless in 'link' mode, the source
+    is removed.
+
+    :param: jar_path - path of the jar to place
+    :param: target_path - path the jar is placed at
+    :param: layout_mode - 'move' or 'link'
+    :param: same_filesystem - True if the jar and target are on the same filesystem
+    :return: None
+    """
+    if same_filesystem and layout_mode == MOVE_LAYOUT_MODE:
+        os.rename(jar_path, target_path)
+        return
+
+    if os.path.lexists(target_path):
+        os.unlink(target_path)
+    if same_filesystem:
+        os.link(jar_path, target_path)
+    else:
+        copy2(jar_path, target_path)
+        if layout_mode == MOVE_LAYOUT_MODE:
+            os.unlink(jar_path)
+
+
+def decode_rpm_owner(rpm_owner_information: bytes) -> Tuple[str, str]:
+    """
+    Decodes the output of the RPM_OWNER_QUERY for a single file and returns the rpm name
+    and version of its first owner
+
+    :param: rpm_owner_information - rpm command output
+    :return Tuple[rpm_name, rpm_version]
+    """
+    rpm_name, _, rpm_version = rpm_owner_information.decode().partition('\n')[0].partition(' ')
     return rpm_name, rpm_version
 
 
+def get_rpm_owners(file_paths: List[str], chunk_size: int = 1000,
+                   workers: Optional[int] = None) -> Dict[str, Tuple[str, str]]:
+    """
+    Finds the owning RPM name and version of every file with one 'rpm -qf' query per
+    'chunk_size' files, running up to 'workers' queries at once. Owners found by an
+    earlier query of an unchanged file and rpm database are taken from the query cache.
+    A chunk whose answer cannot be matched to its files line by line, e.g. because a
+    file is owned by more than one RPM, is queried again file by file. Every query is
+    stopped after MODELS_RPM_QUERY_TIMEOUT seconds.
+
+    :param: file_paths - paths of the installed files
+    :param: chunk_size - maximum number of files passed to a single query
+    :param: workers - maximum number of concurrent queries, the worker count by default
+    :return Dict[file path, Tuple[rpm_name, rpm_version]]
+    """
+    query_cache = get_query_cache()
+    rpmdb_identity = get_rpmdb_identity()
+    rpm_owners = {}
+    cache_keys = {}
+    for file_path in file_paths:
+        cache_key = query_cache.get_key([*RPM_OWNER_QUERY, file_path], [file_path],
+                                        rpmdb_identity)
+        owner = query_cache.get(cache_key)
+        if owner is None:
+            cache_keys[file_path] = cache_key
+        else:
+            rpm_owners[file_path] = decode_rpm_owner(owner)
+
+    timeout = get_timeout(RPM_QUERY_TIMEOUT_ENV_KEY, DEFAULT_RPM_QUERY_TIMEOUT)
+    uncached_paths = list(cache_keys)
+    chunks = [uncached_paths[chunk_start:chunk_start + chunk_size]
+              for chunk_start in range(0, len(uncached_paths), chunk_size)]
+    results = run_commands([[*RPM_OWNER_QUERY, *chunk] for chunk in chunks],
+                           get_worker_count() if workers is None else workers, timeout)
+
+    for chunk, result in zip(chunks, results):
+        check_result(result)
+        owners = result.stdout.decode().splitlines()
+        if len(owners) == len(chunk):
+            for file_path, owner in zip(chunk, owners):
+                rpm_name, _, rpm_version = owner.partition(' ')
+                rpm_owners[file_path] = (rpm_name, rpm_version)
+                query_cache.put(cache_keys[file_path], f'{owner}\n'.encode())
+        else:
+            for file_path in chunk:
+                rpm_owner_information = execute_cached_query([*RPM_OWNER_QUERY, file_path],
+                                                             [file_path], timeout, True)
+                rpm_owners[file_path] = decode_rpm_owner(rpm_owner_information)
+    return rpm_owners
+
+
+def get_package_file_owners(rpm_paths: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """
+    Finds the owning RPM name and version of the files of RPM packages from their headers,
+    without querying the rpm database. Packages whose header cannot be read and files
+    contained in more than one of the packages are left out, their owners must be queried.
+
+    :param: rpm_paths - paths of the RPM package files
+    :return Dict[file path, Tuple[rpm_name, rpm_version]]
+    """
+    file_owners = {}
+    for rpm_path in rpm_paths:
+        try:
+            header = read_rpm_header(rpm_path)
+        except (OSError, RpmHeaderError):
+            continue
+        for file_name in header.file_names:
+            file_owners.setdefault(file_name, []).append((header.name, header.version))
+    return {file_name: owners[0] for file_name, owners in file_owners.items()
+            if len(Counter(owners)) == 1}
+
+
 class ModelLayoutTool:
     """
     This class is responsible for creating directory structure
     of model JARs for MDT
     """
     _TO_BE_INSTALLED_ROOT_DIRECTORY = "/etc/opt/ericsson/models/toBeInstalled/"
+    _LAYOUT_MANIFEST_FILE = "layout_manifest.json"
 
     def __init__(self):
         self.logger = get_logger(self.__class__.__name__)
 
-    def _create_model_layout(self, model_jar_location: str):
+    def _get_layout_manifest_path(self) -> str:
+        """
+        :return the path of the layout manifest, kept next to the layout root directory
+        """
+        return os.path.join(os.path.dirname(os.path.normpath(
+            str(self._TO_BE_INSTALLED_ROOT_DIRECTORY))), self._LAYOUT_MANIFEST_FILE)
+
+    def _get_target_path(self, laid_out_jar: LaidOutJar) -> str:
+        """
+        :param: laid_out_jar - a jar of the layout manifest
+        :return the path the jar is laid out at
+        """
+        return os.path.join(str(self._TO_BE_INSTALLED_ROOT_DIRECTORY), laid_out_jar.rpm_name,
+                            laid_out_jar.rpm_version, os.path.basename(laid_out_jar.jar_path))
+
+    def _is_laid_out(self, laid_out_jar: Optional[LaidOutJar], jar_stat: os.stat_result) -> bool:
+        """
+        :param: laid_out_jar - the jar as recorded in the layout manifest, if it is
+        :param: jar_stat - the stat of the jar
+        :return True if the jar has not changed since it was laid out and is still in place
+        """
+        return laid_out_jar is not None and laid_out_jar.size == jar_stat.st_size and \
+            laid_out_jar.mtime == jar_stat.st_mtime_ns and \
+            os.path.exists(self._get_target_path(laid_out_jar))
+
+    def _remove_laid_out_jar(self, laid_out_jar: LaidOutJar):
+        """
+        Removes a laid out jar and its /<rpm_name>/<rpm_version>/ directories once empty
+
+        :param: laid_out_jar - a jar of the layout manifest
+        :return: None
+        """
+        target_path = self._get_target_path(laid_out_jar)
+        if os.path.lexists(target_path):
+            os.unlink(target_path)
+        for directory in (os.path.dirname(target_path),
+                          os.path.dirname(os.path.dirname(target_path))):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+
+    def _remove_stale_jars(self, manifest: Dict[str, LaidOutJar], model_jar_location: str,
+                           rpm_owners: Dict[str, Tuple[str, str]], layout_mode: str) -> int:
+        """
+        Removes the laid out jars of the model directory that were replaced by a jar of
+        another RPM or version, or that were removed from the model directory. In 'move'
+        mode a jar is expected to be gone from the model directory once laid out, it is only
+        forgotten when its laid out copy is gone too.
+
+        :param: manifest - the layout manifest, updated in place
+        :param: model_jar_location - location of the model jars
+        :param: rpm_owners - owning RPM name and version of the jars being laid out
+        :param: layout_mode - 'move' or 'link'
+        :return the number of jars removed from the layout
+        """
+        removed_jars = 0
+        for jar_path, laid_out_jar in list(manifest.items()):
+            if os.path.dirname(jar_path) != model_jar_location:
+                continue
+            if jar_path in rpm_owners:
+                if rpm_owners[jar_path] != (laid_out_jar.rpm_name, laid_out_jar.rpm_version):
+                    self._remove_laid_out_jar(laid_out_jar)
+            elif not os.path.lexists(jar_path) and (
+                    layout_mode == LINK_LAYOUT_MODE or
+                    not os.path.exists(self._get_target_path(laid_out_jar))):
+                self._remove_laid_out_jar(laid_out_jar)
+                del manifest[jar_path]
+                removed_jars += 1
+        return removed_jars
+
+    def _update_layout_manifest(self, manifest: Dict[str, LaidOutJar],
+                                jar_stats: Dict[str, os.stat_result],
+                                rpm_owners: Dict[str, Tuple[str, str]]):
+        """
+        Records the jars laid out in the layout manifest. A manifest that cannot be written
+        is logged and not raised, the next run then lays out every jar again.
+
+        :param: manifest - the layout manifest
+        :param: jar_stats - the stat of every jar laid out, taken before it was placed
+        :param: rpm_owners - owning RPM name and version of every jar laid out
+        :return: None
+        """
+        for jar_path, (rpm_name, rpm_version) in rpm_owners.items():
+            manifest[jar_path] = LaidOutJar(jar_path=jar_path, size=jar_stats[jar_path].st_size,
+                                            mtime=jar_stats[jar_path].st_mtime_ns,
+                                            rpm_name=rpm_name, rpm_version=rpm_version)
+        manifest_path = self._get_layout_manifest_path()
+        try:
+            write_layout_manifest(manifest_path, manifest.values())
+        except OSError as os_error:
+            self.logger.warning('Unable to write layout manifest %s: %s', manifest_path,
+                                os_error)
+
+    def _create_model_layout(self, model_jar_location: str,
+                             known_owners: Optional[Dict[str, Tuple[str, str]]] = None):
         """
         Lays out the jars in the supplied directories in the format of:
         /<rpm_name>/<rpm_version>/<jars>
 
+        Jars that have not changed since an earlier run laid them out, as recorded in the
+        layout manifest, are not laid out again. Laid out jars that were replaced or
+        removed are removed from the layout.
+
         :param: model_jar_location - location of the model jar
+        :param: known_owners - owning RPM name and version of files already known, e.g. from
+                               :func:`get_package_file_owners`, the other jars are queried
         :return: None
         """
         self.logger.info('Supplied directory: %s', model_jar_location)
         self.logger.info('Starting create model layout...')
         model_type = get_model_type()
-        jars = 0
+        layout_mode = get_layout_mode()
 
-        for jar_file in os.listdir(model_jar_location):
-            jars += 1
-            command = ['rpm', '-qf', str(model_jar_location) + '/' + jar_file]
-            source_rpm_information = execute_subprocess_command(command, True)
+        model_jar_location = os.path.abspath(model_jar_location)
+        manifest = load_layout_manifest(self._get_layout_manifest_path())
+        jar_stats = {os.path.join(model_jar_location, jar_file):
+                     os.stat(os.path.join(model_jar_location, jar_file))
+                     for jar_file in sorted(os.listdir(model_jar_location))}
+        unchanged_jar_paths = {jar_path for jar_path, jar_stat in jar_stats.items()
+                               if self._is_laid_out(manifest.get(jar_path), jar_stat)}
+        jar_paths = [jar_path for jar_path in jar_stats if jar_path not in unchanged_jar_paths]
 
-            rpm_name, rpm_version = decode_rpm_name(source_rpm_information)
-            rpm_dir = pathlib.Path(self._TO_BE_INSTALLED_ROOT_DIRECTORY, rpm_name, rpm_version)
+        known_owners = known_owners or {}
+        rpm_owners = {jar_path: known_owners[jar_path]
+                      for jar_path in jar_paths if jar_path in known_owners}
+        unknown_jar_paths = [jar_path for jar_path in jar_paths if jar_path not in rpm_owners]
+        with span('rpm_owner_query', jars=len(unknown_jar_paths)):
+            rpm_owners.update(get_rpm_owners(unknown_jar_paths))
 
-            rpm_dir.mkdir(parents=True, exist_ok=True)
-            move(str(model_jar_location) + '/' + jar_file, rpm_dir)
+        start_time = time.monotonic()
+        with span('layout', layout_mode=layout_mode):
+            removed_jars = self._remove_stale_jars(manifest, model_jar_location, rpm_owners,
+                                                   layout_mode)
+            jars, jar_bytes = self._lay_out_jars(model_jar_location, jar_paths, rpm_owners,
+                                                 layout_mode)
+            if layout_mode == MOVE_LAYOUT_MODE:
+                for jar_path in unchanged_jar_paths:
+                    os.unlink(jar_path)
+        elapsed_seconds = max(time.monotonic() - start_time, 1e-6)
+        with span('layout_manifest', jars=jars):
+            self._update_layout_manifest(manifest, jar_stats, rpm_owners)
+        increment('jars_laid_out', jars)
+        increment('jar_bytes_laid_out', jar_bytes)
+        increment('jars_unchanged', len(unchanged_jar_paths))
+        increment('jars_removed', removed_jars)
 
         self.logger.info('Create model layout complete, '
                          '%i jars setup to deploy for model type %s', jars, model_type)
+        self.logger.info('Laid out %i jars (%.1f MB) in %.2f seconds using %s mode: '
+                         '%.1f jars/s, %.1f MB/s', jars, jar_bytes / 1e6, elapsed_seconds,
+                         layout_mode, jars / elapsed_seconds, jar_bytes / 1e6 / elapsed_seconds)
+        self.logger.info('%i jars unchanged since the last layout, %i removed from the layout',
+                         len(unchanged_jar_paths), removed_jars)
+
+    def _lay_out_jars(self, model_jar_location: str, jar_paths: List[str],
+                      rpm_owners: Dict[str, Tuple[str, str]], layout_mode: str) -> Tuple[int, int]:
+        """
+        Places every jar in its /<rpm_name>/<rpm_version>/ directory, creating each directory
+        once. Copies across filesystems are run on a pool of workers.
+
+        :param: model_jar_location - location of the model jars
+        :param: jar_paths - paths of the jars to lay out
+        :param: rpm_owners - owning RPM name and version of every jar
+        :param: layout_mode - 'move' or 'link'
+        :return Tuple[number of jars laid out, total size of the jars in bytes]
+        """
+        root_directory = pathlib.Path(self._TO_BE_INSTALLED_ROOT_DIRECTORY)
+        root_directory.mkdir(parents=True, exist_ok=True)
+        same_filesystem = is_same_filesystem(model_jar_location, str(root_directory))
 
-    def generate_layout(self):
+        created_directories = set()
+        placements = []
+        jar_bytes = 0
+        for jar_path in jar_paths:
+            rpm_name, rpm_version = rpm_owners[jar_path]
+            rpm_dir = root_directory.joinpath(rpm_name, rpm_version)
+            if rpm_dir not in created_directories:
+                rpm_dir.mkdir(parents=True, exist_ok=True)
+                created_directories.add(rpm_dir)
+            jar_bytes += os.stat(jar_path).st_size
+            placements.append((jar_path, str(rpm_dir.joinpath(os.path.basename(jar_path)))))
+
+        workers = 1 if same_filesystem else get_worker_count()
+        map_in_order(lambda placement: place_jar(*placement, layout_mode, same_filesystem),
+                     placements, workers)
+        return len(placements), jar_bytes
+
+    def _extract_rpm(self, rpm_path: str, model_jar_location: str) -> Optional[ExtractedRpm]:
+        """
+        :param: rpm_path - path of the RPM package file
+        :param: model_jar_location - the directory the package installs its jars in
+        :return the :class:`ExtractedRpm` or None if its payload could not be read
+        """
+        try:
+            return extract_rpm_files(rpm_path, model_jar_location,
+                                     str(self._TO_BE_INSTALLED_ROOT_DIRECTORY))
+        except (OSError, RpmHeaderError, RpmPayloadError) as error:
+            self.logger.warning('Unable to extract %s, it will be installed: %s', rpm_path,
+                                error)
+            return None
+
+    def extract_layout(self, rpm_paths: List[str], model_jar_location: str) -> List[str]:
+        """
+        Lays out the jars of RPM packages by extracting them from the package payloads
+        straight into /<rpm_name>/<rpm_version>/, without installing the packages. The
+        packages are extracted on a pool of workers.
+
+        :param: rpm_paths - paths of the RPM package files
+        :param: model_jar_location - the directory the packages install their jars in
+        :return the names of the RPMs extracted, the others must be installed
+        """
+        self.logger.info('Starting extract model layout of %i RPMs...', len(rpm_paths))
+        model_type = get_model_type()
+        pathlib.Path(self._TO_BE_INSTALLED_ROOT_DIRECTORY).mkdir(parents=True, exist_ok=True)
+
+        start_time = time.monotonic()
+        with span('extract_layout', rpms=len(rpm_paths)):
+            extracted_rpms = [extracted_rpm for extracted_rpm in map_in_order(
+                lambda rpm_path: self._extract_rpm(rpm_path, model_jar_location), rpm_paths,
+                get_worker_count()) if extracted_rpm is not None]
+        elapsed_seconds = max(time.monotonic() - start_time, 1e-6)
+        jar_paths = [jar_path for extracted_rpm in extracted_rpms
+                     for jar_path in extracted_rpm.file_paths]
+        jar_bytes = sum(os.stat(jar_path).st_size for jar_path in jar_paths)
+        increment('rpms_extracted', len(extracted_rpms))
+        increment('jars_laid_out', len(jar_paths))
+        increment('jar_bytes_laid_out', jar_bytes)
+
+        self.logger.info('Extract model layout complete, %i jars of %i RPMs setup to deploy '
+                         'for model type %s', len(jar_paths), len(extracted_rpms), model_type)
+        self.logger.info('Extracted %i jars (%.1f MB) in %.2f seconds: %.1f jars/s, %.1f MB/s',
+                         len(jar_paths), jar_bytes / 1e6, elapsed_seconds,
+                         len(jar_paths) / elapsed_seconds, jar_bytes / 1e6 / elapsed_seconds)
+        return [extracted_rpm.name for extracted_rpm in extracted_rpms]
+
+    def generate_layout(self, model_jar_location: Optional[str] = None,
+                        known_owners: Optional[Dict[str, Tuple[str, str]]] = None):
         """
         Main object function to: validate input directory & layout model jar contents
 
+        :param: model_jar_location - location of the model jars, the first script argument
+                                     by default
+        :param: known_owners - owning RPM name and version of files already known
         :return: None
         """
-        model_jar_location = sys.argv[1]
+        if model_jar_location is None:
+            model_jar_location = sys.argv[1]
         validate_input_directories(model_jar_location)
-        self._create_model_layout(model_jar_location)
+        self._create_model_layout(model_jar_location, known_owners)
+
+
+def main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Lay out the installed model jars by owning '
+                                                 'RPM for MDT')
+    parser.add_argument('model_jar_location', help='the installed model directory')
+    ModelLayoutTool().generate_layout(parser.parse_args(arguments).model_jar_location)
 
 
 if __name__ == '__main__':
-    model_layout_tool = ModelLayoutTool()
-    model_layout_tool.generate_layout()
+    run_tool('create_model_layout', main)
@@ -7,12 +7,290 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+import argparse
+import json
+import os
+import time
 import xml.etree.ElementTree as ET
-from subprocess import CalledProcessError
-from typing import List
+from typing import Dict, Iterable, List, NamedTuple, Optional
 
 from logger_utils import get_logger
-from command_executor import execute_subprocess_command
+from metrics import increment, run_tool, span
+from repo_classifier import RepoClassifier, get_model_categories, get_model_directory_types, \
+    get_rpm_categories
+from repo_metadata import RepoMetadataError, compare_versions, read_package_file_lists, \
+    read_package_versions
+from retry_policy import RETRYABLE, FailureClassifier, RetryError, RetryPolicy, run_with_retry
+from rpm_header import RpmHeaderError, is_rpm_complete, read_rpm_header_values, RPMTAG_NAME, \
+    RPMTAG_RELEASE, RPMTAG_VERSION
+
+CHUNK_SIZE_ENV_KEY = 'MODELS_DOWNLOAD_CHUNK_SIZE'
+DOWNLOAD_RETRY_ENV_PREFIX = 'MODELS_DOWNLOAD_RETRY'
+
+_DEFAULT_CHUNK_SIZE = 200
+_MANIFEST_FORMAT_VERSION = 1
+_ZYPPER_FATAL_EXIT_CODES = (2, 3, 5, 104)
+_ZYPPER_FATAL_PATTERNS = (r'not found in package names',)
+_ZYPPER_RETRYABLE_PATTERNS = (r'System management is locked', r'Download \(curl\) error',
+                              r'Timeout exceeded')
+
+
+class ChunkResult(NamedTuple):
+    """
+    Outcome of downloading one chunk of RPMs
+    """
+    rpms: List[str]
+    attempts: int
+    bytes: int
+    seconds: float
+    error: Optional[str]
+
+
+class CachedRpm(NamedTuple):
+    """
+    A complete RPM in the zypper package cache
+    """
+    path: str
+    version: str
+
+
+class PackageDelta(NamedTuple):
+    """
+    The model packages added, removed, changed and unchanged since a previous build
+    """
+    added: List[str]
+    removed: List[str]
+    changed: List[str]
+    unchanged: List[str]
+
+
+def _get_local_name(tag: str) -> str:
+    """
+    Get the tag name of an element without its namespace
+
+    :param tag: the element tag, e.g. '{http://www.ericsson.com/litp}model-package'
+    :return: the tag name without namespace, e.g. 'model-package'
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def get_model_package_versions(deployment_descriptors: Iterable[str]) \
+        -> Dict[str, Optional[str]]:
+    """
+    Streams the deployment descriptors and extracts the names of their model packages,
+    with the version and release when the descriptor pins them. Elements are freed as
+    soon as they have been parsed so memory use stays flat regardless of descriptor size.
+
+    :param deployment_descriptors: paths of the deployment descriptors
+    :return: the '<version>[-<release>]' or None of every model package keyed by name,
+             in descriptor order
+    """
+    model_packages = {}
+    for deployment_descriptor in deployment_descriptors:
+        depth = 0
+        package_depth = None
+        root = None
+        for event, element in ET.iterparse(deployment_descriptor, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if root is None:
+                    root = element
+                if package_depth is None and _get_local_name(element.tag) == 'model-package':
+                    package_depth = depth
+                continue
+
+            if depth == package_depth:
+                _add_model_package(element, model_packages)
+                package_depth = None
+            if package_depth is None:
+                element.clear()
+            if depth == 2:
+                root.clear()
+            depth -= 1
+    return model_packages
+
+
+def _add_model_package(package: ET.Element, model_packages: Dict[str, Optional[str]]):
+    """
+    Adds a model-package element of a deployment descriptor to 'model_packages'
+
+    :param package: the model-package element
+    :param model_packages: the versions of the model packages keyed by name
+    :return: None
+    """
+    properties = {_get_local_name(package_entry.tag): package_entry.text.strip()
+                  for package_entry in package if package_entry.text}
+    if not properties.get('name'):
+        return
+    version = properties.get('version') or None
+    if version and properties.get('release'):
+        version = f"{version}-{properties['release']}"
+    if model_packages.get(properties['name']) is None:
+        model_packages[properties['name']] = version
+
+
+def get_model_packages(deployment_descriptors: Iterable[str]) -> List[str]:
+    """
+    Streams the deployment descriptors and extracts the names of their model packages
+
+    :param deployment_descriptors: paths of the deployment descriptors
+    :return: the union of the model package names, without duplicates, in descriptor order
+    """
+    return list(get_model_package_versions(deployment_descriptors))
+
+
+def is_same_version(expected_version: str, version: str) -> bool:
+    """
+    :param expected_version: '<version>-<release>', or '<version>' to accept any release
+    :param version: the '<version>-<release>' to check
+    :return: True if 'version' is the expected version
+    """
+    if '-' not in expected_version:
+        version = version.partition('-')[0]
+    return compare_versions(expected_version, version) == 0
+
+
+def get_package_delta(previous_packages: Dict[str, Optional[str]],
+                      packages: Dict[str, Optional[str]]) -> PackageDelta:
+    """
+    Compares the model packages of a previous build with the current ones. A package is
+    changed when both builds know its version and the versions differ.
+
+    :param previous_packages: the versions, or None, of the previous packages keyed by name
+    :param packages: the versions, or None, of the current packages keyed by name
+    :return: the :class:`PackageDelta`
+    """
+    added, changed, unchanged = [], [], []
+    for name, version in packages.items():
+        if name not in previous_packages:
+            added.append(name)
+        elif version and previous_packages[name] and \
+                not is_same_version(version, previous_packages[name]):
+            changed.append(name)
+        else:
+            unchanged.append(name)
+    removed = [name for name in previous_packages if name not in packages]
+    return PackageDelta(added=added, removed=removed, changed=changed, unchanged=unchanged)
+
+
+def load_package_manifest(manifest_path: str) -> Dict[str, Optional[str]]:
+    """
+    :param manifest_path: path of a package manifest written by a previous build
+    :return: the versions, or None, of the packages of the manifest keyed by name
+    """
+    with open(manifest_path, 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('version') != _MANIFEST_FORMAT_VERSION:
+        raise ValueError(f'Unsupported package manifest format in {manifest_path}')
+    return dict(manifest['packages'])
+
+
+def write_package_manifest(manifest_path: str, packages: Dict[str, Optional[str]]):
+    """
+    Writes the package manifest of a build
+
+    :param manifest_path: path of the package manifest
+    :param packages: the versions, or None, of the packages keyed by name
+    :return: None
+    """
+    temporary_manifest_path = manifest_path + '.tmp'
+    with open(temporary_manifest_path, 'w') as manifest_file:
+        json.dump({'version': _MANIFEST_FORMAT_VERSION, 'packages': packages}, manifest_file,
+                  indent=1)
+    os.replace(temporary_manifest_path, manifest_path)
+
+
+def read_allow_list(allow_list_path: str) -> List[str]:
+    """
+    Reads an RPM allow-list file, one RPM name per line. Blank lines and lines starting
+    with '#' are ignored.
+
+    :param allow_list_path: path of the allow-list file
+    :return: the RPM names of the allow-list
+    """
+    with open(allow_list_path, 'r') as allow_list_file:
+        return [line.strip() for line in allow_list_file
+                if line.strip() and not line.strip().startswith('#')]
+
+
+def get_cached_rpms(cache_path: str, known_rpms: Optional[Dict[str, CachedRpm]] = None) \
+        -> Dict[str, CachedRpm]:
+    """
+    Finds the RPMs already in the zypper package cache. Only packages that are complete,
+    i.e. whose headers parse and whose size matches the size in their signature, are
+    returned. Incomplete packages are removed so that they are downloaded again.
+
+    :param cache_path: the zypper package cache directory of the repository
+    :param known_rpms: RPMs found by an earlier call, their headers are not read again
+    :return: the latest complete version of every cached RPM keyed by package name
+    """
+    known_paths = {} if known_rpms is None else {
+        known_rpm.path: name for name, known_rpm in known_rpms.items()}
+    cached_rpms = {}
+    for root, _, file_names in os.walk(cache_path):
+        for file_name in sorted(file_names):
+            if not file_name.endswith('.rpm'):
+                continue
+            rpm_path = os.path.join(root, file_name)
+            if rpm_path in known_paths:
+                name = known_paths[rpm_path]
+                cached_rpms[name] = known_rpms[name]
+                continue
+            try:
+                if not is_rpm_complete(rpm_path):
+                    os.unlink(rpm_path)
+                    continue
+                values = read_rpm_header_values(rpm_path, (RPMTAG_NAME, RPMTAG_VERSION,
+                                                           RPMTAG_RELEASE))
+                name = values[RPMTAG_NAME]
+            except (RpmHeaderError, OSError, KeyError):
+                continue
+            version = f"{values.get(RPMTAG_VERSION, '')}-{values.get(RPMTAG_RELEASE, '')}"
+            if name not in cached_rpms or \
+                    compare_versions(version, cached_rpms[name].version) > 0:
+                cached_rpms[name] = CachedRpm(path=rpm_path, version=version)
+    return cached_rpms
+
+
+def get_chunk_size() -> int:
+    """
+    :return: the maximum number of RPMs in a download chunk, MODELS_DOWNLOAD_CHUNK_SIZE or 200
+    """
+    value = os.getenv(CHUNK_SIZE_ENV_KEY)
+    if not value:
+        return _DEFAULT_CHUNK_SIZE
+    try:
+        chunk_size = int(value)
+    except ValueError as value_error:
+        raise ValueError(f'{CHUNK_SIZE_ENV_KEY} must be an integer, "{value}" supplied') \
+            from value_error
+    if chunk_size < 1:
+        raise ValueError(f'{CHUNK_SIZE_ENV_KEY} must be at least 1, "{value}" supplied')
+    return chunk_size
+
+
+def split_into_chunks(rpms: List[str], chunk_size: int) -> List[List[str]]:
+    """
+    :param rpms: the RPMs to download
+    :param chunk_size: the maximum number of RPMs in a chunk
+    :return: the RPMs split into chunks, in order
+    """
+    return [rpms[index:index + chunk_size] for index in range(0, len(rpms), chunk_size)]
+
+
+def _get_cache_size(cache_path: str) -> int:
+    """
+    :param cache_path: the zypper package cache directory of the repository
+    :return: the total size in bytes of the files in the cache
+    """
+    total_size = 0
+    for root, _, file_names in os.walk(cache_path):
+        for file_name in file_names:
+            try:
+                total_size += os.stat(os.path.join(root, file_name)).st_size
+            except OSError:
+                continue
+    return total_size
 
 
 class RpmDownloadTool:
@@ -22,53 +300,237 @@ class RpmDownloadTool:
     """
     _DEPLOYMENT_DESCRIPTOR = "/ericsson/deploymentDescriptions/" \
                             "extraLarge/extraLarge__production_IPv4_dd.xml"
+    _ZYPPER_CACHE_PATH = "/var/cache/zypp/packages/enm_iso_repo"
+    _REPO_METADATA_PATH = "/var/cache/zypp/raw/enm_iso_repo"
+    _PACKAGE_MANIFEST_PATH = "/etc/opt/ericsson/models/model_package_manifest.json"
+    _RETRY_POLICY_DEFAULTS = {'max_attempts': 3, 'initial_delay': 10, 'max_delay': 60,
+                              'deadline': 1800, 'attempt_timeout': 900}
 
-    def __init__(self):
+    def __init__(self, deployment_descriptors: Optional[List[str]] = None,
+                 category: Optional[str] = None, allow_list: Optional[List[str]] = None,
+                 previous_packages: Optional[Dict[str, Optional[str]]] = None):
+        categories = get_model_categories()
+        if category is not None and category not in categories:
+            raise ValueError(f'Unknown model category "{category}", expected one of '
+                             f'{sorted(categories)}')
+        self.deployment_descriptors = deployment_descriptors
+        self.category = None if category is None else categories[category]
+        self.allow_list = allow_list
+        self.previous_packages = previous_packages
         self.logger = get_logger(self.__class__.__name__)
 
-    def __download_rpms(self, rpms: List):
+    def _download_chunk(self, rpms: List[str], policy: RetryPolicy,
+                        cache_size: int) -> ChunkResult:
         """
-        Download supplied model RPMs
+        Downloads a chunk of RPMs into the zypper cache, retrying transient failures
 
-        :param   rpms - A list of model RPMs to download
-        :return: None
+        :param rpms: the RPMs of the chunk
+        :param policy: the :class:`RetryPolicy` applied to the chunk
+        :param cache_size: the size in bytes of the zypper cache before the chunk
+        :return: the :class:`ChunkResult` of the chunk
         """
         download_command = ["zypper", "in", "--download-only", "-y"]
         download_command.extend(rpms)
+        classifier = FailureClassifier(_ZYPPER_FATAL_EXIT_CODES, _ZYPPER_FATAL_PATTERNS,
+                                       _ZYPPER_RETRYABLE_PATTERNS, unclassified=RETRYABLE)
 
-        try:
-            execute_subprocess_command(download_command)
+        start_time = time.monotonic()
+        attempts, error = 0, None
+        with span('download_chunk', rpms=len(rpms)):
+            try:
+                attempts = run_with_retry(download_command, policy, self.logger, classifier)
+            except RetryError as retry_error:
+                attempts, error = retry_error.attempts, str(retry_error)
+            except OSError as os_error:
+                error = f'Unable to run zypper: {os_error}'
+        result = ChunkResult(rpms=rpms, attempts=attempts,
+                             bytes=max(_get_cache_size(self._ZYPPER_CACHE_PATH) - cache_size, 0),
+                             seconds=time.monotonic() - start_time, error=error)
+        increment('download_attempts', attempts)
+        increment('bytes_downloaded', result.bytes)
+        if error is None:
+            increment('rpms_downloaded', len(rpms))
+        return result
+
+    def __download_rpms(self, rpms: List, expected_versions: Dict[str, Optional[str]],
+                        cached_rpms: Dict[str, CachedRpm]) -> List[str]:
+        """
+        Download supplied model RPMs. RPMs already complete in the zypper cache at their
+        expected version are skipped, the others are downloaded in chunks so that a failure
+        only retries its own chunk.
+
+        :param   rpms - A list of model RPMs to download
+        :param   expected_versions - The expected version, or None, of each RPM
+        :param   cached_rpms - The RPMs in the zypper cache, those removed are dropped from it
+        :return: the RPMs skipped because they were already in the zypper cache
+        """
+        rpms_to_download = []
+        for rpm in rpms:
+            cached_rpm = cached_rpms.get(rpm)
+            if cached_rpm is not None and expected_versions.get(rpm) and \
+                    not is_same_version(expected_versions[rpm], cached_rpm.version):
+                self.logger.info('Cached %s %s is not the expected version %s', rpm,
+                                 cached_rpm.version, expected_versions[rpm])
+                os.unlink(cached_rpm.path)
+                del cached_rpms[rpm]
+                cached_rpm = None
+            if cached_rpm is None:
+                rpms_to_download.append(rpm)
+        download_set = set(rpms_to_download)
+        skipped_rpms = [rpm for rpm in rpms if rpm not in download_set]
+        increment('rpms_cached', len(skipped_rpms))
+        self.logger.info('RPMs already in the zypper cache count: %s', len(skipped_rpms))
+        if not rpms_to_download:
             self.logger.info("Model RPMs downloaded successfully")
-        except CalledProcessError as zypper_error:
-            self.logger.error(f"Model RPMs download failed: {zypper_error.stderr}")
-            raise SystemExit(2) from zypper_error
+            return skipped_rpms
+
+        policy = RetryPolicy.from_env(DOWNLOAD_RETRY_ENV_PREFIX, **self._RETRY_POLICY_DEFAULTS)
+        chunks = split_into_chunks(rpms_to_download, get_chunk_size())
+        failed_chunks = []
+        cache_size = _get_cache_size(self._ZYPPER_CACHE_PATH)
+        for chunk_number, chunk in enumerate(chunks, 1):
+            result = self._download_chunk(chunk, policy, cache_size)
+            cache_size += result.bytes
+            self.logger.info('Chunk %i/%i: %i RPMs, %i attempt(s), %.1f MB in %.1f seconds',
+                             chunk_number, len(chunks), len(chunk), result.attempts,
+                             result.bytes / 1e6, result.seconds)
+            if result.error:
+                self.logger.error('Chunk %i/%i download failed: %s', chunk_number,
+                                  len(chunks), result.error)
+                failed_chunks.append(result)
 
-    @staticmethod
-    def __get_all_model_rpms(root_element: ET.Element) -> List:
+        if failed_chunks:
+            failed_rpms = [rpm for result in failed_chunks for rpm in result.rpms]
+            self.logger.error(f"Model RPMs download failed for {len(failed_chunks)} chunk(s): "
+                              f"{failed_rpms}")
+            raise SystemExit(2)
+        self.logger.info("Model RPMs downloaded successfully")
+        return skipped_rpms
+
+    def download_packages(self, rpms: List[str]):
         """
-        Find all model RPMs.
+        Downloads the supplied RPMs, unless already in the zypper cache at the expected version
 
-        :param  root_element - root element of the deployment descriptor
-        :return: A list of model RPMs found in the deployment descriptor
+        :param rpms: the names of the RPMs to download
+        :return: None
         """
-        rpms = []
+        self.__download_rpms(rpms, self._get_expected_versions(dict.fromkeys(rpms)),
+                             get_cached_rpms(self._ZYPPER_CACHE_PATH))
 
-        for entry in root_element.findall('.//'):
-            if 'model-package' in str(entry):
-                for model_entry in entry:
-                    rpms.append(model_entry.text)
+    def _filter_by_category(self, rpms: List[str]) -> Optional[List[str]]:
+        """
+        Keeps the RPMs of the selected category, deciding from the file lists in the repo
+        metadata. RPMs missing from the metadata are kept so that zypper reports them.
 
-        return rpms
+        :param rpms: the RPMs to filter
+        :return: the RPMs of the category, or None if the repo metadata could not be read
+        """
+        try:
+            file_lists = read_package_file_lists(self._REPO_METADATA_PATH, set(rpms))
+        except RepoMetadataError as metadata_error:
+            self.logger.warning('Repo metadata unavailable, RPMs outside category %s are '
+                                'removed after download: %s', self.category.name,
+                                metadata_error)
+            return None
 
-    @staticmethod
-    def __get_root_element(xml_file: str) -> ET.Element:
+        categories = {self.category.name: self.category}
+        return [rpm for rpm in rpms if rpm not in file_lists or get_rpm_categories(
+            rpm, get_model_directory_types('\n'.join(file_lists[rpm]),
+                                           [self.category.model_directory_type]),
+            categories)]
+
+    def _prune_cache(self, model_rpms: List[str]):
         """
-        Get root element of XML file
-        :param xml: Path to an XML file
-        :return: root of XML tree
+        Removes the model RPMs outside the selected category from the zypper cache. Other
+        RPMs, e.g. the dependencies zypper downloaded with the model RPMs, are kept.
+
+        :param model_rpms: the model RPMs that were downloaded
+        :return: None
         """
-        tree = ET.parse(xml_file)
-        return tree.getroot()
+        classification = RepoClassifier(self._ZYPPER_CACHE_PATH,
+                                        categories={self.category.name: self.category}).classify()
+        category_rpms = set(classification.get_rpms(self.category.name))
+        model_rpms = set(model_rpms)
+        pruned_count = 0
+        for rpm in classification.rpms:
+            if rpm.name in model_rpms and rpm.name not in category_rpms:
+                os.unlink(os.path.join(self._ZYPPER_CACHE_PATH, rpm.rpm_file))
+                pruned_count += 1
+        self.logger.info('Model RPMs outside category %s removed from the zypper cache count: %s',
+                         self.category.name, pruned_count)
+
+    def _select_rpms(self, rpms: List[str]) -> List[str]:
+        """
+        Applies the allow-list to the RPMs of the deployment descriptors
+
+        :param rpms: the RPMs of the deployment descriptors
+        :return: the RPMs in the allow-list, all RPMs if there is no allow-list
+        """
+        if self.allow_list is None:
+            return rpms
+        allowed_rpms = set(self.allow_list)
+        missing_rpms = sorted(allowed_rpms.difference(rpms))
+        if missing_rpms:
+            self.logger.warning('RPMs in the allow-list but not in the deployment '
+                                'descriptors: %s', missing_rpms)
+        return [rpm for rpm in rpms if rpm in allowed_rpms]
+
+    def _get_expected_versions(self, packages: Dict[str, Optional[str]]) \
+            -> Dict[str, Optional[str]]:
+        """
+        Resolves the version of each package, from the deployment descriptors when pinned
+        there, otherwise from the repo metadata
+
+        :param packages: the versions, or None, of the packages in the deployment descriptors
+        :return: the versions, or None when unknown, of the packages keyed by name
+        """
+        try:
+            repo_versions = read_package_versions(self._REPO_METADATA_PATH, set(packages))
+        except RepoMetadataError as metadata_error:
+            self.logger.debug('Package versions unavailable from repo metadata: %s',
+                              metadata_error)
+            repo_versions = {}
+        return {name: version or repo_versions.get(name) for name, version in packages.items()}
+
+    def _apply_package_delta(self, packages: Dict[str, Optional[str]],
+                             cached_rpms: Dict[str, CachedRpm]) -> PackageDelta:
+        """
+        Compares the packages with the previous build and removes the cached RPMs of the
+        packages it had that are no longer wanted
+
+        :param packages: the versions, or None, of the packages being downloaded
+        :param cached_rpms: the RPMs in the zypper cache, those removed are dropped from it
+        :return: the :class:`PackageDelta`
+        """
+        delta = get_package_delta(self.previous_packages, packages)
+        self.logger.info('Model packages since previous build: %i added, %i removed, '
+                         '%i changed, %i unchanged', len(delta.added), len(delta.removed),
+                         len(delta.changed), len(delta.unchanged))
+        self.logger.debug('Added: %s, removed: %s, changed: %s', delta.added, delta.removed,
+                          delta.changed)
+
+        for rpm in delta.removed:
+            if rpm in cached_rpms:
+                os.unlink(cached_rpms.pop(rpm).path)
+        return delta
+
+    def _report_delta(self, delta: PackageDelta, skipped_rpms: List[str]):
+        """
+        Reports the packages whose download was skipped on an upgrade
+
+        :param delta: the :class:`PackageDelta` from the previous build
+        :param skipped_rpms: the RPMs found in the zypper cache
+        :return: None
+        """
+        skipped = set(skipped_rpms)
+        reused_rpms = [rpm for rpm in delta.unchanged if rpm in skipped]
+        missing_rpms = [rpm for rpm in delta.unchanged if rpm not in skipped]
+        self.logger.info('Unchanged RPMs reused from the zypper cache count: %s',
+                         len(reused_rpms))
+        self.logger.debug('Unchanged RPMs reused from the zypper cache: %s', reused_rpms)
+        if missing_rpms:
+            self.logger.info('Unchanged RPMs missing from the zypper cache and downloaded: %s',
+                             missing_rpms)
 
     def download_model_rpms(self):
         """
@@ -77,15 +539,108 @@ class RpmDownloadTool:
         :return: None
         """
         self.logger.info('Starting download of model RPMs...')
-        root_element = self.__get_root_element(self._DEPLOYMENT_DESCRIPTOR)
-        model_rpms_to_download = self.__get_all_model_rpms(root_element)
+        deployment_descriptors = self.deployment_descriptors or [self._DEPLOYMENT_DESCRIPTOR]
+        self.logger.info('Deployment descriptors: %s', deployment_descriptors)
+        with span('descriptor_parse'):
+            packages = get_model_package_versions(deployment_descriptors)
+        model_rpms_to_download = self._select_rpms(list(packages))
+
+        prune_after_download = False
+        if self.category is not None:
+            category_rpms = self._filter_by_category(model_rpms_to_download)
+            prune_after_download = category_rpms is None
+            if category_rpms is not None:
+                self.logger.info('RPMs outside category %s skipped count: %s',
+                                 self.category.name,
+                                 len(model_rpms_to_download) - len(category_rpms))
+                model_rpms_to_download = category_rpms
+
+        expected_versions = self._get_expected_versions(
+            {rpm: packages[rpm] for rpm in model_rpms_to_download})
+        cached_rpms = get_cached_rpms(self._ZYPPER_CACHE_PATH)
+        delta = None
+        if self.previous_packages is not None:
+            delta = self._apply_package_delta(expected_versions, cached_rpms)
+
         self.logger.debug('RPMs being downloaded: %s', model_rpms_to_download)
         self.logger.info('RPMs being downloaded count: %s', len(model_rpms_to_download))
 
-        self.__download_rpms(model_rpms_to_download)
+        skipped_rpms = self.__download_rpms(model_rpms_to_download, expected_versions,
+                                            cached_rpms)
+        if delta is not None:
+            self._report_delta(delta, skipped_rpms)
+        if prune_after_download:
+            self._prune_cache(model_rpms_to_download)
+        if len(skipped_rpms) < len(model_rpms_to_download) or prune_after_download:
+            cached_rpms = get_cached_rpms(self._ZYPPER_CACHE_PATH, cached_rpms)
+        self._write_package_manifest(model_rpms_to_download, cached_rpms)
         self.logger.info('Finished download of model RPMs...')
 
+    def _write_package_manifest(self, rpms: List[str], cached_rpms: Dict[str, CachedRpm]):
+        """
+        Records the version of every downloaded package so that a later build can download
+        only what changed
 
-if __name__ == '__main__':
-    rpm_download_tool = RpmDownloadTool()
+        :param rpms: the downloaded RPMs
+        :param cached_rpms: the RPMs in the zypper cache after the download
+        :return: None
+        """
+        try:
+            write_package_manifest(self._PACKAGE_MANIFEST_PATH, {
+                rpm: cached_rpms[rpm].version if rpm in cached_rpms else None for rpm in rpms})
+        except OSError as os_error:
+            self.logger.warning('Unable to write package manifest %s: %s',
+                                self._PACKAGE_MANIFEST_PATH, os_error)
+
+
+def _get_previous_packages(arguments: argparse.Namespace) -> Optional[Dict[str, Optional[str]]]:
+    """
+    :param arguments: the parsed command line arguments
+    :return: the packages of the previous build, or None when no previous build was supplied
+    """
+    if arguments.previous_manifest:
+        return load_package_manifest(arguments.previous_manifest)
+    if arguments.previous_descriptors:
+        return get_model_package_versions(arguments.previous_descriptors)
+    return None
+
+
+def parse_arguments(arguments: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Download the model RPMs of the deployment '
+                                                 'descriptors into the zypper cache')
+    parser.add_argument('deployment_descriptors', nargs='*',
+                        help='deployment descriptors, the extraLarge descriptor by default')
+    parser.add_argument('--category', choices=sorted(get_model_categories()),
+                        help='only download the RPMs of this model category')
+    parser.add_argument('--allow-list', dest='allow_list',
+                        help='file listing the only RPMs to download, one name per line')
+    previous_build = parser.add_mutually_exclusive_group()
+    previous_build.add_argument('--previous-descriptor', dest='previous_descriptors',
+                                action='append',
+                                help='deployment descriptor of the previous build, only '
+                                     'packages added or changed since are downloaded')
+    previous_build.add_argument('--previous-manifest', dest='previous_manifest',
+                                help='package manifest written by the previous build, only '
+                                     'packages added or changed since are downloaded')
+    return parser.parse_args(arguments)
+
+
+def main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    download_arguments = parse_arguments(arguments)
+    rpm_download_tool = RpmDownloadTool(
+        download_arguments.deployment_descriptors, download_arguments.category,
+        read_allow_list(download_arguments.allow_list) if download_arguments.allow_list else None,
+        _get_previous_packages(download_arguments))
     rpm_download_tool.download_model_rpms()
+
+
+if __name__ == '__main__':
+    run_tool('download_rpms', main)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+from typing import Callable, Optional
+
+"""
+Utility script to wait for a file to be created. Creation is watched with inotify
+on the parent directory, with an adaptive polling fallback for filesystems where
+inotify does not report changes, such as network storage changed by another host.
+"""
+
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_CREATE = 0x00000100
+_IN_MOVED_TO = 0x00000080
+_IN_ATTRIB = 0x00000004
+_EVENT_BUFFER_SIZE = 4096
+
+
+class _Inotify:
+    """
+    Minimal inotify binding watching a single directory for created entries
+    """
+
+    def __init__(self):
+        self.fd = -1
+        self._libc = None
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                                     use_errno=True)
+            self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        except (OSError, AttributeError):
+            self.fd = -1
+
+    @property
+    def available(self) -> bool:
+        """
+        :return: True if inotify could be initialised
+        """
+        return self.fd >= 0
+
+    def watch(self, directory: str) -> bool:
+        """
+        :param directory: the directory to watch for created entries
+        :return: True if the watch was added
+        """
+        if not self.available:
+            return False
+        mask = _IN_CREATE | _IN_MOVED_TO | _IN_ATTRIB
+        return self._libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) >= 0
+
+    def wait(self, timeout: float):
+        """
+        Waits up to 'timeout' seconds for an event and discards the pending events
+
+        :param timeout: maximum number of seconds to wait
+        :return: None
+        """
+        readable, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if readable:
+            try:
+                while os.read(self.fd, _EVENT_BUFFER_SIZE):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        """
+        Closes the inotify file descriptor
+
+        :return: None
+        """
+        if self.available:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def wait_for_file(file_path: str, timeout: Optional[float] = None,
+                  min_poll_interval: float = 0.1, max_poll_interval: float = 5.0,
+                  progress_callback: Optional[Callable[[float], None]] = None,
+                  progress_interval: float = 60.0) -> float:
+    """
+    Waits until 'file_path' exists, returning as soon as it is created
+
+    :param file_path: the path of the file to wait for
+    :param timeout: maximum number of seconds to wait, None to wait forever
+    :param min_poll_interval: first polling interval in seconds, doubled after each poll
+    :param max_poll_interval: maximum polling interval in seconds
+    :param progress_callback: called with the seconds waited every 'progress_interval' seconds
+    :param progress_interval: seconds between calls of 'progress_callback'
+    :return: the number of seconds waited
+    """
+    start_time = time.monotonic()
+    deadline = None if timeout is None else start_time + timeout
+    next_progress = start_time + progress_interval
+    poll_interval = min(min_poll_interval, max_poll_interval)
+    inotify = _Inotify()
+    watching = False
+    try:
+        while True:
+            if not watching:
+                watching = inotify.watch(os.path.dirname(os.path.abspath(str(file_path))))
+            if os.path.exists(file_path):
+                return time.monotonic() - start_time
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise TimeoutError(f'{file_path} was not created within {timeout} seconds')
+            if progress_callback is not None and now >= next_progress:
+                progress_callback(now - start_time)
+                next_progress = now + progress_interval
+
+            wait_seconds = poll_interval if deadline is None else min(poll_interval,
+                                                                      deadline - now)
+            if watching:
+                inotify.wait(wait_seconds)
+            else:
+                time.sleep(wait_seconds)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+    finally:
+        inotify.close()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import errno
+import hashlib
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from copy_engine import ParallelCopier, walk_subdirectories
+from worker_pool import get_worker_count, map_in_order
+
+"""
+Content addressed store of model jars on the MDT mount. Each distinct jar is written
+to network storage once, staging directories are populated with hard links into the store.
+"""
+
+JAR_STORE_ENV_KEY = 'MDT_JAR_STORE'
+JAR_STORE_RETENTION_DAYS_ENV_KEY = 'MDT_JAR_STORE_RETENTION_DAYS'
+
+_DEFAULT_RETENTION_DAYS = 30
+_HASH_BUFFER_SIZE = 1024 * 1024
+_LINK_UNSUPPORTED_ERRNOS = frozenset([errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP,
+                                      errno.EOPNOTSUPP])
+
+
+class StageStats(NamedTuple):
+    """
+    Statistics of staging a directory tree through the jar store
+    """
+    files: int
+    stored_files: int
+    stored_bytes: int
+    linked_files: int
+    seconds: float
+
+
+def hash_file(file_path: str) -> str:
+    """
+    :param file_path: path of the file to hash
+    :return: the hex SHA-256 digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as hashed_file:
+        for block in iter(lambda: hashed_file.read(_HASH_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class JarStore:
+    """
+    Content addressed store of files keyed by the SHA-256 digest of their content
+    """
+
+    def __init__(self, store_directory: str, copier: Optional[ParallelCopier] = None,
+                 workers: Optional[int] = None):
+        self.store_directory = str(store_directory)
+        self.copier = ParallelCopier() if copier is None else copier
+        self.workers = get_worker_count() if workers is None else workers
+
+    def get_store_path(self, digest: str) -> str:
+        """
+        :param digest: the hex digest of a file
+        :return: the path of the file in the store
+        """
+        return os.path.join(self.store_directory, digest[:2], digest)
+
+    def hash_files(self, file_paths: List[str]) -> Dict[str, str]:
+        """
+        Hashes files on a pool of workers
+
+        :param file_paths: paths of the files to hash
+        :return: the digest of every file keyed by path
+        """
+        return dict(zip(file_paths, map_in_order(hash_file, file_paths, self.workers)))
+
+    def _store_file(self, file_and_digest: Tuple[str, str]) -> Optional[int]:
+        """
+        Writes a file into the store unless the store already holds its content. The file is
+        written under a unique temporary name and renamed so that a partial write is never
+        used, also when pods share the store.
+
+        :param file_and_digest: Tuple[path of the file, digest of the file]
+        :return: the number of bytes written to the store, or None if it was already stored
+        """
+        file_path, digest = file_and_digest
+        store_path = self.get_store_path(digest)
+        try:
+            os.utime(store_path)
+            return None
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', prefix=f'{digest}.',
+                                                           dir=os.path.dirname(store_path))
+        os.close(file_descriptor)
+        try:
+            size = self.copier.copy_file(file_path, temporary_path)
+            os.utime(temporary_path)
+            os.replace(temporary_path, store_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+        return size
+
+    def _link_file(self, file_digest_and_staging_path: Tuple[str, str, str]) -> bool:
+        """
+        Hard links a stored file into a staging directory, copying it when the storage does
+        not support hard links. A stored file pruned by another pod since it was stored is
+        stored again.
+
+        :param file_digest_and_staging_path: Tuple[path of the file, digest of the file,
+                                             path in the staging dir]
+        :return: True if the file was linked, False if it was copied
+        """
+        file_path, digest, staging_path = file_digest_and_staging_path
+        store_path = self.get_store_path(digest)
+        if os.path.lexists(staging_path):
+            if os.path.exists(store_path) and os.path.samefile(store_path, staging_path):
+                return True
+            os.unlink(staging_path)
+        try:
+            try:
+                os.link(store_path, staging_path)
+            except FileNotFoundError:
+                self._store_file((file_path, digest))
+                os.link(store_path, staging_path)
+            return True
+        except OSError as os_error:
+            if os_error.errno not in _LINK_UNSUPPORTED_ERRNOS:
+                raise
+        self.copier.copy_file(store_path, staging_path)
+        return False
+
+    def stage_tree(self, source_directory: str, staging_directory: str,
+                   subdirectories: Optional[Iterable[str]] = None) -> StageStats:
+        """
+        Populates a staging directory with the tree of 'source_directory'. Files whose content
+        is not yet in the store are written to it once, every staged file is a hard link to
+        its stored copy.
+
+        :param source_directory: the local directory tree to stage
+        :param staging_directory: the staging directory on the mount
+        :param subdirectories: only stage these directories, relative to 'source_directory',
+                               the whole tree if None
+        :return: the :class:`StageStats` of the operation
+        """
+        start_time = time.monotonic()
+        source_directory = str(source_directory)
+        staging_directory = str(staging_directory)
+        if not os.path.isdir(source_directory):
+            raise FileNotFoundError(errno.ENOENT, 'No such directory', source_directory)
+
+        relative_paths = []
+        for root, _, file_names in walk_subdirectories(source_directory, subdirectories):
+            relative_root = os.path.relpath(root, source_directory)
+            os.makedirs(os.path.join(staging_directory, relative_root), exist_ok=True)
+            relative_paths.extend(os.path.normpath(os.path.join(relative_root, file_name))
+                                  for file_name in sorted(file_names))
+
+        source_paths = [os.path.join(source_directory, relative_path)
+                        for relative_path in relative_paths]
+        digests = self.hash_files(source_paths)
+
+        unique_files = {}
+        for source_path in source_paths:
+            unique_files.setdefault(digests[source_path], source_path)
+        stored_bytes = map_in_order(self._store_file,
+                                    [(source_path, digest)
+                                     for digest, source_path in unique_files.items()],
+                                    self.copier.workers)
+
+        linked = map_in_order(self._link_file,
+                              [(source_path, digests[source_path],
+                                os.path.join(staging_directory, relative_path))
+                               for source_path, relative_path in zip(source_paths,
+                                                                     relative_paths)],
+                              self.copier.workers)
+        self._remove_extra_files(staging_directory, set(relative_paths))
+
+        return StageStats(files=len(source_paths),
+                          stored_files=sum(1 for size in stored_bytes if size is not None),
+                          stored_bytes=sum(size for size in stored_bytes if size is not None),
+                          linked_files=sum(1 for is_linked in linked if is_linked),
+                          seconds=time.monotonic() - start_time)
+
+    @staticmethod
+    def _remove_extra_files(staging_directory: str, relative_paths):
+        """
+        Removes files left in a reused staging directory that are not part of the staged tree
+
+        :param staging_directory: the staging directory on the mount
+        :param relative_paths: the paths of the staged files relative to the staging directory
+        :return: None
+        """
+        for root, _, file_names in os.walk(staging_directory):
+            relative_root = os.path.relpath(root, staging_directory)
+            for file_name in file_names:
+                if os.path.normpath(os.path.join(relative_root, file_name)) not in relative_paths:
+                    os.unlink(os.path.join(root, file_name))
+
+    def prune(self, retention_days: Optional[float] = None) -> int:
+        """
+        Removes stored files that no staging directory links to and that have not been
+        used for 'retention_days' days. The change time is taken into account so that a
+        file another pod is writing or linking is kept.
+
+        :param retention_days: days an unused file is kept, MDT_JAR_STORE_RETENTION_DAYS or
+                               30 days by default
+        :return: the number of files removed
+        """
+        if retention_days is None:
+            retention_days = float(os.getenv(JAR_STORE_RETENTION_DAYS_ENV_KEY)
+                                   or _DEFAULT_RETENTION_DAYS)
+        oldest_kept = time.time() - retention_days * 24 * 60 * 60
+
+        removed = 0
+        for root, _, file_names in os.walk(self.store_directory):
+            for file_name in file_names:
+                store_path = os.path.join(root, file_name)
+                try:
+                    store_stat = os.stat(store_path)
+                    if store_stat.st_nlink == 1 and \
+                            max(store_stat.st_mtime, store_stat.st_ctime) < oldest_kept:
+                        os.unlink(store_path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
@@ -7,15 +7,35 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+import atexit
 import logging
+import os
+import queue
 import subprocess
+import threading
+import time
 from logging import StreamHandler
-from logging.handlers import SysLogHandler
+from logging.handlers import QueueHandler, QueueListener, SysLogHandler
+from typing import Optional
 
 """
 Utility script that creates a :class:`logging.Logger`.
+
+Logging is configured once per process. Records for syslog are handed to a queue and
+written by a background thread, so a slow or missing syslog socket never blocks the caller.
+When the syslog socket is not ready yet, e.g. right after rsyslogd starts, connecting to it
+is retried on later calls.
 """
 
+_PROC_PATH = '/proc'
+_SYSLOG_ADDRESS = '/dev/log'
+_SYSLOG_RETRY_INTERVAL = 5
+
+_LOGGING_LOCK = threading.Lock()
+_logging_configured = False
+_syslog_listener = None
+_next_syslog_attempt = 0.0
+
 
 def get_logger(logger_name):
     """
@@ -24,14 +44,86 @@ def get_logger(logger_name):
     :param   logger_name: Name of logger
     :return: :class:`logging.Logger` object
     """
-    _enable_syslog()
+    _configure_logging()
+    return logging.getLogger(logger_name)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[_get_syslog_handler(),
-                  _get_console_log_handler()])
 
-    return logging.getLogger(logger_name)
+def _configure_logging() -> Optional[QueueListener]:
+    """
+    Configures the root logger with a console handler and a queue handler feeding syslog.
+    The console handler is configured once per process. While syslog is unavailable,
+    connecting to it is retried at most every _SYSLOG_RETRY_INTERVAL seconds.
+
+    :return: the :class:`logging.handlers.QueueListener` writing to syslog, or None if
+             syslog is unavailable
+    """
+    # pylint: disable=global-statement
+    global _logging_configured, _syslog_listener, _next_syslog_attempt
+    with _LOGGING_LOCK:
+        if _logging_configured and (_syslog_listener is not None or
+                                    time.monotonic() < _next_syslog_attempt):
+            return _syslog_listener
+
+        if not _logging_configured:
+            _enable_syslog()
+        syslog_queue_handler = None
+        syslog_handler = _get_syslog_handler()
+        if syslog_handler is not None:
+            log_queue = queue.Queue()
+            _syslog_listener = QueueListener(log_queue, syslog_handler)
+            _syslog_listener.start()
+            atexit.register(_syslog_listener.stop)
+            syslog_queue_handler = QueueHandler(log_queue)
+        _next_syslog_attempt = time.monotonic() + _SYSLOG_RETRY_INTERVAL
+
+        if not _logging_configured:
+            handlers = [_get_console_log_handler()]
+            if syslog_queue_handler is not None:
+                handlers.append(syslog_queue_handler)
+            logging.basicConfig(level=logging.INFO, handlers=handlers)
+            _logging_configured = True
+        elif syslog_queue_handler is not None:
+            logging.getLogger().addHandler(syslog_queue_handler)
+        return _syslog_listener
+
+
+def _reset_logging():
+    """
+    Stops writing to syslog and forgets the logging configuration, so that the next call of
+    :func:`_configure_logging` configures logging again
+
+    :return: None
+    """
+    # pylint: disable=global-statement
+    global _logging_configured, _syslog_listener, _next_syslog_attempt
+    with _LOGGING_LOCK:
+        if _syslog_listener is not None:
+            atexit.unregister(_syslog_listener.stop)
+            _syslog_listener.stop()
+        _logging_configured = False
+        _syslog_listener = None
+        _next_syslog_attempt = 0.0
+
+
+def _is_process_running(process_name: str) -> bool:
+    """
+    Checks if a process is running by reading /proc, without forking
+
+    :param   process_name: Name of the process, as in /proc/<pid>/comm
+    :return: True if a process with that name is running
+    """
+    try:
+        pids = [pid for pid in os.listdir(_PROC_PATH) if pid.isdigit()]
+    except OSError:
+        return False
+    for pid in pids:
+        try:
+            with open(os.path.join(_PROC_PATH, pid, 'comm'), 'r') as comm_file:
+                if comm_file.read().strip() == process_name:
+                    return True
+        except OSError:
+            continue
+    return False
 
 
 def _enable_syslog():
@@ -40,8 +132,11 @@ def _enable_syslog():
 
     :return: None
     """
-    if subprocess.call(['/usr/bin/pgrep', 'rsyslogd']) != 0:
-        subprocess.call("/sbin/rsyslogd")
+    if not _is_process_running('rsyslogd'):
+        try:
+            subprocess.call("/sbin/rsyslogd")
+        except OSError:
+            pass
 
 
 def _get_syslog_handler():
@@ -50,11 +145,15 @@ def _get_syslog_handler():
     to /var/log/messages provided that syslog is running.
 
     :param    None
-    :return:  A :class:`logging.handlers.SysLogHandler` object
+    :return:  A :class:`logging.handlers.SysLogHandler` object, or None if the syslog
+              socket is unavailable
     """
     syslog_format = '(%(name)s:%(lineno)d) %(levelname)s - %(message)s'
     syslog_formatter = logging.Formatter(syslog_format)
-    syslog_handler = SysLogHandler(address='/dev/log')
+    try:
+        syslog_handler = SysLogHandler(address=_SYSLOG_ADDRESS)
+    except OSError:
+        return None
     syslog_handler.setFormatter(syslog_formatter)
     return syslog_handler
 
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from logger_utils import get_logger
+from profiling import profiled_run
+
+"""
+Instrumentation recording named timing spans and counters for a process. When the
+MODELS_METRICS_DIR environment variable is set, they are exported on exit as a JSON
+trace file, viewable in chrome://tracing or Perfetto, and as a Prometheus textfile
+for the node exporter textfile collector.
+"""
+
+METRICS_DIR_ENV_KEY = 'MODELS_METRICS_DIR'
+
+_METRIC_PREFIX = 'models_'
+_INVALID_METRIC_CHARACTERS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+class Span(NamedTuple):
+    """
+    A named phase of the process and how long it took
+    """
+    name: str
+    start: float
+    seconds: float
+    thread: int
+    attributes: Dict[str, object]
+
+
+def _get_metric_name(name: str) -> str:
+    """
+    :param name: a span or counter name
+    :return: the name made valid as a Prometheus metric name
+    """
+    return _INVALID_METRIC_CHARACTERS.sub('_', name)
+
+
+def _escape_label(value: str) -> str:
+    """
+    :param value: a Prometheus label value
+    :return: the value with backslashes, quotes and new lines escaped
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    Thread safe registry of the spans and counters recorded by a process
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Records the time spent in the body of the with statement as a span
+
+        :param name: name of the span, e.g. 'zypper_install'
+        :param attributes: extra values recorded with the span
+        :return: a context manager
+        """
+        start = time.time()
+        start_monotonic = time.monotonic()
+        try:
+            yield
+        finally:
+            recorded_span = Span(name=name, start=start,
+                                 seconds=time.monotonic() - start_monotonic,
+                                 thread=threading.get_ident(), attributes=attributes)
+            with self._lock:
+                self.spans.append(recorded_span)
+
+    def increment(self, name: str, value: float = 1):
+        """
+        Adds 'value' to a counter
+
+        :param name: name of the counter, e.g. 'rpms_scanned'
+        :param value: the amount to add
+        :return: None
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_trace(self, job: str) -> Dict:
+        """
+        :param job: name of the process, e.g. 'trigger_mdt'
+        :return: the spans and counters in the Chrome trace event format
+        """
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+        process_id = os.getpid()
+        events = [{'name': recorded_span.name, 'cat': job, 'ph': 'X', 'pid': process_id,
+                   'tid': recorded_span.thread, 'ts': int(recorded_span.start * 1e6),
+                   'dur': int(recorded_span.seconds * 1e6), 'args': recorded_span.attributes}
+                  for recorded_span in spans]
+        return {'traceEvents': events, 'otherData': {'job': job, 'counters': counters}}
+
+    def to_prometheus(self, job: str) -> str:
+        """
+        :param job: name of the process, e.g. 'trigger_mdt'
+        :return: the spans and counters in the Prometheus text exposition format
+        """
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+        job_label = f'job="{_escape_label(job)}"'
+
+        phase_seconds = {}
+        phase_counts = {}
+        for recorded_span in spans:
+            phase_seconds[recorded_span.name] = \
+                phase_seconds.get(recorded_span.name, 0) + recorded_span.seconds
+            phase_counts[recorded_span.name] = phase_counts.get(recorded_span.name, 0) + 1
+
+        lines = []
+        if phase_seconds:
+            lines += [f'# HELP {_METRIC_PREFIX}phase_duration_seconds Total time spent in a '
+                      f'phase', f'# TYPE {_METRIC_PREFIX}phase_duration_seconds gauge']
+            lines += [f'{_METRIC_PREFIX}phase_duration_seconds{{{job_label},'
+                      f'phase="{_escape_label(name)}"}} {seconds:.6f}'
+                      for name, seconds in sorted(phase_seconds.items())]
+            lines += [f'# HELP {_METRIC_PREFIX}phase_count Number of times a phase ran',
+                      f'# TYPE {_METRIC_PREFIX}phase_count gauge']
+            lines += [f'{_METRIC_PREFIX}phase_count{{{job_label},'
+                      f'phase="{_escape_label(name)}"}} {count}'
+                      for name, count in sorted(phase_counts.items())]
+        for name, value in sorted(counters.items()):
+            metric_name = f'{_METRIC_PREFIX}{_get_metric_name(name)}_total'
+            lines += [f'# TYPE {metric_name} counter', f'{metric_name}{{{job_label}}} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def export(self, directory: str, job: str) -> List[str]:
+        """
+        Writes '<job>.trace.json' and '<job>.prom' to 'directory'. Each file is written under
+        a temporary name and renamed so that collectors never read a partial file.
+
+        :param directory: the directory to write to
+        :param job: name of the process, e.g. 'trigger_mdt'
+        :return: the paths of the written files
+        """
+        os.makedirs(directory, exist_ok=True)
+        exported_files = []
+        for file_name, content in ((f'{job}.trace.json', json.dumps(self.to_trace(job))),
+                                   (f'{job}.prom', self.to_prometheus(job))):
+            file_path = os.path.join(directory, file_name)
+            with open(file_path + '.tmp', 'w') as metrics_file:
+                metrics_file.write(content)
+            os.replace(file_path + '.tmp', file_path)
+            exported_files.append(file_path)
+        return exported_files
+
+
+_METRICS = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """
+    :return: the :class:`Metrics` of the process
+    """
+    return _METRICS
+
+
+def span(name: str, **attributes):
+    """
+    Records the time spent in the body of the with statement in the process metrics
+
+    :param name: name of the span
+    :param attributes: extra values recorded with the span
+    :return: a context manager
+    """
+    return _METRICS.span(name, **attributes)
+
+
+def increment(name: str, value: float = 1):
+    """
+    Adds 'value' to a counter of the process metrics
+
+    :param name: name of the counter
+    :param value: the amount to add
+    :return: None
+    """
+    _METRICS.increment(name, value)
+
+
+def export_metrics(job: str, directory: Optional[str] = None) -> List[str]:
+    """
+    Exports the process metrics. Failures are logged and never raised, metrics must not
+    fail a deployment.
+
+    :param job: name of the process, e.g. 'trigger_mdt'
+    :param directory: the directory to write to, MODELS_METRICS_DIR by default
+    :return: the paths of the written files, empty when metrics export is not configured
+    """
+    directory = directory or os.getenv(METRICS_DIR_ENV_KEY)
+    if not directory:
+        return []
+    try:
+        return _METRICS.export(directory, job)
+    except OSError as os_error:
+        get_logger('Metrics').warning('Unable to export metrics to %s: %s', directory, os_error)
+        return []
+
+
+@contextlib.contextmanager
+def recorded_run(job: str):
+    """
+    Records the body of the with statement as the 'total' span of the process and exports
+    the process metrics when it exits, whether or not it succeeded. The body is profiled
+    when requested with MODELS_PROFILE.
+
+    :param job: name of the process, e.g. 'trigger_mdt'
+    :return: a context manager
+    """
+    try:
+        with profiled_run(job), span('total'):
+            yield
+    finally:
+        export_metrics(job)
+
+
+def run_tool(job: str, tool_main: Callable[[Optional[List[str]]], None],
+             arguments: Optional[List[str]] = None):
+    """
+    Runs the main function of a tool with its metrics recorded
+
+    :param job: name of the process, e.g. 'trigger_mdt'
+    :param tool_main: the main function of the tool
+    :param arguments: the command line arguments of the tool, sys.argv if None
+    :return: None
+    """
+    with recorded_run(job):
+        tool_main(arguments)
@@ -7,19 +7,42 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
-import sys
-from typing import List
-from subprocess import CalledProcessError
+import argparse
+import os
+from typing import List, Optional
+from subprocess import CalledProcessError, TimeoutExpired
 from logger_utils import get_logger
 
-from command_executor import execute_subprocess_command
+from command_executor import execute_subprocess_command, get_timeout
+from metrics import increment, run_tool, span
 from model_installer_strategy import ModelInstallerStrategy
 
+INSTALL_MODE_ENV_KEY = 'MODELS_INSTALL_MODE'
+ZYPPER_INSTALL_MODE = 'zypper'
+EXTRACT_INSTALL_MODE = 'extract'
+
+
+def get_install_mode() -> str:
+    """
+    Get the install mode of the model pipeline from the 'MODELS_INSTALL_MODE' env value,
+    'zypper' by default. In 'extract' mode the jars are extracted from the RPM payloads
+    straight into the layout and the RPMs are not installed.
+
+    :return the install mode
+    """
+    install_mode = os.getenv(INSTALL_MODE_ENV_KEY) or ZYPPER_INSTALL_MODE
+    if install_mode not in (ZYPPER_INSTALL_MODE, EXTRACT_INSTALL_MODE):
+        raise ValueError(f"{INSTALL_MODE_ENV_KEY} must be '{ZYPPER_INSTALL_MODE}' or "
+                         f"'{EXTRACT_INSTALL_MODE}'. {install_mode} supplied")
+    return install_mode
+
 
 class ModelInstaller:
     """
     Class to install relevant model RPMs from the zypper cache
     """
+    _INSTALL_TIMEOUT = 3600
+    _INSTALL_TIMEOUT_ENV_KEY = 'MODELS_INSTALL_TIMEOUT'
 
     def __init__(self, deploy_file):
         self.deploy_file = deploy_file
@@ -36,28 +59,58 @@ class ModelInstaller:
         install_command.extend(rpms)
 
         try:
-            execute_subprocess_command(install_command)
+            with span('zypper_install', rpms=len(rpms)):
+                execute_subprocess_command(install_command, timeout=get_timeout(
+                    self._INSTALL_TIMEOUT_ENV_KEY, self._INSTALL_TIMEOUT))
+            increment('rpms_installed', len(rpms))
             self.logger.info("Model RPMs installed successfully")
         except CalledProcessError as zypper_error:
             self.logger.error(f"Model RPMs install failed: {zypper_error.stderr}")
             raise SystemExit(2) from zypper_error
+        except TimeoutExpired as timeout_error:
+            self.logger.error(f"Model RPMs install timed out after {timeout_error.timeout:.0f} "
+                              f"seconds: {timeout_error.stderr}")
+            raise SystemExit(2) from timeout_error
 
-    def install(self):
+    def get_models_to_install(self) -> List[str]:
         """
-        Gets the models to deploy and installs them
+        Gets the models to deploy from the deploy file
 
-        :return: None
+        :return: the model RPMs to install
         """
-        self.logger.info('Starting installation of model RPMs...')
-        model_rpms_to_install = ModelInstallerStrategy.get_models_to_deploy(self.deploy_file)
+        with span('strategy_scan'):
+            model_rpms_to_install = ModelInstallerStrategy.get_models_to_deploy(self.deploy_file)
         self.logger.debug('RPMs being installed: %s', model_rpms_to_install)
         self.logger.info('RPMs to be installed count: %s', len(model_rpms_to_install))
+        return model_rpms_to_install
+
+    def install(self, model_rpms_to_install: Optional[List[str]] = None) -> List[str]:
+        """
+        Gets the models to deploy and installs them
+
+        :param model_rpms_to_install: the model RPMs to install, those of the deploy file by
+                                      default
+        :return: the model RPMs installed
+        """
+        self.logger.info('Starting installation of model RPMs...')
+        if model_rpms_to_install is None:
+            model_rpms_to_install = self.get_models_to_install()
 
         self._install_model_rpms(model_rpms_to_install)
         self.logger.info("Finished install of model RPMs...")
+        return model_rpms_to_install
+
+
+def main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Install the model RPMs of a deploy file from '
+                                                 'the zypper cache')
+    parser.add_argument('deploy_file', help='the model-deploy.json file')
+    ModelInstaller(parser.parse_args(arguments).deploy_file).install()
 
 
 if __name__ == '__main__':
-    deployment_file = sys.argv[1]
-    model_installer = ModelInstaller(deployment_file)
-    model_installer.install()
+    run_tool('model_installer', main)
@@ -7,12 +7,12 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
-import os
 import json
 from abc import abstractmethod
-from typing import List
+from collections import Counter
+from typing import Dict, Iterable, List
 
-from command_executor import execute_subprocess_command
+from repo_classifier import classify_repo, get_model_categories
 
 """
 Python file containing the classes which hold the logic
@@ -41,6 +41,7 @@ class FilterStrategy(Strategy):
     """
 
     _ENM_ISO_REPO_PATH = '/var/cache/zypp/packages/enm_iso_repo/'
+    _REPO_INDEX_PATH = '/etc/opt/ericsson/models/enm_iso_repo_index.json'
 
     @abstractmethod
     def get_models_for_deployment(self) -> List:
@@ -48,20 +49,32 @@ class FilterStrategy(Strategy):
         Function to get NRMs for deployment
         """
 
-    def get_rpm_name(self, rpm_file, model_directory_type) -> str:
+    def get_models_in_category(self, category_name: str) -> List:
         """
-        Get the model RPM name from the models installed on the system
+        Get the model RPMs of a category from the single pass classification of the repo cache.
+        The classification index written when the base image was built is used when present.
 
-        :param rpm_file: the full RPM file on the system, including the version
-        :param model_directory_type: the type of models to be installed - install or post_install
-        :return: the name of the RPM file
+        :param category_name: the name of the model category
+        :return: a list of model RPMs in the category
         """
-        rpm_check_install_path_command = ['rpm', '-qpl', self._ENM_ISO_REPO_PATH + rpm_file]
-        rpm_install_path = str(execute_subprocess_command(rpm_check_install_path_command, True))
-        expected_install_dir = '/' + model_directory_type + '/'
-        if expected_install_dir in rpm_install_path:
-            return rpm_file.split('-', 1)[0]
-        return None
+        return classify_repo(self._ENM_ISO_REPO_PATH, self._REPO_INDEX_PATH)\
+            .get_rpms(category_name)
+
+    @classmethod
+    def get_cached_rpm_paths(cls, rpm_names: Iterable[str]) -> List[str]:
+        """
+        Get the repo cache files of installed model RPMs from the classification of the repo
+        cache. RPMs with more than one version in the cache are left out as the installed
+        version is not known.
+
+        :param rpm_names: names of the installed model RPMs
+        :return: paths of the RPM files, in repo file order
+        """
+        rpm_names = set(rpm_names)
+        rpms = [rpm for rpm in classify_repo(cls._ENM_ISO_REPO_PATH, cls._REPO_INDEX_PATH).rpms
+                if rpm.name in rpm_names]
+        versions = Counter(rpm.name for rpm in rpms)
+        return [cls._ENM_ISO_REPO_PATH + rpm.rpm_file for rpm in rpms if versions[rpm.name] == 1]
 
 
 class NrmsForDeployment(FilterStrategy):
@@ -78,15 +91,7 @@ class NrmsForDeployment(FilterStrategy):
 
         :return: a list of service model RPMs to install
         """
-        rpms_to_install = []
-        for _, _, files in os.walk(self._ENM_ISO_REPO_PATH):
-            for rpm_file in files:
-                rpm_name = super().get_rpm_name(rpm_file, self.model_directory_type)
-                if rpm_name is not None:
-                    if 'nodemodel' in str(rpm_name):
-                        rpms_to_install.append(rpm_name)
-
-        return rpms_to_install
+        return self.get_models_in_category('nrm_models')
 
 
 class ServiceModelsForDeployment(FilterStrategy):
@@ -103,15 +108,7 @@ class ServiceModelsForDeployment(FilterStrategy):
 
         :return: a list of service model RPMs to install
         """
-        rpms_to_install = []
-        for _, _, files in os.walk(self._ENM_ISO_REPO_PATH):
-            for rpm_file in files:
-                rpm_name = super().get_rpm_name(rpm_file, self.model_directory_type)
-                if rpm_name is not None:
-                    if 'nodemodel' not in str(rpm_name):
-                        rpms_to_install.append(rpm_name)
-
-        return rpms_to_install
+        return self.get_models_in_category('service_models')
 
 
 class PostInstallModelsForDeployment(FilterStrategy):
@@ -128,14 +125,24 @@ class PostInstallModelsForDeployment(FilterStrategy):
 
         :return: a list of service model RPMs to install
         """
-        rpms_to_install = []
-        for _, _, files in os.walk(self._ENM_ISO_REPO_PATH):
-            for rpm_file in files:
-                rpm_name = super().get_rpm_name(rpm_file, self.model_directory_type)
-                if rpm_name is not None:
-                    rpms_to_install.append(rpm_name)
+        return self.get_models_in_category('post_install')
+
+
+class CategoryModelsForDeployment(FilterStrategy):
+    """
+    Class containing logic for determining the models of a custom registered category to deploy
+    """
+
+    def __init__(self, category_name: str):
+        self.category_name = category_name
+
+    def get_models_for_deployment(self) -> List:
+        """
+        Function to get the models of the category for deployment
 
-        return rpms_to_install
+        :return: a list of model RPMs to install
+        """
+        return self.get_models_in_category(self.category_name)
 
 
 class ExplicitModelsForDeployment(Strategy):
@@ -167,36 +174,30 @@ class ModelInstallerStrategy:
         :param rpm_file_path: the category of models to deploy
         :return: a list of model RPMs to install
         """
-        models_deployment_strategy = ModelInstallerStrategy.__get_deployment_strategy(rpm_file_path)
+        deploy = ModelInstallerStrategy.__load_deploy_section(rpm_file_path)
+        models_deployment_strategy = ModelInstallerStrategy.__get_deployment_strategy(
+            deploy, rpm_file_path)
         return models_deployment_strategy.get_models_for_deployment()
 
     @staticmethod
-    def __get_model_category(rpm_file_path):
-        with open(rpm_file_path, 'r') as rpm_file:
-            data = json.load(rpm_file)
-            try:
-                return data['deploy']['model-category']
-            except KeyError:
-                return None
-
-    @staticmethod
-    def __get_model_rpms_to_install(rpm_file_path) -> List:
+    def __load_deploy_section(rpm_file_path) -> Dict:
         with open(rpm_file_path, 'r') as rpm_file:
             data = json.load(rpm_file)
             try:
-                return data['deploy']['rpms']
+                return data['deploy']
             except KeyError:
-                return []
+                return {}
 
     @staticmethod
-    def __get_deployment_strategy(rpm_file_path) -> Strategy:
+    def __get_deployment_strategy(deploy: Dict, rpm_file_path) -> Strategy:
         """
         Function to get the Strategy to use to deploy models
 
+        :param deploy: the 'deploy' section of the deploy rpm file
         :param rpm_file_path: the deploy rpm file
         :return: Strategy to deploy models
         """
-        models_category = ModelInstallerStrategy.__get_model_category(rpm_file_path)
+        models_category = deploy.get('model-category')
 
         if models_category is not None:
             if models_category == 'service_models':
@@ -205,11 +206,13 @@ class ModelInstallerStrategy:
                 return NrmsForDeployment()
             if models_category == 'post_install':
                 return PostInstallModelsForDeployment()
+            if models_category in get_model_categories():
+                return CategoryModelsForDeployment(models_category)
 
             raise ValueError(f"Strategy could not be determined by model category"
                              f" {models_category}")
 
-        model_rpms = ModelInstallerStrategy.__get_model_rpms_to_install(rpm_file_path)
+        model_rpms = deploy.get('rpms', [])
         if len(model_rpms) != 0:
             return ExplicitModelsForDeployment(model_rpms)
 
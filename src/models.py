@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import argparse
+import importlib
+import sys
+from typing import List, Optional
+
+from metrics import run_tool, span
+
+"""
+Single entry point of the model tools: 'models.py <command> [arguments]'. A command only
+imports the modules it needs. The 'pipeline' command installs the models of a deploy file
+and lays out their jars in one process, the installed packages and the owners of their
+files are passed on in memory instead of being queried again by a second script. With
+MODELS_INSTALL_MODE=extract it extracts the jars from the RPM payloads into the layout
+without installing the RPMs. The per tool scripts, e.g. model_installer.py, remain as
+wrappers of their command.
+"""
+
+PIPELINE_COMMAND = 'pipeline'
+
+# command: (module implementing it, help)
+_COMMANDS = {
+    'download': ('download_rpms', 'download the model RPMs into the zypper cache'),
+    'verify': ('verify_rpms', 'verify the digests of the RPMs in the zypper cache'),
+    'classify': ('repo_classifier', 'write the classification index of the zypper cache'),
+    'install': ('model_installer', 'install the model RPMs of a deploy file'),
+    'layout': ('create_model_layout', 'lay out the installed model jars for MDT'),
+    PIPELINE_COMMAND: ('models', 'install the model RPMs of a deploy file and lay out their '
+                                 'jars'),
+    'trigger': ('trigger_mdt', 'copy the laid out jars to the MDT mount and trigger MDT'),
+}
+_PIPELINE_JOB = 'models_pipeline'
+
+
+def run_pipeline(deploy_file: str, model_jar_location: str):
+    """
+    Installs the model RPMs of a deploy file and lays out their jars. The owners of the
+    jars are read from the headers of the installed RPMs, only the jars they do not
+    account for are queried from the rpm database. In the 'extract' install mode the jars
+    are extracted from the RPM payloads straight into the layout instead, only the RPMs
+    that cannot be extracted are installed.
+
+    :param deploy_file: the model-deploy.json file
+    :param model_jar_location: the installed model directory
+    :return: None
+    """
+    # pylint: disable=import-outside-toplevel
+    from create_model_layout import ModelLayoutTool, get_package_file_owners
+    from model_installer import EXTRACT_INSTALL_MODE, ModelInstaller, get_install_mode
+    from model_installer_strategy import FilterStrategy
+
+    install_mode = get_install_mode()
+    model_installer = ModelInstaller(deploy_file)
+    model_rpms = model_installer.get_models_to_install()
+    if install_mode == EXTRACT_INSTALL_MODE:
+        extracted_rpms = set(ModelLayoutTool().extract_layout(
+            FilterStrategy.get_cached_rpm_paths(model_rpms), model_jar_location))
+        model_rpms = [rpm for rpm in model_rpms if rpm not in extracted_rpms]
+        if not model_rpms:
+            return
+
+    installed_rpms = model_installer.install(model_rpms)
+    with span('package_file_owners', rpms=len(installed_rpms)):
+        known_owners = get_package_file_owners(
+            FilterStrategy.get_cached_rpm_paths(installed_rpms))
+    ModelLayoutTool().generate_layout(model_jar_location, known_owners)
+
+
+def pipeline_main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog=f'models.py {PIPELINE_COMMAND}',
+                                     description=_COMMANDS[PIPELINE_COMMAND][1])
+    parser.add_argument('deploy_file', help='the model-deploy.json file')
+    parser.add_argument('model_jar_location', help='the installed model directory')
+    pipeline_arguments = parser.parse_args(arguments)
+    run_pipeline(pipeline_arguments.deploy_file, pipeline_arguments.model_jar_location)
+
+
+def main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    arguments = sys.argv[1:] if arguments is None else arguments
+    parser = argparse.ArgumentParser(
+        prog='models.py', description='Model image tools',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='commands:\n' + '\n'.join(f'  {command:<10}{command_help}' for command, (
+            _, command_help) in _COMMANDS.items()))
+    parser.add_argument('command', choices=_COMMANDS, help='the command to run, '
+                                                           '"<command> -h" for its arguments')
+    command = parser.parse_args(arguments[:1]).command
+    if command == PIPELINE_COMMAND:
+        run_tool(_PIPELINE_JOB, pipeline_main, arguments[1:])
+        return
+    module_name = _COMMANDS[command][0]
+    run_tool(module_name, importlib.import_module(module_name).main, arguments[1:])
+
+
+if __name__ == '__main__':
+    main()
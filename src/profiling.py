@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from typing import List, Optional
+
+from logger_utils import get_logger
+
+"""
+Opt-in profiling of a model tool run, enabled in a running container without rebuilding
+the image. MODELS_PROFILE selects the profilers: 'cpu' runs the process under cProfile,
+'mem' traces allocations with tracemalloc and 'both' does both. The profiles are written
+to MODELS_PROFILE_DIR when the run ends: '<job>-<time>-<pid>.prof' for pstats or
+snakeviz with its report in '.cpu.txt', and the top allocations in '.mem.txt'.
+"""
+
+PROFILE_ENV_KEY = 'MODELS_PROFILE'
+PROFILE_DIR_ENV_KEY = 'MODELS_PROFILE_DIR'
+CPU_PROFILE = 'cpu'
+MEMORY_PROFILE = 'mem'
+BOTH_PROFILES = 'both'
+
+_DEFAULT_PROFILE_DIR = '/var/tmp/models-profile'
+_REPORT_LIMIT = 50
+_TRACEMALLOC_FRAMES = 5
+
+
+def get_profilers() -> List[str]:
+    """
+    Reads the profilers requested with MODELS_PROFILE. An unknown value is logged and
+    ignored, profiling must never fail a deployment.
+
+    :return: the requested profilers, 'cpu' and/or 'mem', empty when profiling is off
+    """
+    profile = (os.getenv(PROFILE_ENV_KEY) or '').strip().lower()
+    if not profile:
+        return []
+    if profile == BOTH_PROFILES:
+        return [CPU_PROFILE, MEMORY_PROFILE]
+    if profile in (CPU_PROFILE, MEMORY_PROFILE):
+        return [profile]
+    get_logger('Profiling').warning('Ignoring %s=%s, expected %s, %s or %s', PROFILE_ENV_KEY,
+                                    profile, CPU_PROFILE, MEMORY_PROFILE, BOTH_PROFILES)
+    return []
+
+
+def _write_text(file_path: str, content: str):
+    """
+    Writes a report under a temporary name and renames it into place
+
+    :param file_path: path of the report
+    :param content: the report
+    :return: None
+    """
+    with open(file_path + '.tmp', 'w') as report_file:
+        report_file.write(content)
+    os.replace(file_path + '.tmp', file_path)
+
+
+def write_cpu_profile(profiler: cProfile.Profile, file_prefix: str) -> List[str]:
+    """
+    Writes the stats of a CPU profile and a report of its most expensive functions
+
+    :param profiler: the stopped profiler
+    :param file_prefix: path of the profile files without extension
+    :return: the paths of the written files
+    """
+    profiler.dump_stats(file_prefix + '.prof')
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats('cumulative').print_stats(_REPORT_LIMIT)
+    stats.sort_stats('tottime').print_stats(_REPORT_LIMIT)
+    _write_text(file_prefix + '.cpu.txt', report.getvalue())
+    return [file_prefix + '.prof', file_prefix + '.cpu.txt']
+
+
+def write_memory_profile(snapshot: tracemalloc.Snapshot, peak_size: int,
+                         file_prefix: str) -> List[str]:
+    """
+    Writes a report of the lines and call stacks that allocated the most memory
+
+    :param snapshot: the tracemalloc snapshot taken at the end of the run
+    :param peak_size: the peak size in bytes of the traced memory during the run
+    :param file_prefix: path of the profile files without extension
+    :return: the paths of the written files
+    """
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    lines = [f'Peak traced memory: {peak_size / 1e6:.1f} MB',
+             f'Traced memory at exit: '
+             f'{sum(stat.size for stat in snapshot.statistics("filename")) / 1e6:.1f} MB', '',
+             f'Top {_REPORT_LIMIT} allocations by line:']
+    lines += [str(stat) for stat in snapshot.statistics('lineno')[:_REPORT_LIMIT]]
+    lines += ['', f'Top {_REPORT_LIMIT // 5} allocations by call stack:']
+    for stat in snapshot.statistics('traceback')[:_REPORT_LIMIT // 5]:
+        lines += [f'{stat.count} blocks, {stat.size / 1e3:.1f} KB',
+                  *(f'    {line}' for line in stat.traceback.format())]
+    _write_text(file_prefix + '.mem.txt', '\n'.join(lines) + '\n')
+    return [file_prefix + '.mem.txt']
+
+
+@contextlib.contextmanager
+def profiled_run(job: str, directory: Optional[str] = None):
+    """
+    Profiles the body of the with statement with the profilers requested in MODELS_PROFILE
+    and writes the profiles when it exits, whether or not it succeeded
+
+    :param job: name of the process, e.g. 'trigger_mdt'
+    :param directory: the directory to write to, MODELS_PROFILE_DIR by default
+    :return: a context manager
+    """
+    profilers = get_profilers()
+    if not profilers:
+        yield
+        return
+
+    profiler = cProfile.Profile() if CPU_PROFILE in profilers else None
+    trace_memory = MEMORY_PROFILE in profilers and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start(_TRACEMALLOC_FRAMES)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        snapshot, peak_size = None, 0
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak_size = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        directory = directory or os.getenv(PROFILE_DIR_ENV_KEY) or _DEFAULT_PROFILE_DIR
+        file_prefix = os.path.join(directory, f"{job}-{time.strftime('%Y%m%d-%H%M%S')}-"
+                                              f"{os.getpid()}")
+        logger = get_logger('Profiling')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profile_files = []
+            if profiler is not None:
+                profile_files += write_cpu_profile(profiler, file_prefix)
+            if snapshot is not None:
+                profile_files += write_memory_profile(snapshot, peak_size, file_prefix)
+            logger.info('Profiles written: %s', profile_files)
+        except OSError as os_error:
+            logger.warning('Unable to write profiles to %s: %s', directory, os_error)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import atexit
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from command_executor import execute_subprocess_command
+from logger_utils import get_logger
+
+"""
+Memoizing cache for read-only 'rpm' queries. An answer is keyed on the query and the
+inode, size and modification time of the files it is about, and of the rpm database
+for queries of installed packages, so it is reused until one of them changes. The least
+recently used answers are evicted beyond MODELS_QUERY_CACHE_SIZE entries. When
+MODELS_QUERY_CACHE_PATH is set the cache is loaded from that file and written back when
+the process exits, so later runs and image builds reuse it.
+"""
+
+QUERY_CACHE_PATH_ENV_KEY = 'MODELS_QUERY_CACHE_PATH'
+QUERY_CACHE_SIZE_ENV_KEY = 'MODELS_QUERY_CACHE_SIZE'
+
+_CACHE_FORMAT_VERSION = 1
+_DEFAULT_CACHE_SIZE = 100000
+_RPMDB_PATHS = ('/var/lib/rpm/Packages', '/var/lib/rpm/Packages.db',
+                '/var/lib/rpm/rpmdb.sqlite', '/usr/lib/sysimage/rpm/Packages',
+                '/usr/lib/sysimage/rpm/Packages.db', '/usr/lib/sysimage/rpm/rpmdb.sqlite')
+
+
+def _get_file_identity(file_path: str) -> Optional[List]:
+    """
+    :param file_path: path of a file
+    :return: [path, inode, size, modification time] of the file or None if it does not exist
+    """
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [os.path.abspath(file_path), file_stat.st_ino, file_stat.st_size,
+            file_stat.st_mtime_ns]
+
+
+def get_rpmdb_identity() -> List:
+    """
+    :return: the identity of the files of the rpm database, it changes whenever a package
+             is installed or removed
+    """
+    return [identity for identity in map(_get_file_identity, _RPMDB_PATHS)
+            if identity is not None]
+
+
+class QueryCache:
+    """
+    Thread safe LRU cache of command answers, optionally backed by a file
+    """
+
+    def __init__(self, max_entries: int = _DEFAULT_CACHE_SIZE, path: Optional[str] = None):
+        self.max_entries = max(max_entries, 1)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._modified = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(command: List[str], file_paths: Iterable[str],
+                rpmdb_identity: Optional[List] = None) -> Optional[str]:
+        """
+        :param command: the query
+        :param file_paths: the files the answer depends on
+        :param rpmdb_identity: the :func:`get_rpmdb_identity` if the answer also depends on
+                               the installed packages
+        :return: the cache key of the query, None if a file is missing and the query must
+                 not be cached
+        """
+        identities = []
+        for file_path in file_paths:
+            identity = _get_file_identity(file_path)
+            if identity is None:
+                return None
+            identities.append(identity)
+        if rpmdb_identity is not None:
+            identities.append(rpmdb_identity)
+        return json.dumps([list(command), identities], separators=(',', ':'))
+
+    def get(self, key: Optional[str]) -> Optional[bytes]:
+        """
+        :param key: the cache key
+        :return: the cached answer or None
+        """
+        with self._lock:
+            if key is None or key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: Optional[str], answer: bytes):
+        """
+        Caches an answer, evicting the least recently used answers beyond the size limit
+
+        :param key: the cache key, nothing is cached if None
+        :param answer: the answer
+        :return: None
+        """
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._modified = True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def load(self):
+        """
+        Loads the cache file. A cache file that is missing or unreadable is ignored.
+
+        :return: None
+        """
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r') as cache_file:
+                cache = json.load(cache_file)
+            if cache['version'] != _CACHE_FORMAT_VERSION:
+                return
+            entries = [(key, base64.b64decode(answer)) for key, answer in cache['entries']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        for key, answer in entries[-self.max_entries:]:
+            self.put(key, answer)
+        self._modified = False
+
+    def save(self):
+        """
+        Writes the cache file if the cache changed since it was loaded. Failures are logged
+        and never raised, the cache is only an optimization.
+
+        :return: None
+        """
+        with self._lock:
+            if not self.path or not self._modified:
+                return
+            entries = [[key, base64.b64encode(answer).decode()]
+                       for key, answer in self._entries.items()]
+            self._modified = False
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path + '.tmp', 'w') as cache_file:
+                json.dump({'version': _CACHE_FORMAT_VERSION, 'entries': entries}, cache_file)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as os_error:
+            get_logger('QueryCache').warning('Unable to write query cache %s: %s', self.path,
+                                             os_error)
+
+
+_QUERY_CACHE = None
+_QUERY_CACHE_LOCK = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """
+    :return: the query cache of the process, configured from the environment and loaded
+             from its file on first use
+    """
+    global _QUERY_CACHE  # pylint: disable=global-statement
+    with _QUERY_CACHE_LOCK:
+        if _QUERY_CACHE is None:
+            size = os.getenv(QUERY_CACHE_SIZE_ENV_KEY)
+            try:
+                max_entries = int(size) if size else _DEFAULT_CACHE_SIZE
+            except ValueError as value_error:
+                raise ValueError(f'{QUERY_CACHE_SIZE_ENV_KEY} must be an integer, "{size}" '
+                                 f'supplied') from value_error
+            _QUERY_CACHE = QueryCache(max_entries, os.getenv(QUERY_CACHE_PATH_ENV_KEY) or None)
+            _QUERY_CACHE.load()
+            if _QUERY_CACHE.path:
+                atexit.register(_QUERY_CACHE.save)
+        return _QUERY_CACHE
+
+
+def execute_cached_query(command: List[str], file_paths: Iterable[str],
+                         timeout: Optional[float] = None, depends_on_rpmdb: bool = False) -> bytes:
+    """
+    Runs a read-only query, or returns its cached answer if none of the files it is about
+    changed since it was last run
+
+    :param command: the query, e.g. ['rpm', '-qpl', <rpm file>]
+    :param file_paths: the files the answer depends on
+    :param timeout: seconds after which the query is stopped, None for no limit
+    :param depends_on_rpmdb: True if the answer also depends on the installed packages
+    :return: the output of the query
+    """
+    query_cache = get_query_cache()
+    key = query_cache.get_key(command, file_paths,
+                              get_rpmdb_identity() if depends_on_rpmdb else None)
+    answer = query_cache.get(key)
+    if answer is None:
+        answer = execute_subprocess_command(command, True, timeout)
+        query_cache.put(key, answer)
+    return answer
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import argparse
+import json
+import os
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from logger_utils import get_logger
+from command_executor import DEFAULT_RPM_QUERY_TIMEOUT, get_timeout, RPM_QUERY_TIMEOUT_ENV_KEY
+from metrics import increment, run_tool
+from query_cache import execute_cached_query
+from rpm_header import RpmHeaderError, read_rpm_header
+from worker_pool import get_worker_count, map_in_order
+
+"""
+Classification engine that reads every RPM in a repo cache once and sorts it
+into all known model categories in a single pass. The classification can be
+persisted to an index file so that later runs only read RPMs that are new or
+have changed since the index was written.
+"""
+
+_INDEX_FORMAT_VERSION = 1
+
+
+class ModelCategory(NamedTuple):
+    """
+    A model category: the RPMs installing into 'model_directory_type' whose name
+    matches 'predicate'
+    """
+    name: str
+    model_directory_type: str
+    predicate: Callable[[str], bool]
+
+
+class ClassifiedRpm(NamedTuple):
+    """
+    An RPM in the repo cache and the model directory types it installs into
+    """
+    rpm_file: str
+    name: str
+    version: str
+    size: int
+    mtime: int
+    model_directory_types: FrozenSet[str]
+
+
+_MODEL_CATEGORIES = {}
+
+
+def register_model_category(category: ModelCategory):
+    """
+    Registers a model category so that it is included in every classification
+
+    :param category: the category to register
+    :return: None
+    """
+    _MODEL_CATEGORIES[category.name] = category
+
+
+def get_model_categories() -> Dict[str, ModelCategory]:
+    """
+    :return: all registered model categories keyed by name
+    """
+    return dict(_MODEL_CATEGORIES)
+
+
+register_model_category(ModelCategory('nrm_models', 'install', lambda name: 'nodemodel' in name))
+register_model_category(ModelCategory('service_models', 'install',
+                                      lambda name: 'nodemodel' not in name))
+register_model_category(ModelCategory('post_install', 'post_install', lambda name: True))
+
+
+def _query_rpm_install_paths(rpm_path: str) -> str:
+    """
+    Queries the install paths of the files in an RPM with 'rpm -qpl', for RPMs whose
+    header cannot be parsed in-process
+
+    :param rpm_path: the full path to the RPM file
+    :return: the install paths of the RPM contents, one per line
+    """
+    rpm_check_install_path_command = ['rpm', '-qpl', rpm_path]
+    return str(execute_cached_query(
+        rpm_check_install_path_command, [rpm_path],
+        get_timeout(RPM_QUERY_TIMEOUT_ENV_KEY, DEFAULT_RPM_QUERY_TIMEOUT)))
+
+
+def _get_version_from_file_name(rpm_file: str) -> str:
+    """
+    Get the RPM version from an RPM file name of the form <name>-<version>[-<release>].rpm
+
+    :param rpm_file: the RPM file name
+    :return: the RPM version or an empty string if not present
+    """
+    name_parts = os.path.basename(rpm_file).split('-')
+    if len(name_parts) < 2:
+        return ''
+    version = name_parts[1]
+    return version[:-len('.rpm')] if version.endswith('.rpm') else version
+
+
+def _read_rpm(rpm_path: str) -> Tuple[str, str]:
+    """
+    Reads the install paths and version of an RPM, forking 'rpm -qpl' only when the
+    header cannot be parsed
+
+    :param rpm_path: the full path to the RPM file
+    :return: Tuple[install paths one per line, RPM version]
+    """
+    try:
+        header = read_rpm_header(rpm_path)
+        return '\n'.join(header.file_names), header.version
+    except (RpmHeaderError, OSError):
+        return _query_rpm_install_paths(rpm_path), _get_version_from_file_name(rpm_path)
+
+
+def get_model_directory_types(install_paths: str, model_directory_types) -> FrozenSet[str]:
+    """
+    Finds which of the model directory types an RPM installs into
+
+    :param install_paths: the install paths of the RPM contents
+    :param model_directory_types: the model directory types to look for
+    :return: the model directory types found in the install paths
+    """
+    return frozenset(directory_type for directory_type in model_directory_types
+                     if '/' + directory_type + '/' in install_paths)
+
+
+def get_rpm_categories(rpm_name: str, model_directory_types,
+                       categories: Dict[str, ModelCategory]) -> List[str]:
+    """
+    Finds the categories an RPM belongs to
+
+    :param rpm_name: the RPM name
+    :param model_directory_types: the model directory types the RPM installs into
+    :param categories: the categories to check, keyed by name
+    :return: the names of the categories the RPM belongs to
+    """
+    return [category.name for category in categories.values()
+            if category.model_directory_type in model_directory_types
+            and category.predicate(rpm_name)]
+
+
+class RepoClassification:
+    """
+    The result of classifying a repo cache, a view of its RPMs per model category
+    """
+
+    def __init__(self, rpms: List[ClassifiedRpm], categories: Dict[str, ModelCategory]):
+        self.rpms = rpms
+        self._rpms_by_category = {category_name: [] for category_name in categories}
+        self._categories_by_rpm = {}
+        for rpm in rpms:
+            rpm_categories = self._categories_by_rpm.setdefault(rpm.name, [])
+            for category_name in get_rpm_categories(rpm.name, rpm.model_directory_types,
+                                                    categories):
+                self._rpms_by_category[category_name].append(rpm.name)
+                if category_name not in rpm_categories:
+                    rpm_categories.append(category_name)
+
+    def get_rpms(self, category_name: str) -> List[str]:
+        """
+        :param category_name: name of a registered model category
+        :return: names of the RPMs in the category, in repo file order
+        """
+        return list(self._rpms_by_category[category_name])
+
+    def get_categories(self, rpm_name: str) -> List[str]:
+        """
+        :param rpm_name: name of an RPM in the repo cache
+        :return: the names of the categories the RPM belongs to
+        """
+        return list(self._categories_by_rpm.get(rpm_name, []))
+
+
+class RepoClassifier:
+    """
+    Reads every RPM in a repo cache once and classifies it into all model categories
+    """
+
+    def __init__(self, repo_path: str, categories: Optional[Dict[str, ModelCategory]] = None,
+                 index_path: Optional[str] = None, workers: Optional[int] = None):
+        self.repo_path = repo_path
+        self.categories = get_model_categories() if categories is None else categories
+        self.index_path = index_path
+        self.workers = get_worker_count() if workers is None else workers
+        self.scanned_count = 0
+        self.reused_count = 0
+
+    def get_category_directory_types(self) -> FrozenSet[str]:
+        """
+        :return: the model directory types used by the categories
+        """
+        return frozenset(category.model_directory_type for category in self.categories.values())
+
+    def list_rpm_files(self) -> List[str]:
+        """
+        :return: the paths of all files in the repo cache relative to it, in sorted order
+        """
+        rpm_files = []
+        for root, _, files in os.walk(self.repo_path):
+            for rpm_file in files:
+                rpm_files.append(os.path.relpath(os.path.join(root, rpm_file), self.repo_path))
+        return sorted(rpm_files)
+
+    def classify_rpm(self, rpm_file: str) -> ClassifiedRpm:
+        """
+        Reads a single RPM of the repo cache
+
+        :param rpm_file: path of the RPM relative to the repo cache
+        :return: the :class:`ClassifiedRpm`
+        """
+        rpm_path = os.path.join(self.repo_path, rpm_file)
+        rpm_stat = os.stat(rpm_path)
+        install_paths, version = _read_rpm(rpm_path)
+        return ClassifiedRpm(rpm_file=rpm_file,
+                             name=os.path.basename(rpm_file).split('-', 1)[0],
+                             version=version,
+                             size=rpm_stat.st_size,
+                             mtime=int(rpm_stat.st_mtime),
+                             model_directory_types=get_model_directory_types(
+                                 install_paths, self.get_category_directory_types()))
+
+    def _is_current(self, indexed_rpm: ClassifiedRpm) -> bool:
+        """
+        Checks that an indexed RPM has not changed since the index was written
+
+        :param indexed_rpm: the RPM as recorded in the index
+        :return: True if the RPM file still has the indexed size and modification time
+        """
+        try:
+            rpm_stat = os.stat(os.path.join(self.repo_path, indexed_rpm.rpm_file))
+        except OSError:
+            return False
+        return rpm_stat.st_size == indexed_rpm.size and int(rpm_stat.st_mtime) == indexed_rpm.mtime
+
+    def classify(self) -> RepoClassification:
+        """
+        Classifies every RPM of the repo cache in a single pass. RPMs found unchanged in the
+        index are not read again, the others are read on a pool of 'workers' threads.
+
+        :return: the :class:`RepoClassification` of the repo cache
+        """
+        indexed_rpms = {}
+        if self.index_path is not None:
+            indexed_rpms = load_index(self.index_path, self.get_category_directory_types())
+
+        rpms = []
+        rpm_files_to_read = []
+        for rpm_file in self.list_rpm_files():
+            indexed_rpm = indexed_rpms.get(rpm_file)
+            if indexed_rpm is not None and self._is_current(indexed_rpm):
+                rpms.append(indexed_rpm)
+            else:
+                rpms.append(None)
+                rpm_files_to_read.append(rpm_file)
+
+        read_rpms = iter(map_in_order(self.classify_rpm, rpm_files_to_read, self.workers))
+        rpms = [rpm if rpm is not None else next(read_rpms) for rpm in rpms]
+
+        self.scanned_count += len(rpm_files_to_read)
+        self.reused_count += len(rpms) - len(rpm_files_to_read)
+        increment('rpms_scanned', len(rpm_files_to_read))
+        increment('rpms_reused_from_index', len(rpms) - len(rpm_files_to_read))
+        return RepoClassification(rpms, self.categories)
+
+
+def load_index(index_path: str, model_directory_types) -> Dict[str, ClassifiedRpm]:
+    """
+    Loads a classification index. An index that is missing, unreadable or that was built
+    without all of the required model directory types is ignored.
+
+    :param index_path: path to the index file
+    :param model_directory_types: the model directory types the index must cover
+    :return: the indexed RPMs keyed by RPM file
+    """
+    try:
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+        if index['version'] != _INDEX_FORMAT_VERSION or \
+                not set(model_directory_types).issubset(index['model_directory_types']):
+            return {}
+        return {entry['rpm_file']: ClassifiedRpm(
+            rpm_file=entry['rpm_file'],
+            name=entry['name'],
+            version=entry['version'],
+            size=entry['size'],
+            mtime=entry['mtime'],
+            model_directory_types=frozenset(entry['model_directory_types']))
+                for entry in index['rpms']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def write_index(classification: RepoClassification, model_directory_types, index_path: str):
+    """
+    Writes a classification index
+
+    :param classification: the classification of the repo cache
+    :param model_directory_types: the model directory types the classification covers
+    :param index_path: path to the index file
+    :return: None
+    """
+    index = {
+        'version': _INDEX_FORMAT_VERSION,
+        'model_directory_types': sorted(model_directory_types),
+        'rpms': [{'rpm_file': rpm.rpm_file,
+                  'name': rpm.name,
+                  'version': rpm.version,
+                  'size': rpm.size,
+                  'mtime': rpm.mtime,
+                  'model_directory_types': sorted(rpm.model_directory_types),
+                  'categories': classification.get_categories(rpm.name)}
+                 for rpm in classification.rpms]
+    }
+    temporary_index_path = index_path + '.tmp'
+    with open(temporary_index_path, 'w') as index_file:
+        json.dump(index, index_file, indent=1)
+    os.replace(temporary_index_path, index_path)
+
+
+_CLASSIFICATIONS = {}
+
+
+def classify_repo(repo_path: str, index_path: Optional[str] = None) -> RepoClassification:
+    """
+    Classifies a repo cache with all registered categories. The result is kept for the
+    life of the process so that every strategy is a view over a single scan.
+
+    :param repo_path: path to the repo cache
+    :param index_path: path to a classification index of the repo cache, if one exists
+    :return: the :class:`RepoClassification` of the repo cache
+    """
+    cache_key = (os.path.abspath(repo_path), os.stat(repo_path).st_mtime_ns, index_path,
+                 tuple(sorted(_MODEL_CATEGORIES)))
+    if cache_key not in _CLASSIFICATIONS:
+        _CLASSIFICATIONS[cache_key] = RepoClassifier(repo_path, index_path=index_path).classify()
+    return _CLASSIFICATIONS[cache_key]
+
+
+class RepoIndexTool:
+    """
+    This class is responsible for writing the classification index of the zypper cache
+    when the base image is built
+    """
+    _ENM_ISO_REPO_PATH = '/var/cache/zypp/packages/enm_iso_repo/'
+    _REPO_INDEX_PATH = '/etc/opt/ericsson/models/enm_iso_repo_index.json'
+
+    def __init__(self):
+        self.logger = get_logger(self.__class__.__name__)
+
+    def build_index(self):
+        """
+        Classifies the zypper cache and writes the classification index
+
+        :return: None
+        """
+        self.logger.info('Building classification index of %s...', self._ENM_ISO_REPO_PATH)
+        repo_classifier = RepoClassifier(self._ENM_ISO_REPO_PATH, index_path=self._REPO_INDEX_PATH)
+        classification = repo_classifier.classify()
+        write_index(classification, repo_classifier.get_category_directory_types(),
+                    self._REPO_INDEX_PATH)
+        self.logger.info('Classification index %s written, %i RPMs read, %i RPMs unchanged',
+                         self._REPO_INDEX_PATH, repo_classifier.scanned_count,
+                         repo_classifier.reused_count)
+
+
+def main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    argparse.ArgumentParser(description='Write the classification index of the zypper '
+                                        'cache').parse_args(arguments)
+    RepoIndexTool().build_index()
+
+
+if __name__ == '__main__':
+    run_tool('repo_classifier', main)
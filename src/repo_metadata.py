@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import bz2
+import gzip
+import lzma
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Collection, Dict, List, Optional
+
+"""
+Reader for the rpm-md metadata of a repository as cached by zypper. The file lists and
+versions of the packages are streamed from filelists.xml and primary.xml, so the content
+and version of a package are known without downloading it.
+"""
+
+_OPENERS = {'.gz': gzip.open, '.xz': lzma.open, '.bz2': bz2.open, '.xml': open}
+_VERSION_SEGMENT = re.compile(r'~|\d+|[a-zA-Z]+')
+
+
+class RepoMetadataError(Exception):
+    """
+    Raised when the metadata of a repository is missing or cannot be read
+    """
+
+
+def _get_local_name(tag: str) -> str:
+    """
+    :param tag: the element tag, e.g. '{http://linux.duke.edu/metadata/repo}data'
+    :return: the tag name without namespace, e.g. 'data'
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def _compare_version_parts(first: str, second: str) -> int:
+    """
+    Compares two version or release strings the way rpm does: numeric segments compare as
+    numbers and sort after alphabetic ones, '~' sorts before anything.
+
+    :param first: the first version string
+    :param second: the second version string
+    :return: a negative number, zero or a positive number as first is older, equal or newer
+    """
+    first_segments = _VERSION_SEGMENT.findall(first)
+    second_segments = _VERSION_SEGMENT.findall(second)
+    for first_segment, second_segment in zip(first_segments, second_segments):
+        if first_segment == second_segment:
+            continue
+        if '~' in (first_segment, second_segment):
+            return -1 if first_segment == '~' else 1
+        if first_segment.isdigit() != second_segment.isdigit():
+            return 1 if first_segment.isdigit() else -1
+        if first_segment.isdigit():
+            if int(first_segment) == int(second_segment):
+                continue
+            return 1 if int(first_segment) > int(second_segment) else -1
+        return -1 if first_segment < second_segment else 1
+    remaining = first_segments[len(second_segments):] or second_segments[len(first_segments):]
+    if not remaining:
+        return 0
+    longer_is_older = remaining[0] == '~'
+    first_is_longer = len(first_segments) > len(second_segments)
+    return -1 if first_is_longer == longer_is_older else 1
+
+
+def compare_versions(first: str, second: str) -> int:
+    """
+    Compares two '<version>-<release>' strings
+
+    :param first: the first version
+    :param second: the second version
+    :return: a negative number, zero or a positive number as first is older, equal or newer
+    """
+    first_version, _, first_release = first.partition('-')
+    second_version, _, second_release = second.partition('-')
+    return _compare_version_parts(first_version, second_version) or \
+        _compare_version_parts(first_release, second_release)
+
+
+def get_metadata_path(repo_metadata_path: str, data_type: str) -> str:
+    """
+    Finds a metadata file of a repository from its repomd.xml
+
+    :param repo_metadata_path: directory holding the 'repodata' directory of the repository
+    :param data_type: the type of metadata, e.g. 'primary' or 'filelists'
+    :return: the path of the metadata file
+    """
+    repomd_path = os.path.join(repo_metadata_path, 'repodata', 'repomd.xml')
+    try:
+        for _, element in ET.iterparse(repomd_path):
+            if _get_local_name(element.tag) == 'data' and element.get('type') == data_type:
+                for data_entry in element:
+                    if _get_local_name(data_entry.tag) == 'location' and data_entry.get('href'):
+                        return os.path.join(repo_metadata_path, data_entry.get('href'))
+    except (OSError, ET.ParseError) as repomd_error:
+        raise RepoMetadataError(f'Unable to read {repomd_path}: {repomd_error}') \
+            from repomd_error
+    raise RepoMetadataError(f'No {data_type} metadata listed in {repomd_path}')
+
+
+def _iterate_packages(repo_metadata_path: str, data_type: str):
+    """
+    Streams the 'package' elements of a metadata file. Each element is cleared once the
+    caller has processed it.
+
+    :param repo_metadata_path: directory holding the 'repodata' directory of the repository
+    :param data_type: the type of metadata, e.g. 'primary' or 'filelists'
+    :return: a generator of 'package' elements
+    """
+    metadata_path = get_metadata_path(repo_metadata_path, data_type)
+    opener = _OPENERS.get(os.path.splitext(metadata_path)[1])
+    if opener is None:
+        raise RepoMetadataError(f'Unsupported compression of {metadata_path}')
+
+    try:
+        with opener(metadata_path, 'rb') as metadata_file:
+            for _, element in ET.iterparse(metadata_file):
+                if _get_local_name(element.tag) == 'package':
+                    yield element
+                    element.clear()
+    except (OSError, EOFError, lzma.LZMAError, ET.ParseError) as metadata_error:
+        raise RepoMetadataError(f'Unable to read {metadata_path}: {metadata_error}') \
+            from metadata_error
+
+
+def read_package_file_lists(repo_metadata_path: str,
+                            package_names: Optional[Collection[str]] = None) \
+        -> Dict[str, List[str]]:
+    """
+    Streams the file lists of the packages of a repository. When several versions of a
+    package are listed their file lists are merged.
+
+    :param repo_metadata_path: directory holding the 'repodata' directory of the repository
+    :param package_names: names of the packages to read, all packages if None
+    :return: the files of every package keyed by package name
+    """
+    file_lists = {}
+    for package in _iterate_packages(repo_metadata_path, 'filelists'):
+        name = package.get('name')
+        if package_names is None or name in package_names:
+            file_lists.setdefault(name, []).extend(
+                package_entry.text for package_entry in package
+                if _get_local_name(package_entry.tag) == 'file' and package_entry.text)
+    return file_lists
+
+
+def read_package_versions(repo_metadata_path: str,
+                          package_names: Optional[Collection[str]] = None) -> Dict[str, str]:
+    """
+    Streams the versions of the packages of a repository
+
+    :param repo_metadata_path: directory holding the 'repodata' directory of the repository
+    :param package_names: names of the packages to read, all packages if None
+    :return: the latest '<version>-<release>' of every package keyed by package name
+    """
+    versions = {}
+    for package in _iterate_packages(repo_metadata_path, 'primary'):
+        name = None
+        version = None
+        for package_entry in package:
+            tag = _get_local_name(package_entry.tag)
+            if tag == 'name':
+                name = (package_entry.text or '').strip()
+            elif tag == 'version':
+                version = f"{package_entry.get('ver', '')}-{package_entry.get('rel', '')}"
+        if name and version and (package_names is None or name in package_names):
+            if name not in versions or compare_versions(version, versions[name]) > 0:
+                versions[name] = version
+    return versions
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import os
+import random
+import re
+import sys
+import time
+from typing import Iterable, List, Optional
+
+from logger_utils import get_logger
+from command_executor import TIMEOUT_RETURNCODE, call_subprocess_command_with_stderr
+
+"""
+Retry policy with exponential backoff, jitter, an attempt limit and an overall deadline,
+and classification of command failures as retryable or fatal.
+
+Run as a script to execute a command under the policy, e.g. from a shell script:
+    retry_policy.py java -cp <classpath> <main class> <args>
+"""
+
+RETRYABLE = 'retryable'
+FATAL = 'fatal'
+
+_DEFAULT_FATAL_EXIT_CODES = (126, 127)
+_DEFAULT_RETRYABLE_EXIT_CODES = (TIMEOUT_RETURNCODE,)
+_DEFAULT_FATAL_PATTERNS = (
+    r'Could not find or load main class',
+    r'ClassNotFoundException',
+    r'NoClassDefFoundError',
+    r'UnsupportedClassVersionError',
+    r'Invalid or corrupt jarfile',
+)
+_DEFAULT_RETRYABLE_PATTERNS = (
+    r'ConnectException',
+    r'Connection refused',
+    r'NotBoundException',
+    r'RemoteException',
+    r'SocketTimeoutException',
+)
+
+
+class RetryError(Exception):
+    """
+    Raised when a command fails fatally or the retry policy is exhausted
+    """
+
+    def __init__(self, message: str, returncode: int, attempts: int = 0):
+        super().__init__(message)
+        self.returncode = returncode
+        self.attempts = attempts
+
+
+def _get_env_number(env_key: str, default: float) -> float:
+    """
+    :param env_key: environment variable holding a number
+    :param default: value used when the environment variable is not set
+    :return: the number
+    """
+    value = os.getenv(env_key)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError as value_error:
+        raise ValueError(f'{env_key} must be a number, "{value}" supplied') from value_error
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter, bounded by a maximum number of attempts and a deadline
+    """
+
+    def __init__(self, max_attempts: int = 30, initial_delay: float = 5, max_delay: float = 120,
+                 multiplier: float = 2, jitter: float = 0.2, deadline: Optional[float] = 3600,
+                 attempt_timeout: Optional[float] = None):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+
+    @classmethod
+    def from_env(cls, prefix: str = 'MDC_RETRY', **defaults) -> 'RetryPolicy':
+        """
+        Creates a policy configured by the <prefix>_MAX_ATTEMPTS, <prefix>_INITIAL_DELAY,
+        <prefix>_MAX_DELAY, <prefix>_MULTIPLIER, <prefix>_JITTER, <prefix>_DEADLINE and
+        <prefix>_ATTEMPT_TIMEOUT environment variables. A deadline or attempt timeout of 0
+        means no limit.
+
+        :param prefix: prefix of the environment variables
+        :param defaults: defaults for settings whose environment variable is not set
+        :return: the :class:`RetryPolicy`
+        """
+        policy = cls(**defaults)
+        deadline = _get_env_number(f'{prefix}_DEADLINE', policy.deadline or 0)
+        attempt_timeout = _get_env_number(f'{prefix}_ATTEMPT_TIMEOUT', policy.attempt_timeout or 0)
+        return cls(max_attempts=int(_get_env_number(f'{prefix}_MAX_ATTEMPTS',
+                                                    policy.max_attempts)),
+                   initial_delay=_get_env_number(f'{prefix}_INITIAL_DELAY', policy.initial_delay),
+                   max_delay=_get_env_number(f'{prefix}_MAX_DELAY', policy.max_delay),
+                   multiplier=_get_env_number(f'{prefix}_MULTIPLIER', policy.multiplier),
+                   jitter=_get_env_number(f'{prefix}_JITTER', policy.jitter),
+                   deadline=deadline if deadline > 0 else None,
+                   attempt_timeout=attempt_timeout if attempt_timeout > 0 else None)
+
+    def get_delay(self, attempt: int) -> float:
+        """
+        :param attempt: the number of the attempt that failed, starting at 1
+        :return: the seconds to wait before the next attempt
+        """
+        delay = min(self.initial_delay * self.multiplier ** (attempt - 1), self.max_delay)
+        return max(delay * (1 + random.uniform(-self.jitter, self.jitter)), 0)
+
+
+class FailureClassifier:
+    """
+    Classifies a failed command as retryable or fatal from its exit code and stderr.
+    Fatal exit codes are always fatal and retryable exit codes, a timed out attempt by
+    default, always retryable. Then retryable stderr patterns take precedence over fatal
+    ones. Failures matching no rule are classified as unclassified, fatal by default so
+    that only known transient failures are retried.
+    """
+
+    def __init__(self, fatal_exit_codes: Iterable[int] = _DEFAULT_FATAL_EXIT_CODES,
+                 fatal_patterns: Iterable[str] = _DEFAULT_FATAL_PATTERNS,
+                 retryable_patterns: Iterable[str] = _DEFAULT_RETRYABLE_PATTERNS,
+                 unclassified: str = FATAL,
+                 retryable_exit_codes: Iterable[int] = _DEFAULT_RETRYABLE_EXIT_CODES):
+        self.fatal_exit_codes = frozenset(fatal_exit_codes)
+        self.retryable_exit_codes = frozenset(retryable_exit_codes)
+        self.fatal_patterns = [re.compile(pattern) for pattern in fatal_patterns]
+        self.retryable_patterns = [re.compile(pattern) for pattern in retryable_patterns]
+        self.unclassified = unclassified
+
+    def classify(self, returncode: int, stderr: str) -> str:
+        """
+        :param returncode: the exit code of the failed command
+        :param stderr: the trailing stderr of the failed command
+        :return: RETRYABLE or FATAL
+        """
+        if returncode in self.fatal_exit_codes:
+            return FATAL
+        if returncode in self.retryable_exit_codes:
+            return RETRYABLE
+        if any(pattern.search(stderr) for pattern in self.retryable_patterns):
+            return RETRYABLE
+        if any(pattern.search(stderr) for pattern in self.fatal_patterns):
+            return FATAL
+        return self.unclassified
+
+
+def run_with_retry(command: List, policy: RetryPolicy, logger,
+                   classifier: Optional[FailureClassifier] = None) -> int:
+    """
+    Runs a command until it succeeds, fails fatally or the policy is exhausted.
+    No delay follows a successful attempt. An attempt running longer than the attempt
+    timeout of the policy is stopped and fails with the exit code 124.
+
+    :param command: the command to run
+    :param policy: the :class:`RetryPolicy` to apply
+    :param logger: the logger to report attempts to
+    :param classifier: the :class:`FailureClassifier`, the default classifier if None
+    :return: the number of attempts taken
+    """
+    classifier = FailureClassifier() if classifier is None else classifier
+    start_time = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        returncode, stderr = call_subprocess_command_with_stderr(
+            command, timeout=policy.attempt_timeout)
+        if returncode == 0:
+            return attempt
+
+        if classifier.classify(returncode, stderr) == FATAL:
+            raise RetryError(f'Command failed with non-retryable exit code {returncode} '
+                             f'on attempt {attempt}', returncode, attempt)
+        if policy.max_attempts and attempt >= policy.max_attempts:
+            raise RetryError(f'Command failed with exit code {returncode} after '
+                             f'{attempt} attempts', returncode, attempt)
+
+        delay = policy.get_delay(attempt)
+        elapsed = time.monotonic() - start_time
+        if policy.deadline is not None and elapsed + delay >= policy.deadline:
+            raise RetryError(f'Command failed with exit code {returncode}, deadline of '
+                             f'{policy.deadline} seconds reached after {attempt} attempts',
+                             returncode, attempt)
+
+        logger.warning('Attempt %i failed with exit code %i, retrying in %.1f seconds...',
+                       attempt, returncode, delay)
+        time.sleep(delay)
+
+
+if __name__ == '__main__':
+    retry_logger = get_logger('RetryPolicy')
+    try:
+        attempts = run_with_retry(sys.argv[1:], RetryPolicy.from_env(), retry_logger)
+        retry_logger.info('Command succeeded after %i attempt(s)', attempts)
+    except RetryError as retry_error:
+        retry_logger.error(str(retry_error))
+        sys.exit(retry_error.returncode or 1)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import os
+import struct
+from typing import Dict, List, NamedTuple, Optional
+
+"""
+Pure Python reader for the metadata sections of an RPM package file.
+
+Only the lead, the signature header and the main header are read, the payload
+is never touched. This allows package metadata such as the name, version and
+file list to be obtained without forking the 'rpm' binary.
+"""
+
+_LEAD_SIZE = 96
+_LEAD_MAGIC = b'\xed\xab\xee\xdb'
+_HEADER_MAGIC = b'\x8e\xad\xe8'
+_HEADER_INTRO = struct.Struct('>3sB4xII')
+_INDEX_ENTRY = struct.Struct('>iiii')
+
+RPMSIGTAG_SHA1 = 269
+RPMSIGTAG_SHA256 = 273
+RPMSIGTAG_SIZE = 1000
+RPMSIGTAG_MD5 = 1004
+
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+RPMTAG_RELEASE = 1002
+RPMTAG_ARCH = 1022
+RPMTAG_OLDFILENAMES = 1027
+RPMTAG_DIRINDEXES = 1116
+RPMTAG_BASENAMES = 1117
+RPMTAG_DIRNAMES = 1118
+RPMTAG_PAYLOADCOMPRESSOR = 1125
+RPMTAG_PAYLOADDIGEST = 5092
+RPMTAG_PAYLOADDIGESTALGO = 5093
+
+_RPM_INT16_TYPE = 3
+_RPM_INT32_TYPE = 4
+_RPM_STRING_TYPE = 6
+_RPM_BIN_TYPE = 7
+_RPM_STRING_ARRAY_TYPE = 8
+_RPM_I18NSTRING_TYPE = 9
+
+_DEFAULT_TAGS = (RPMTAG_NAME, RPMTAG_VERSION, RPMTAG_RELEASE, RPMTAG_ARCH,
+                 RPMTAG_OLDFILENAMES, RPMTAG_DIRINDEXES, RPMTAG_BASENAMES, RPMTAG_DIRNAMES)
+
+
+class RpmHeaderError(Exception):
+    """
+    Raised when a file cannot be parsed as an RPM package
+    """
+
+
+class RpmSections(NamedTuple):
+    """
+    Decoded signature and header values of an RPM package and the offsets of its sections
+    """
+    signature: Dict[int, object]
+    header: Dict[int, object]
+    header_offset: int
+    payload_offset: int
+
+
+class RpmHeader(NamedTuple):
+    """
+    Metadata read from the main header of an RPM package
+    """
+    name: str
+    version: str
+    release: str
+    arch: str
+    file_names: List[str]
+
+
+def _read_exactly(rpm_file, size: int) -> bytes:
+    """
+    Reads exactly 'size' bytes from the supplied file object
+
+    :param rpm_file: binary file object positioned at the data to read
+    :param size: number of bytes to read
+    :return: the bytes read
+    """
+    data = rpm_file.read(size)
+    if len(data) != size:
+        raise RpmHeaderError(f'Unexpected end of file, wanted {size} bytes got {len(data)}')
+    return data
+
+
+def _read_header_section(rpm_file, wanted_tags) -> Dict[int, object]:
+    """
+    Reads a header structure (index entries and data store) from the current position
+    and decodes the entries whose tag is in 'wanted_tags'.
+
+    :param rpm_file: binary file object positioned at the start of a header structure
+    :param wanted_tags: collection of tags to decode, or None to only skip the section
+    :return: a dictionary of tag to decoded value
+    """
+    magic, _, index_count, data_size = _HEADER_INTRO.unpack(
+        _read_exactly(rpm_file, _HEADER_INTRO.size))
+    if magic != _HEADER_MAGIC:
+        raise RpmHeaderError('Invalid RPM header magic')
+
+    if wanted_tags is None:
+        rpm_file.seek(index_count * _INDEX_ENTRY.size + data_size, 1)
+        return {}
+
+    index = _read_exactly(rpm_file, index_count * _INDEX_ENTRY.size)
+    store = _read_exactly(rpm_file, data_size)
+
+    values = {}
+    for entry in range(index_count):
+        tag, tag_type, offset, count = _INDEX_ENTRY.unpack_from(index, entry * _INDEX_ENTRY.size)
+        if tag in wanted_tags:
+            values[tag] = _decode_value(store, tag_type, offset, count)
+    return values
+
+
+def _decode_value(store: bytes, tag_type: int, offset: int, count: int):
+    """
+    Decodes a single header value from the data store
+
+    :param store: the header data store
+    :param tag_type: RPM type of the value
+    :param offset: offset of the value in the data store
+    :param count: number of items in the value
+    :return: the decoded value
+    """
+    if offset < 0 or offset > len(store):
+        raise RpmHeaderError(f'Header entry offset {offset} is out of range')
+
+    if tag_type in (_RPM_STRING_TYPE, _RPM_STRING_ARRAY_TYPE, _RPM_I18NSTRING_TYPE):
+        strings = []
+        position = offset
+        items = 1 if tag_type == _RPM_STRING_TYPE else count
+        for _ in range(items):
+            end = store.find(b'\x00', position)
+            if end < 0:
+                raise RpmHeaderError('Unterminated string in RPM header')
+            strings.append(store[position:end].decode('utf-8', 'replace'))
+            position = end + 1
+        return strings[0] if tag_type == _RPM_STRING_TYPE else strings
+    if tag_type == _RPM_INT32_TYPE:
+        return list(struct.unpack_from(f'>{count}i', store, offset))
+    if tag_type == _RPM_INT16_TYPE:
+        return list(struct.unpack_from(f'>{count}h', store, offset))
+    if tag_type == _RPM_BIN_TYPE:
+        return store[offset:offset + count]
+    raise RpmHeaderError(f'Unsupported RPM header type {tag_type}')
+
+
+def _get_file_names(values: Dict[int, object]) -> List[str]:
+    """
+    Builds the full file names of a package from its header values
+
+    :param values: decoded header values
+    :return: list of absolute file names contained in the package
+    """
+    if RPMTAG_BASENAMES in values:
+        dir_names = values.get(RPMTAG_DIRNAMES, [])
+        dir_indexes = values.get(RPMTAG_DIRINDEXES, [])
+        try:
+            return [dir_names[dir_index] + base_name
+                    for base_name, dir_index in zip(values[RPMTAG_BASENAMES], dir_indexes)]
+        except IndexError as index_error:
+            raise RpmHeaderError('Invalid directory index in RPM header') from index_error
+    return list(values.get(RPMTAG_OLDFILENAMES, []))
+
+
+def read_rpm_sections(rpm_path: str, signature_tags=(), header_tags=_DEFAULT_TAGS) -> RpmSections:
+    """
+    Reads the requested tags from the signature and main header of an RPM package
+
+    :param rpm_path: path to the RPM package file
+    :param signature_tags: collection of signature tags to decode
+    :param header_tags: collection of header tags to decode
+    :return: the :class:`RpmSections` of the package
+    """
+    try:
+        with open(rpm_path, 'rb') as rpm_file:
+            lead = _read_exactly(rpm_file, _LEAD_SIZE)
+            if lead[:4] != _LEAD_MAGIC:
+                raise RpmHeaderError(f'{rpm_path} is not an RPM package')
+
+            signature = _read_header_section(rpm_file, frozenset(signature_tags)
+                                             if signature_tags else None)
+            signature_size = rpm_file.tell() - _LEAD_SIZE
+            rpm_file.seek((8 - signature_size % 8) % 8, 1)
+
+            header_offset = rpm_file.tell()
+            header = _read_header_section(rpm_file, frozenset(header_tags))
+            return RpmSections(signature=signature, header=header, header_offset=header_offset,
+                               payload_offset=rpm_file.tell())
+    except struct.error as struct_error:
+        raise RpmHeaderError(f'Corrupt RPM header in {rpm_path}') from struct_error
+
+
+def read_rpm_header_values(rpm_path: str, tags=_DEFAULT_TAGS) -> Dict[int, object]:
+    """
+    Reads the requested tags from the main header of an RPM package
+
+    :param rpm_path: path to the RPM package file
+    :param tags: collection of header tags to decode
+    :return: a dictionary of tag to decoded value
+    """
+    return read_rpm_sections(rpm_path, header_tags=tags).header
+
+
+def is_rpm_complete(rpm_path: str) -> bool:
+    """
+    Checks that an RPM package can be parsed and is not truncated, by comparing its size
+    with the header and payload size recorded in its signature
+
+    :param rpm_path: path to the RPM package file
+    :return: True if the package headers parse and the file has the expected size
+    """
+    try:
+        sections = read_rpm_sections(rpm_path, signature_tags=(RPMSIGTAG_SIZE,),
+                                     header_tags=(RPMTAG_NAME,))
+        file_size = os.stat(rpm_path).st_size
+    except (RpmHeaderError, OSError):
+        return False
+    expected_size = sections.signature.get(RPMSIGTAG_SIZE)
+    if expected_size is None:
+        return file_size > sections.payload_offset
+    return file_size == sections.header_offset + expected_size[0] % 2 ** 32
+
+
+def read_rpm_header(rpm_path: str) -> RpmHeader:
+    """
+    Reads the name, version and file list of an RPM package without running 'rpm'
+
+    :param rpm_path: path to the RPM package file
+    :return: the :class:`RpmHeader` of the package
+    """
+    values = read_rpm_header_values(rpm_path)
+    if RPMTAG_NAME not in values:
+        raise RpmHeaderError(f'No package name found in {rpm_path}')
+
+    return RpmHeader(name=values[RPMTAG_NAME],
+                     version=values.get(RPMTAG_VERSION, ''),
+                     release=values.get(RPMTAG_RELEASE, ''),
+                     arch=values.get(RPMTAG_ARCH, ''),
+                     file_names=_get_file_names(values))
+
+
+def get_rpm_file_names(rpm_path: str) -> Optional[List[str]]:
+    """
+    Gets the file names contained in an RPM package, the equivalent of 'rpm -qpl'
+
+    :param rpm_path: path to the RPM package file
+    :return: list of file names or None if the file could not be parsed
+    """
+    try:
+        return read_rpm_header(rpm_path).file_names
+    except (RpmHeaderError, OSError):
+        return None
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import bz2
+import gzip
+import lzma
+import os
+import stat
+import struct
+import zlib
+from shutil import copy2
+from typing import Callable, List, NamedTuple, Optional
+
+from rpm_header import RpmHeaderError, read_rpm_sections, RPMTAG_NAME, \
+    RPMTAG_PAYLOADCOMPRESSOR, RPMTAG_VERSION
+
+"""
+Pure Python extraction of files from the payload of an RPM package.
+
+The payload is a 'newc' cpio archive compressed with gzip, bzip2, xz or lzma. Payloads
+compressed with any other compressor, e.g. zstd, raise an RpmPayloadError so that the
+package can be installed by zypper instead.
+"""
+
+_CPIO_MAGICS = (b'070701', b'070702')
+_CPIO_HEADER = struct.Struct('6s8s8s8s8s8s8s8s8s8s8s8s8s8s')
+_CPIO_TRAILER = 'TRAILER!!!'
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+_DECOMPRESSORS = {
+    'gzip': lambda payload: gzip.GzipFile(fileobj=payload, mode='rb'),
+    'bzip2': lambda payload: bz2.BZ2File(payload, mode='rb'),
+    'xz': lambda payload: lzma.LZMAFile(payload, mode='rb'),
+    'lzma': lambda payload: lzma.LZMAFile(payload, mode='rb'),
+}
+
+
+class RpmPayloadError(Exception):
+    """
+    Raised when the payload of an RPM package cannot be read
+    """
+
+
+class CpioEntry(NamedTuple):
+    """
+    A member of a 'newc' cpio archive
+    """
+    name: str
+    inode: int
+    mode: int
+    links: int
+    mtime: int
+    size: int
+
+
+class ExtractedRpm(NamedTuple):
+    """
+    The files extracted from the payload of an RPM package
+    """
+    name: str
+    version: str
+    file_paths: List[str]
+
+
+def _read_exactly(payload, size: int) -> bytes:
+    """
+    :param payload: the decompressed payload stream
+    :param size: number of bytes to read
+    :return: the bytes read
+    """
+    data = payload.read(size)
+    if len(data) != size:
+        raise RpmPayloadError('Truncated RPM payload')
+    return data
+
+
+def _skip(payload, size: int):
+    """
+    Reads past 'size' bytes of the payload stream
+    """
+    while size > 0:
+        size -= len(_read_exactly(payload, min(size, _COPY_BUFFER_SIZE)))
+
+
+def read_cpio_entry(payload) -> Optional[CpioEntry]:
+    """
+    Reads the header of the next cpio archive member, leaving the stream at its data
+
+    :param payload: the decompressed payload stream
+    :return: the :class:`CpioEntry` or None at the end of the archive
+    """
+    fields = _CPIO_HEADER.unpack(_read_exactly(payload, _CPIO_HEADER.size))
+    if fields[0] not in _CPIO_MAGICS:
+        raise RpmPayloadError(f'Unsupported cpio format {fields[0]!r}')
+    try:
+        inode, mode, _, _, links, mtime, size, _, _, _, _, name_size, _ = \
+            (int(field, 16) for field in fields[1:])
+    except ValueError as value_error:
+        raise RpmPayloadError('Corrupt cpio header') from value_error
+    name = _read_exactly(payload, name_size).rstrip(b'\x00').decode(errors='surrogateescape')
+    _skip(payload, (4 - (_CPIO_HEADER.size + name_size) % 4) % 4)
+    if name == _CPIO_TRAILER:
+        return None
+    return CpioEntry(name=name, inode=inode, mode=mode, links=links, mtime=mtime, size=size)
+
+
+def _write_file(payload, entry: CpioEntry, target_path: str):
+    """
+    Writes the data of a cpio archive member under a temporary name and renames it into
+    place with the mode and modification time of the member
+    """
+    remaining = entry.size
+    with open(target_path + '.tmp', 'wb') as target_file:
+        while remaining > 0:
+            data = _read_exactly(payload, min(remaining, _COPY_BUFFER_SIZE))
+            target_file.write(data)
+            remaining -= len(data)
+    os.chmod(target_path + '.tmp', stat.S_IMODE(entry.mode))
+    os.utime(target_path + '.tmp', (entry.mtime, entry.mtime))
+    os.replace(target_path + '.tmp', target_path)
+
+
+def extract_cpio_files(payload, get_target_path: Callable[[str], Optional[str]]) -> List[str]:
+    """
+    Extracts the regular files of a 'newc' cpio archive that have a target path. A file
+    with several hard links is written to the target path of every link.
+
+    :param payload: the decompressed payload stream
+    :param get_target_path: returns the path to write an archive member to, given its
+                            absolute name, or None to skip it
+    :return: the paths written
+    """
+    written_paths = []
+    pending_links = {}
+    while True:
+        entry = read_cpio_entry(payload)
+        if entry is None:
+            for link_path in (path for paths in pending_links.values() for path in paths):
+                open(link_path, 'wb').close()
+                written_paths.append(link_path)
+            return written_paths
+        target_path = get_target_path(os.path.normpath('/' + entry.name)) \
+            if stat.S_ISREG(entry.mode) else None
+        if entry.links > 1 and entry.size == 0:
+            if target_path is not None:
+                pending_links.setdefault(entry.inode, []).append(target_path)
+        elif target_path is not None or entry.inode in pending_links:
+            link_paths = pending_links.pop(entry.inode, [])
+            if target_path is None:
+                target_path = link_paths.pop()
+            _write_file(payload, entry, target_path)
+            written_paths.append(target_path)
+            for link_path in link_paths:
+                copy2(target_path, link_path)
+                written_paths.append(link_path)
+        else:
+            _skip(payload, entry.size)
+        _skip(payload, (4 - entry.size % 4) % 4)
+
+
+def extract_rpm_files(rpm_path: str, source_directory: str, target_root: str) -> ExtractedRpm:
+    """
+    Extracts the regular files an RPM package installs directly in 'source_directory' into
+    '<target_root>/<rpm_name>/<rpm_version>/', without installing the package. Files
+    already written are removed again if the payload cannot be read.
+
+    :param rpm_path: path to the RPM package file
+    :param source_directory: the directory the package installs the wanted files in
+    :param target_root: the directory to create the package directories in
+    :return: the :class:`ExtractedRpm`
+    """
+    sections = read_rpm_sections(rpm_path, header_tags=(RPMTAG_NAME, RPMTAG_VERSION,
+                                                        RPMTAG_PAYLOADCOMPRESSOR))
+    if RPMTAG_NAME not in sections.header:
+        raise RpmHeaderError(f'No package name found in {rpm_path}')
+    name = sections.header[RPMTAG_NAME]
+    version = sections.header.get(RPMTAG_VERSION, '')
+    compressor = sections.header.get(RPMTAG_PAYLOADCOMPRESSOR, 'gzip')
+    if compressor not in _DECOMPRESSORS:
+        raise RpmPayloadError(f'Unsupported payload compressor {compressor} in {rpm_path}')
+
+    source_directory = os.path.normpath(source_directory)
+    target_directory = os.path.join(target_root, name, version)
+    target_paths = []
+
+    def get_target_path(file_name: str) -> Optional[str]:
+        if os.path.dirname(file_name) != source_directory:
+            return None
+        if not target_paths:
+            os.makedirs(target_directory, exist_ok=True)
+        target_paths.append(os.path.join(target_directory, os.path.basename(file_name)))
+        return target_paths[-1]
+
+    try:
+        with open(rpm_path, 'rb') as rpm_file:
+            rpm_file.seek(sections.payload_offset)
+            with _DECOMPRESSORS[compressor](rpm_file) as payload:
+                written_paths = extract_cpio_files(payload, get_target_path)
+    except (OSError, EOFError, lzma.LZMAError, zlib.error, RpmPayloadError) as error:
+        for target_path in target_paths:
+            for partial_path in (target_path, target_path + '.tmp'):
+                if os.path.lexists(partial_path):
+                    os.unlink(partial_path)
+        if isinstance(error, RpmPayloadError):
+            raise
+        raise RpmPayloadError(f'Unable to read the payload of {rpm_path}: {error}') from error
+    return ExtractedRpm(name=name, version=version, file_paths=written_paths)
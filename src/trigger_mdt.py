@@ -7,13 +7,116 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+import argparse
 import datetime
+import hashlib
+import json
 import shutil
 import time
-from os import environ, path, makedirs
+from os import environ, listdir, path, makedirs, replace, stat, walk
+from typing import Dict, Iterable, List, NamedTuple, Optional
 
 from logger_utils import get_logger
-from command_executor import call_subprocess_command
+from command_executor import get_timeout
+from copy_engine import ParallelCopier, is_copy_resume_enabled, is_env_enabled
+from file_watcher import wait_for_file
+from retry_policy import RetryError, RetryPolicy, run_with_retry
+from jar_store import JAR_STORE_ENV_KEY, JarStore
+from metrics import increment, run_tool, span
+
+DELTA_DEPLOY_ENV_KEY = 'MDT_DELTA_DEPLOY'
+
+_DEPLOYMENT_RECORD_FORMAT_VERSION = 1
+
+
+class DeployedPackage(NamedTuple):
+    """
+    A model package laid out in the toBeInstalled directory, as recorded in the deployment
+    record once MDT deployed it
+    """
+    name: str
+    version: str
+    fingerprint: str
+
+    @property
+    def directory(self) -> str:
+        """
+        :return: the directory of the package relative to the toBeInstalled directory
+        """
+        return path.join(self.name, self.version)
+
+
+def _get_package_fingerprint(package_directory: str) -> str:
+    """
+    :param package_directory: the directory holding the jars of a package version
+    :return: a digest of the relative path, size and modification time of every file in it
+    """
+    fingerprint = hashlib.sha256()
+    for root, _, file_names in sorted(walk(package_directory)):
+        for file_name in sorted(file_names):
+            file_path = path.join(root, file_name)
+            file_stat = stat(file_path)
+            fingerprint.update(f'{path.relpath(file_path, package_directory)}\0'
+                               f'{file_stat.st_size}\0{file_stat.st_mtime_ns}\n'.encode())
+    return fingerprint.hexdigest()
+
+
+def get_model_packages(to_be_installed_dir: str) -> Dict[str, DeployedPackage]:
+    """
+    Gets the model packages laid out in a toBeInstalled directory, in the format of
+    /<rpm_name>/<rpm_version>/<jars>
+
+    :param to_be_installed_dir: the toBeInstalled directory
+    :return: the packages keyed by package directory
+    """
+    packages = {}
+    for name in sorted(listdir(to_be_installed_dir)):
+        if not path.isdir(path.join(to_be_installed_dir, name)):
+            continue
+        for version in sorted(listdir(path.join(to_be_installed_dir, name))):
+            package_directory = path.join(to_be_installed_dir, name, version)
+            if path.isdir(package_directory):
+                package = DeployedPackage(name=name, version=version,
+                                          fingerprint=_get_package_fingerprint(package_directory))
+                packages[package.directory] = package
+    return packages
+
+
+def load_deployment_record(record_path: str) -> Dict[str, DeployedPackage]:
+    """
+    Loads a deployment record. A record that is missing or unreadable is ignored.
+
+    :param record_path: path to the deployment record
+    :return: the deployed packages keyed by package directory
+    """
+    try:
+        with open(record_path, 'r') as record_file:
+            record = json.load(record_file)
+        if record['version'] != _DEPLOYMENT_RECORD_FORMAT_VERSION:
+            return {}
+        packages = [DeployedPackage(**package) for package in record['packages']]
+        return {package.directory: package for package in packages}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def write_deployment_record(record_path: str, packages: Iterable[DeployedPackage]):
+    """
+    Writes a deployment record
+
+    :param record_path: path to the deployment record
+    :param packages: the deployed packages
+    :return: None
+    """
+    record = {
+        'version': _DEPLOYMENT_RECORD_FORMAT_VERSION,
+        'packages': [package._asdict() for package in
+                     sorted(packages, key=lambda package: package.directory)]
+    }
+    makedirs(path.dirname(record_path), exist_ok=True)
+    with open(record_path + '.tmp', 'w') as record_file:
+        json.dump(record, record_file, indent=1)
+    replace(record_path + '.tmp', record_path)
 
 
 class MdtTool:
@@ -26,62 +129,210 @@ class MdtTool:
                      'ClientStart'
     _MODELLING_MOUNT_POINT = '/etc/opt/ericsson/ERICmodeldeployment/'
     _MODEL_DEPLOYMENT_SERVICE_FILE = _MODELLING_MOUNT_POINT + 'data/ModelDeploymentService'
+    _JAR_STORE_DIR = 'data/modelJarStore'
+    _DEPLOYMENT_RECORD_DIR = 'data/deploymentRecords'
     _SLEEP_INTERVAL = 5
+    _SERVICE_FILE_TIMEOUT = 3600
+    _SERVICE_FILE_TIMEOUT_ENV_KEY = 'MDT_SERVICE_FILE_TIMEOUT'
 
     def __init__(self):
         self.logger = get_logger(self.__class__.__name__)
 
-    def _copy_model_jars_to_mdt_mount(self, local_to_be_installed_dir: str, mdt_models_dir: str):
+    def _copy_model_jars_to_mdt_mount(self, local_to_be_installed_dir: str, mdt_models_dir: str,
+                                      package_directories: Optional[List[str]] = None):
         """
         Copies model jars to the MDT mount and verifies the status of the operation.
 
         :param str local_to_be_installed_dir: directory path containing jars to be deployed
         :param  str mdt_models_dir: directory on mountpoint to transfer jars to
+        :param package_directories: only copy these <rpm_name>/<rpm_version> directories,
+                                    all jars if None
         :return: None
         """
         try:
             self.logger.info("Copying model jars to the MDT directory...")
             makedirs(path.dirname(mdt_models_dir), exist_ok=True)
-            shutil.copytree(local_to_be_installed_dir, mdt_models_dir)
+            copier = ParallelCopier()
+            if is_env_enabled(JAR_STORE_ENV_KEY, False):
+                self._stage_model_jars_in_jar_store(local_to_be_installed_dir, mdt_models_dir,
+                                                    copier, package_directories)
+                return
+            copy_stats = copier.copy_tree(local_to_be_installed_dir, mdt_models_dir,
+                                          package_directories)
+            increment('files_copied', copy_stats.files)
+            increment('bytes_copied', copy_stats.bytes)
+            self.logger.info('Copied %i model files (%i already present) %.1f MB to %s in '
+                             '%.2f seconds using %i streams: %.1f files/s, %.1f MB/s',
+                             copy_stats.files, copy_stats.skipped_files, copy_stats.bytes / 1e6,
+                             mdt_models_dir, copy_stats.seconds, copier.workers,
+                             copy_stats.files_per_second, copy_stats.megabytes_per_second)
         except OSError as os_error:
             self.logger.error('Failed to copy model jars to the MDT directory %s '
                               'with error %s', {mdt_models_dir}, {str(os_error)})
             raise SystemExit(2) from os_error
 
+    def _get_jar_store(self, copier: ParallelCopier = None) -> JarStore:
+        """
+        :param copier: the copier used to write to the MDT mount
+        :return: the content addressed jar store on the MDT mount
+        """
+        return JarStore(path.join(self._MODELLING_MOUNT_POINT, self._JAR_STORE_DIR), copier)
+
+    def _stage_model_jars_in_jar_store(self, local_to_be_installed_dir: str, mdt_models_dir: str,
+                                       copier: ParallelCopier,
+                                       package_directories: Optional[List[str]] = None):
+        """
+        Stages model jars on the MDT mount as hard links into the content addressed jar store,
+        so that only jars not delivered before are written to the mount.
+
+        :param str local_to_be_installed_dir: directory path containing jars to be deployed
+        :param str mdt_models_dir: directory on mountpoint to stage jars in
+        :param copier: the copier used to write to the MDT mount
+        :param package_directories: only stage these <rpm_name>/<rpm_version> directories,
+                                    all jars if None
+        :return: None
+        """
+        stage_stats = self._get_jar_store(copier).stage_tree(local_to_be_installed_dir,
+                                                             mdt_models_dir, package_directories)
+        increment('files_copied', stage_stats.stored_files)
+        increment('bytes_copied', stage_stats.stored_bytes)
+        increment('files_linked', stage_stats.linked_files)
+        self.logger.info('Staged %i model files in %s in %.2f seconds: %i new files (%.1f MB) '
+                         'written to the jar store, %i files already stored, %i hard linked',
+                         stage_stats.files, mdt_models_dir, stage_stats.seconds,
+                         stage_stats.stored_files, stage_stats.stored_bytes / 1e6,
+                         stage_stats.files - stage_stats.stored_files, stage_stats.linked_files)
+
+    def _prune_jar_store(self):
+        """
+        Removes jars from the jar store that are no longer staged and have not been used
+        within the retention period. Failures are logged and do not fail the deployment.
+
+        :return: None
+        """
+        if not is_env_enabled(JAR_STORE_ENV_KEY, False):
+            return
+        try:
+            removed = self._get_jar_store().prune()
+            self.logger.info('Removed %i unused jars from the jar store', removed)
+        except OSError as os_error:
+            self.logger.warning('Failed to prune the jar store with error %s', str(os_error))
+
+    def _get_deployment_record_path(self, models_type: str) -> str:
+        """
+        :param str models_type: the MODELS_TYPE of the image
+        :return: path of the record of the packages MDT deployed for the model type
+        """
+        return path.join(self._MODELLING_MOUNT_POINT, self._DEPLOYMENT_RECORD_DIR,
+                         models_type + '.json')
+
+    def _get_packages_to_deploy(self, packages: Dict[str, DeployedPackage],
+                                record_path: str) -> List[DeployedPackage]:
+        """
+        Gets the packages that MDT has not deployed yet, according to the deployment record:
+        new packages, new versions of packages and versions whose jars changed. Every package
+        is deployed when MDT_DELTA_DEPLOY is false.
+
+        :param packages: the packages in the local toBeInstalled directory
+        :param str record_path: path to the deployment record of the model type
+        :return: the packages to deploy
+        """
+        if not is_env_enabled(DELTA_DEPLOY_ENV_KEY, True):
+            return list(packages.values())
+        deployed_packages = load_deployment_record(record_path)
+        return [package for directory, package in packages.items()
+                if deployed_packages.get(directory) != package]
+
+    def _record_deployment(self, record_path: str, packages: Dict[str, DeployedPackage]):
+        """
+        Records the packages deployed by MDT. A record that cannot be written is logged and
+        not raised, the next run then deploys every package again.
+
+        :param str record_path: path to the deployment record of the model type
+        :param packages: the packages in the local toBeInstalled directory, all now deployed
+        :return: None
+        """
+        try:
+            write_deployment_record(record_path, packages.values())
+        except OSError as os_error:
+            self.logger.warning('Unable to write deployment record %s: %s', record_path,
+                                os_error)
+
+    @staticmethod
+    def _get_mdt_models_dir(to_be_installed_dir: str, timestamp: str) -> str:
+        """
+        Gets the mountpoint directory to stage the model jars in. When MDT_COPY_RESUME is set,
+        the directory left by a previous run that did not complete is reused so that the jars
+        it already holds are not copied again.
+
+        :param str to_be_installed_dir: mountpoint directory of the model type
+        :param str timestamp: timestamp of this run
+        :return: the mountpoint directory to stage the model jars in
+        """
+        if is_copy_resume_enabled() and path.isdir(to_be_installed_dir):
+            previous_dirs = sorted(previous_dir for previous_dir in listdir(to_be_installed_dir)
+                                   if path.isdir(path.join(to_be_installed_dir, previous_dir)))
+            if previous_dirs:
+                return to_be_installed_dir + '/' + previous_dirs[-1]
+        return to_be_installed_dir + '/' + timestamp
+
     def _wait_for_model_deployment_service_file(self, service_file_path: str):
         """
-        Queries the MDT mount repeatedly for the ModelDeploymentService file.
+        Waits for the ModelDeploymentService file to be created on the MDT mount, returning
+        as soon as it appears or exiting after MDT_SERVICE_FILE_TIMEOUT seconds. A timeout
+        of 0 means waiting without a limit. The process exits when the timeout is invalid.
 
         :param str service_file_path: path to the ModelDeploymentService rmi stub file
         :return: None
         """
-        wait = 0
-        self.logger.info('Waiting for ModelDeploymentService file to become available...')
-        while not path.exists(service_file_path):
-            warning_message = \
-                f'ModelDeploymentService file not currently available. ' \
-                f'Retrying in {self._SLEEP_INTERVAL} seconds (waited {wait} seconds so far)...'
-            self.logger.warning(warning_message)
-            wait += self._SLEEP_INTERVAL
-            time.sleep(self._SLEEP_INTERVAL)
+        try:
+            timeout = get_timeout(self._SERVICE_FILE_TIMEOUT_ENV_KEY, self._SERVICE_FILE_TIMEOUT)
+        except ValueError as value_error:
+            self.logger.error('Invalid configuration: %s', str(value_error))
+            raise SystemExit(2) from value_error
+        if timeout is None:
+            self.logger.info('Waiting for ModelDeploymentService file to become available...')
+        else:
+            self.logger.info('Waiting up to %i seconds for ModelDeploymentService file to '
+                             'become available...', timeout)
+
+        def log_progress(waited: float):
+            self.logger.warning('ModelDeploymentService file not currently available '
+                                '(waited %i seconds so far)...', waited)
+
+        try:
+            wait = wait_for_file(service_file_path, timeout,
+                                 max_poll_interval=self._SLEEP_INTERVAL,
+                                 progress_callback=log_progress)
+        except TimeoutError as timeout_error:
+            self.logger.error('ModelDeploymentService file %s not available after %i seconds',
+                              service_file_path, timeout)
+            raise SystemExit(2) from timeout_error
         self.logger.info('Found ModelDeploymentService file. '
                          '(Took %i seconds) Starting ModelDeploymentClient...', wait)
 
     def _invoke_mdt_via_model_deployment_client(self, mdt_models_dir: str):
         """
-        Invokes MDT using the Model Deployment Client repeatedly and waits on the blocking call
-        until MDT executes successfully. Upon successful MDT execution, places a marker file.
+        Invokes MDT using the Model Deployment Client and waits on the blocking call until MDT
+        executes successfully. Invocations failing to connect to the Model Deployment Service
+        are retried with the MDC_RETRY_* retry policy, any other failure is fatal. The process
+        exits when MDC fails.
 
         :param   mdt_models_dir - mountpoint directory containing model jars to be installed
         :return: None
         """
-        returncode = 1
-        while returncode != 0:
-            java_command = ['java', '-cp', self._MDC_CLASSPATH,
-                            self._MDC_MAINCLASS, mdt_models_dir]
-            returncode = call_subprocess_command(java_command)
-            time.sleep(self._SLEEP_INTERVAL)
-        self.logger.info('Successfully completed Model Deployment Tool execution.')
+        java_command = ['java', '-cp', self._MDC_CLASSPATH,
+                        self._MDC_MAINCLASS, mdt_models_dir]
+        retry_policy = RetryPolicy.from_env(initial_delay=self._SLEEP_INTERVAL)
+        try:
+            attempts = run_with_retry(java_command, retry_policy, self.logger)
+        except RetryError as retry_error:
+            increment('mdc_attempts', retry_error.attempts)
+            self.logger.error('Model Deployment Tool execution failed: %s', str(retry_error))
+            raise SystemExit(2) from retry_error
+        increment('mdc_attempts', attempts)
+        self.logger.info('Successfully completed Model Deployment Tool execution '
+                         '(%i attempt(s)).', attempts)
 
     def _clean_up_old_model_jars(self, to_be_installed_dir: str):
         """
@@ -114,18 +365,54 @@ class MdtTool:
             timestamp = datetime.datetime.fromtimestamp(current_time).strftime('%Y-%m-%d_%H-%M-%S')
             to_be_installed_dir = self._MODELLING_MOUNT_POINT + 'data/execution/toBeInstalled/'\
                                   + environ['MODELS_TYPE']
-            mdt_models_dir = to_be_installed_dir + '/' + timestamp
+            mdt_models_dir = self._get_mdt_models_dir(to_be_installed_dir, timestamp)
+            record_path = self._get_deployment_record_path(environ['MODELS_TYPE'])
+
+            packages = get_model_packages(self._LOCAL_TO_BE_INSTALLED_DIR) \
+                if path.isdir(self._LOCAL_TO_BE_INSTALLED_DIR) else {}
+            packages_to_deploy = self._get_packages_to_deploy(packages, record_path)
+            increment('packages_deployed', len(packages_to_deploy))
+            increment('packages_skipped', len(packages) - len(packages_to_deploy))
+            if packages and not packages_to_deploy:
+                self.logger.info('All %i model packages are already deployed by MDT, '
+                                 'nothing to deploy.', len(packages))
+                return
+            self.logger.info('Deploying %i of %i model packages, %i already deployed by MDT.',
+                             len(packages_to_deploy), len(packages),
+                             len(packages) - len(packages_to_deploy))
 
-            self._copy_model_jars_to_mdt_mount(self._LOCAL_TO_BE_INSTALLED_DIR, mdt_models_dir)
+            with span('mount_copy'):
+                if len(packages_to_deploy) == len(packages):
+                    self._copy_model_jars_to_mdt_mount(self._LOCAL_TO_BE_INSTALLED_DIR,
+                                                       mdt_models_dir)
+                else:
+                    self._copy_model_jars_to_mdt_mount(
+                        self._LOCAL_TO_BE_INSTALLED_DIR, mdt_models_dir,
+                        [package.directory for package in packages_to_deploy])
             if path.exists(mdt_models_dir):
-                self._wait_for_model_deployment_service_file(self._MODEL_DEPLOYMENT_SERVICE_FILE)
-                self._invoke_mdt_via_model_deployment_client(mdt_models_dir)
-                self._clean_up_old_model_jars(to_be_installed_dir)
+                with span('service_file_wait'):
+                    self._wait_for_model_deployment_service_file(
+                        self._MODEL_DEPLOYMENT_SERVICE_FILE)
+                with span('mdc_execution'):
+                    self._invoke_mdt_via_model_deployment_client(mdt_models_dir)
+                with span('cleanup'):
+                    self._clean_up_old_model_jars(to_be_installed_dir)
+                    self._prune_jar_store()
+                self._record_deployment(record_path, packages)
         except Exception as error:
             self.logger.error('Error encountered when triggering MDT.'
                               'Error message: %s', {str(error)})
 
 
+def main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    argparse.ArgumentParser(description='Copy the laid out model jars to the MDT mount and '
+                                        'trigger the model deployment').parse_args(arguments)
+    MdtTool().trigger_mdt()
+
+
 if __name__ == '__main__':
-    mdt_tool = MdtTool()
-    mdt_tool.trigger_mdt()
+    run_tool('trigger_mdt', main)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from logger_utils import get_logger
+from download_rpms import RpmDownloadTool
+from metrics import increment, run_tool, span
+from rpm_header import RpmHeaderError, read_rpm_sections, RPMSIGTAG_MD5, RPMSIGTAG_SHA1, \
+    RPMSIGTAG_SHA256, RPMSIGTAG_SIZE, RPMTAG_NAME, RPMTAG_PAYLOADDIGEST, \
+    RPMTAG_PAYLOADDIGESTALGO
+from worker_pool import get_worker_count, map_in_order
+
+"""
+Offline verification of the RPMs in the zypper package cache. The header and payload
+digests recorded by rpm are recomputed for every package on a pool of workers, hashlib
+releases the GIL so the work spreads across cores. The result is written to a verified
+manifest so that unchanged packages are not checked again.
+"""
+
+_MANIFEST_FORMAT_VERSION = 1
+_READ_BUFFER_SIZE = 1024 * 1024
+_PAYLOAD_DIGEST_ALGORITHMS = {1: 'md5', 2: 'sha1', 8: 'sha256', 9: 'sha384', 10: 'sha512',
+                              11: 'sha224'}
+
+
+class VerifiedRpm(NamedTuple):
+    """
+    The verification result of an RPM in the zypper package cache
+    """
+    rpm_file: str
+    name: str
+    size: int
+    mtime: int
+    error: Optional[str]
+
+
+def _get_payload_digest(header_values: Dict[int, object]):
+    """
+    :param header_values: the decoded main header values
+    :return: Tuple[hash object, expected hex digest] of the payload, or None if not recorded
+    """
+    if RPMTAG_PAYLOADDIGEST not in header_values:
+        return None
+    algorithm = header_values.get(RPMTAG_PAYLOADDIGESTALGO, [8])[0]
+    if algorithm not in _PAYLOAD_DIGEST_ALGORITHMS:
+        raise RpmHeaderError(f'Unsupported payload digest algorithm {algorithm}')
+    return hashlib.new(_PAYLOAD_DIGEST_ALGORITHMS[algorithm]), \
+        header_values[RPMTAG_PAYLOADDIGEST][0]
+
+
+def verify_rpm(rpm_path: str) -> Optional[str]:
+    """
+    Recomputes the digests recorded in the signature and main header of an RPM: the SHA-1
+    and SHA-256 of the header, the MD5 of the header and payload and the payload digest,
+    and checks the header and payload size
+
+    :param rpm_path: path to the RPM package file
+    :return: None if the RPM is intact, otherwise the reason it is not
+    """
+    try:
+        sections = read_rpm_sections(
+            rpm_path, signature_tags=(RPMSIGTAG_SHA1, RPMSIGTAG_SHA256, RPMSIGTAG_SIZE,
+                                      RPMSIGTAG_MD5),
+            header_tags=(RPMTAG_NAME, RPMTAG_PAYLOADDIGEST, RPMTAG_PAYLOADDIGESTALGO))
+        payload_digest = _get_payload_digest(sections.header)
+        signature = sections.signature
+
+        header_digests = {tag: hashlib.new(algorithm) for tag, algorithm in
+                          ((RPMSIGTAG_SHA1, 'sha1'), (RPMSIGTAG_SHA256, 'sha256'))
+                          if tag in signature}
+        md5_digest = hashlib.md5() if RPMSIGTAG_MD5 in signature else None
+        if not header_digests and md5_digest is None and payload_digest is None:
+            return 'no digest recorded'
+
+        with open(rpm_path, 'rb') as rpm_file:
+            rpm_file.seek(sections.header_offset)
+            header = rpm_file.read(sections.payload_offset - sections.header_offset)
+            for digest in header_digests.values():
+                digest.update(header)
+            if md5_digest is not None:
+                md5_digest.update(header)
+            payload_size = 0
+            for block in iter(lambda: rpm_file.read(_READ_BUFFER_SIZE), b''):
+                payload_size += len(block)
+                if md5_digest is not None:
+                    md5_digest.update(block)
+                if payload_digest is not None:
+                    payload_digest[0].update(block)
+    except (RpmHeaderError, OSError, ValueError) as read_error:
+        return f'unreadable: {read_error}'
+
+    if RPMSIGTAG_SIZE in signature and \
+            len(header) + payload_size != signature[RPMSIGTAG_SIZE][0] % 2 ** 32:
+        return 'size mismatch'
+    for tag, digest in header_digests.items():
+        if digest.hexdigest() != signature[tag]:
+            return f'header {digest.name} digest mismatch'
+    if md5_digest is not None and md5_digest.digest() != signature[RPMSIGTAG_MD5]:
+        return 'header and payload md5 digest mismatch'
+    if payload_digest is not None and payload_digest[0].hexdigest() != payload_digest[1]:
+        return f'payload {payload_digest[0].name} digest mismatch'
+    return None
+
+
+def load_verified_manifest(manifest_path: str) -> Dict[str, VerifiedRpm]:
+    """
+    Loads a verified manifest. A manifest that is missing or unreadable is ignored.
+
+    :param manifest_path: path to the verified manifest
+    :return: the verified RPMs keyed by RPM file
+    """
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest['version'] != _MANIFEST_FORMAT_VERSION:
+            return {}
+        return {entry['rpm_file']: VerifiedRpm(rpm_file=entry['rpm_file'], name=entry['name'],
+                                               size=entry['size'], mtime=entry['mtime'],
+                                               error=None)
+                for entry in manifest['rpms']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def write_verified_manifest(manifest_path: str, verified_rpms: List[VerifiedRpm]):
+    """
+    Writes the verified manifest, only RPMs that passed verification are recorded
+
+    :param manifest_path: path to the verified manifest
+    :param verified_rpms: the verification results
+    :return: None
+    """
+    manifest = {
+        'version': _MANIFEST_FORMAT_VERSION,
+        'rpms': [{'rpm_file': rpm.rpm_file, 'name': rpm.name, 'size': rpm.size,
+                  'mtime': rpm.mtime} for rpm in verified_rpms if rpm.error is None]
+    }
+    temporary_manifest_path = manifest_path + '.tmp'
+    with open(temporary_manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(temporary_manifest_path, manifest_path)
+
+
+def is_verified(repo_path: str, verified_rpm: VerifiedRpm) -> bool:
+    """
+    Checks that a verified RPM has not changed since it was verified
+
+    :param repo_path: path to the repo cache
+    :param verified_rpm: the RPM as recorded in the verified manifest
+    :return: True if the RPM file still has the verified size and modification time
+    """
+    try:
+        rpm_stat = os.stat(os.path.join(repo_path, verified_rpm.rpm_file))
+    except OSError:
+        return False
+    return rpm_stat.st_size == verified_rpm.size and int(rpm_stat.st_mtime) == verified_rpm.mtime
+
+
+class RpmVerifyTool:
+    """
+    This class is responsible for verifying the RPMs of the zypper cache after download
+    and downloading the corrupt ones again
+    """
+    _ENM_ISO_REPO_PATH = '/var/cache/zypp/packages/enm_iso_repo/'
+    _VERIFIED_MANIFEST_PATH = '/etc/opt/ericsson/models/enm_iso_repo_verified.json'
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = get_worker_count() if workers is None else workers
+        self.logger = get_logger(self.__class__.__name__)
+
+    def _verify_rpm_file(self, rpm_file: str) -> VerifiedRpm:
+        """
+        :param rpm_file: path of the RPM relative to the repo cache
+        :return: the :class:`VerifiedRpm`
+        """
+        rpm_path = os.path.join(self._ENM_ISO_REPO_PATH, rpm_file)
+        error = verify_rpm(rpm_path)
+        name = os.path.basename(rpm_file).split('-', 1)[0]
+        try:
+            rpm_stat = os.stat(rpm_path)
+        except OSError as os_error:
+            return VerifiedRpm(rpm_file=rpm_file, name=name, size=0, mtime=0, error=str(os_error))
+        return VerifiedRpm(rpm_file=rpm_file, name=name, size=rpm_stat.st_size,
+                           mtime=int(rpm_stat.st_mtime), error=error)
+
+    def verify_cache(self) -> List[VerifiedRpm]:
+        """
+        Verifies every RPM of the zypper cache not already in the verified manifest and
+        writes the manifest
+
+        :return: the :class:`VerifiedRpm` of every RPM in the cache, in file order
+        """
+        start_time = time.monotonic()
+        manifest = load_verified_manifest(self._VERIFIED_MANIFEST_PATH)
+        rpm_files = []
+        for root, _, file_names in os.walk(self._ENM_ISO_REPO_PATH):
+            rpm_files.extend(os.path.relpath(os.path.join(root, file_name),
+                                             self._ENM_ISO_REPO_PATH)
+                             for file_name in file_names if file_name.endswith('.rpm'))
+        rpm_files.sort()
+
+        rpm_files_to_verify = [rpm_file for rpm_file in rpm_files
+                               if rpm_file not in manifest or
+                               not is_verified(self._ENM_ISO_REPO_PATH, manifest[rpm_file])]
+        with span('verify_cache', rpms=len(rpm_files_to_verify)):
+            verified = dict(zip(rpm_files_to_verify, map_in_order(
+                self._verify_rpm_file, rpm_files_to_verify, self.workers)))
+        increment('rpms_verified', len(rpm_files_to_verify))
+        increment('rpms_failed_verification',
+                  sum(1 for rpm in verified.values() if rpm.error is not None))
+        verified_rpms = [verified.get(rpm_file) or manifest[rpm_file] for rpm_file in rpm_files]
+
+        write_verified_manifest(self._VERIFIED_MANIFEST_PATH, verified_rpms)
+        self.logger.info('%i RPMs verified, %i unchanged since last verification, in %.1f '
+                         'seconds', len(rpm_files_to_verify),
+                         len(rpm_files) - len(rpm_files_to_verify), time.monotonic() - start_time)
+        return verified_rpms
+
+    def verify(self, redownload: bool = False):
+        """
+        Verifies the zypper cache. Corrupt RPMs are reported and removed from the cache,
+        then downloaded again and verified if 'redownload' is set.
+
+        :param redownload: True to download the corrupt RPMs again
+        :return: None
+        """
+        self.logger.info('Verifying RPMs in %s...', self._ENM_ISO_REPO_PATH)
+        failed_rpms = [rpm for rpm in self.verify_cache() if rpm.error is not None]
+        if not failed_rpms:
+            self.logger.info('All RPMs verified successfully')
+            return
+
+        for failed_rpm in failed_rpms:
+            self.logger.error('RPM %s failed verification: %s', failed_rpm.rpm_file,
+                              failed_rpm.error)
+            os.unlink(os.path.join(self._ENM_ISO_REPO_PATH, failed_rpm.rpm_file))
+        if not redownload:
+            raise SystemExit(2)
+
+        RpmDownloadTool().download_packages(sorted({rpm.name for rpm in failed_rpms}))
+        still_failed_rpms = [rpm for rpm in self.verify_cache() if rpm.error is not None]
+        if still_failed_rpms:
+            self.logger.error('RPMs still failing verification after download: %s',
+                              [rpm.rpm_file for rpm in still_failed_rpms])
+            raise SystemExit(2)
+        self.logger.info('Corrupt RPMs downloaded again and verified successfully')
+
+
+def main(arguments: Optional[List[str]] = None):
+    """
+    :param arguments: the command line arguments, sys.argv if None
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Verify the digests of the RPMs in the '
+                                                 'zypper cache')
+    parser.add_argument('--redownload', action='store_true',
+                        help='download the RPMs that fail verification again')
+    RpmVerifyTool().verify(parser.parse_args(arguments).redownload)
+
+
+if __name__ == '__main__':
+    run_tool('verify_rpms', main)
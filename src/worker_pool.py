@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+"""
+Utility script to run work on a bounded pool of worker threads sized from the CPU quota
+"""
+
+WORKERS_ENV_KEY = 'MODELS_WORKERS'
+
+_CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+_CGROUP_V1_CPU_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+_CGROUP_V1_CPU_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+
+
+def _read_file(file_path: str) -> Optional[str]:
+    """
+    :param file_path: path of the file to read
+    :return: the stripped file content or None if it cannot be read
+    """
+    try:
+        with open(file_path, 'r') as cgroup_file:
+            return cgroup_file.read().strip()
+    except OSError:
+        return None
+
+
+def get_cpu_quota() -> Optional[float]:
+    """
+    Get the number of CPUs the container is allowed to use by its cgroup CPU quota
+
+    :return: the CPU quota or None if the container has no quota
+    """
+    cpu_max = _read_file(_CGROUP_V2_CPU_MAX)
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+
+    quota = _read_file(_CGROUP_V1_CPU_QUOTA)
+    period = _read_file(_CGROUP_V1_CPU_PERIOD)
+    if quota is not None and period is not None and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def get_available_cpus() -> int:
+    """
+    Get the number of CPUs available to this process, taking the CPU affinity
+    and the cgroup CPU quota into account
+
+    :return: the number of available CPUs, at least 1
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    try:
+        quota = get_cpu_quota()
+    except ValueError:
+        quota = None
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(cpus, 1)
+
+
+def get_worker_count(env_key: str = WORKERS_ENV_KEY, default: Optional[int] = None) -> int:
+    """
+    Get the number of workers to use, from the environment variable 'env_key' if set,
+    otherwise 'default' or the number of available CPUs
+
+    :param env_key: environment variable that overrides the worker count
+    :param default: worker count to use when the environment variable is not set
+    :return: the number of workers, at least 1
+    """
+    configured_workers = os.getenv(env_key)
+    if configured_workers:
+        try:
+            return max(int(configured_workers), 1)
+        except ValueError as value_error:
+            raise ValueError(f'{env_key} must be an integer, '
+                             f'"{configured_workers}" supplied') from value_error
+    if default is not None:
+        return max(default, 1)
+    return get_available_cpus()
+
+
+def map_in_order(function: Callable, items: Iterable, workers: int) -> List:
+    """
+    Applies 'function' to every item on a pool of 'workers' threads
+
+    :param function: the function to apply
+    :param items: the items to apply the function to
+    :param workers: the maximum number of concurrent calls
+    :return: the results in the same order as 'items'
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(function, items))
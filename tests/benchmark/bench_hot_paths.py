@@ -0,0 +1,348 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+
+Benchmark of the hot paths of the model image tools against a synthetic repository.
+
+A repo cache with its rpm-md metadata, a deployment descriptor, a model-deploy file and
+model jar directories are generated for the requested number of packages (100 to 20000
+is the range of real ENM ISOs). The stand-ins for 'rpm', 'zypper' and 'java' in
+tests/benchmark/bin are put first on the PATH so the tools run end to end, forks included,
+without the real binaries.
+
+Usage (from the project root):
+    PYTHONPATH=src:tests python3 tests/benchmark/bench_hot_paths.py [--packages 1000]
+        [--repeat 5] [--update-baseline]
+
+Every benchmark is run '--repeat' times and the fastest run is reported, next to the
+baseline stored for the same number of packages in tests/benchmark/baseline.json. The
+script exits with 1 when a benchmark is slower than its baseline by more than
+'--tolerance' and 5 milliseconds. Baselines are only comparable on the machine that
+recorded them, record them again with '--update-baseline' when moving to another machine.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, NamedTuple, Tuple
+from unittest import mock
+
+import repo_classifier
+from create_model_layout import ModelLayoutTool
+from download_rpms import get_model_package_versions, RpmDownloadTool
+from model_installer_strategy import FilterStrategy, ModelInstallerStrategy
+from repo_classifier import RepoIndexTool
+from synthetic import create_deploy_file, create_deployment_descriptor, \
+    create_jar_directory, create_layout_directory, create_repo_cache, create_repo_metadata, \
+    get_synthetic_packages
+from trigger_mdt import MdtTool
+
+_BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+_STAND_IN_DIRECTORY = os.path.join(_BENCHMARK_DIRECTORY, 'bin')
+_DEFAULT_BASELINE_PATH = os.path.join(_BENCHMARK_DIRECTORY, 'baseline.json')
+_BASELINE_FORMAT_VERSION = 1
+_MODELS_TYPE = 'ERICbenchmarkmodels_CXP9000000'
+_MIN_REGRESSION_SECONDS = 0.005
+
+
+class Workspace(NamedTuple):
+    """
+    Paths of the synthetic inputs and of the directories the tools write to
+    """
+    root: str
+    repo_path: str
+    repo_metadata_path: str
+    zypper_cache_path: str
+    descriptor_path: str
+    deploy_file_path: str
+    index_path: str
+    jar_path: str
+    layout_path: str
+    to_be_installed_path: str
+    mount_path: str
+    package_count: int
+    jars_per_package: int
+    jar_size: int
+
+
+def create_workspace(root: str, package_count: int, jars_per_package: int,
+                     jar_size: int) -> Workspace:
+    """
+    Generates the synthetic inputs of the benchmarks under 'root'
+
+    :return: the :class:`Workspace`
+    """
+    workspace = Workspace(
+        root=root, repo_path=os.path.join(root, 'repo'),
+        repo_metadata_path=os.path.join(root, 'repo_metadata'),
+        zypper_cache_path=os.path.join(root, 'zypper_cache'),
+        descriptor_path=os.path.join(root, 'deployment_description.xml'),
+        deploy_file_path=os.path.join(root, 'model-deploy.json'),
+        index_path=os.path.join(root, 'enm_iso_repo_index.json'),
+        jar_path=os.path.join(root, 'data', 'install'),
+        layout_path=os.path.join(root, 'layout'),
+        to_be_installed_path=os.path.join(root, 'toBeInstalled'),
+        mount_path=os.path.join(root, 'mount'), package_count=package_count,
+        jars_per_package=jars_per_package, jar_size=jar_size)
+    packages = get_synthetic_packages(package_count, jars_per_package)
+    create_repo_cache(workspace.repo_path, packages)
+    create_repo_metadata(workspace.repo_metadata_path, packages)
+    create_deployment_descriptor(workspace.descriptor_path, packages)
+    create_deploy_file(workspace.deploy_file_path, 'service_models')
+    create_layout_directory(workspace.layout_path, packages, jar_size)
+    return workspace
+
+
+@contextlib.contextmanager
+def use_workspace(workspace: Workspace):
+    """
+    Points the tools at the workspace and the stand-in binaries for the body of the with
+    statement
+
+    :return: a context manager
+    """
+    environment = {'PATH': _STAND_IN_DIRECTORY + os.pathsep + os.environ.get('PATH', ''),
+                   'BENCH_REPO_PATH': workspace.repo_path,
+                   'BENCH_ZYPPER_CACHE_PATH': workspace.zypper_cache_path,
+                   'MODELS_TYPE': _MODELS_TYPE}
+    mount_point = workspace.mount_path + '/'
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(os.environ, environment))
+        for target, attribute, value in (
+                (FilterStrategy, '_ENM_ISO_REPO_PATH', workspace.repo_path + '/'),
+                (FilterStrategy, '_REPO_INDEX_PATH', workspace.index_path),
+                (RepoIndexTool, '_ENM_ISO_REPO_PATH', workspace.repo_path + '/'),
+                (RepoIndexTool, '_REPO_INDEX_PATH', workspace.index_path),
+                (RpmDownloadTool, '_ZYPPER_CACHE_PATH', workspace.zypper_cache_path),
+                (RpmDownloadTool, '_REPO_METADATA_PATH', workspace.repo_metadata_path),
+                (RpmDownloadTool, '_PACKAGE_MANIFEST_PATH',
+                 os.path.join(workspace.root, 'model_package_manifest.json')),
+                (ModelLayoutTool, '_TO_BE_INSTALLED_ROOT_DIRECTORY',
+                 workspace.to_be_installed_path + '/'),
+                (MdtTool, '_LOCAL_TO_BE_INSTALLED_DIR', workspace.layout_path),
+                (MdtTool, '_MODELLING_MOUNT_POINT', mount_point),
+                (MdtTool, '_MODEL_DEPLOYMENT_SERVICE_FILE',
+                 mount_point + 'data/ModelDeploymentService')):
+            stack.enter_context(mock.patch.object(target, attribute, value))
+        yield
+
+
+def _remove(path: str):
+    """
+    Removes a file or directory tree if it exists
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.unlink(path)
+
+
+def _get_mdt_models_dir(workspace: Workspace) -> str:
+    """
+    :return: the directory the model jars are staged in on the MDT mount
+    """
+    return os.path.join(workspace.mount_path, 'data', 'execution', 'toBeInstalled',
+                        _MODELS_TYPE, 'benchmark')
+
+
+def _reset_strategy(workspace: Workspace, indexed: bool):
+    """
+    Forgets the classification of the repo cache, keeping or removing its index
+    """
+    repo_classifier._CLASSIFICATIONS.clear()  # pylint: disable=protected-access
+    if not indexed:
+        _remove(workspace.index_path)
+    elif not os.path.exists(workspace.index_path):
+        RepoIndexTool().build_index()
+
+
+def _reset_layout(workspace: Workspace):
+    """
+    Writes the jars to lay out again and removes the previous layout and its manifest
+    """
+    _remove(workspace.to_be_installed_path)
+    _remove(ModelLayoutTool()._get_layout_manifest_path())  # pylint: disable=protected-access
+    _remove(workspace.jar_path)
+    create_jar_directory(workspace.jar_path,
+                         get_synthetic_packages(workspace.package_count,
+                                                workspace.jars_per_package),
+                         workspace.jar_size)
+
+
+def _reset_mount(workspace: Workspace, staged: bool = False, service_file: bool = False):
+    """
+    Empties the MDT mount, then stages the model jars and writes the ModelDeploymentService
+    file on it when requested
+    """
+    _remove(workspace.mount_path)
+    if staged:
+        MdtTool()._copy_model_jars_to_mdt_mount(  # pylint: disable=protected-access
+            workspace.layout_path, _get_mdt_models_dir(workspace))
+    if service_file:
+        os.makedirs(os.path.join(workspace.mount_path, 'data'), exist_ok=True)
+        with open(os.path.join(workspace.mount_path, 'data', 'ModelDeploymentService'), 'w'):
+            pass
+
+
+# pylint: disable=protected-access
+BENCHMARKS: Dict[str, Callable[[Workspace], Tuple[Callable, Callable]]] = {
+    'strategy_scan': lambda workspace: (
+        lambda: _reset_strategy(workspace, indexed=False),
+        lambda: ModelInstallerStrategy.get_models_to_deploy(workspace.deploy_file_path)),
+    'strategy_indexed': lambda workspace: (
+        lambda: _reset_strategy(workspace, indexed=True),
+        lambda: ModelInstallerStrategy.get_models_to_deploy(workspace.deploy_file_path)),
+    'descriptor_parse': lambda workspace: (
+        lambda: None,
+        lambda: get_model_package_versions([workspace.descriptor_path])),
+    'download_cold': lambda workspace: (
+        lambda: _remove(workspace.zypper_cache_path),
+        lambda: RpmDownloadTool([workspace.descriptor_path]).download_model_rpms()),
+    'download_cached': lambda workspace: (
+        lambda: None,
+        lambda: RpmDownloadTool([workspace.descriptor_path]).download_model_rpms()),
+    'layout': lambda workspace: (
+        lambda: _reset_layout(workspace),
+        lambda: ModelLayoutTool()._create_model_layout(workspace.jar_path)),
+    'mdt_copy': lambda workspace: (
+        lambda: _reset_mount(workspace),
+        lambda: MdtTool()._copy_model_jars_to_mdt_mount(workspace.layout_path,
+                                                        _get_mdt_models_dir(workspace))),
+    'mdt_cleanup': lambda workspace: (
+        lambda: _reset_mount(workspace, staged=True),
+        lambda: MdtTool()._clean_up_old_model_jars(os.path.dirname(
+            _get_mdt_models_dir(workspace)))),
+    'mdt_trigger': lambda workspace: (
+        lambda: _reset_mount(workspace, service_file=True),
+        lambda: MdtTool().trigger_mdt()),
+}
+# pylint: enable=protected-access
+
+
+def time_benchmark(workspace: Workspace, name: str, repeat: int) -> float:
+    """
+    Runs a benchmark 'repeat' times, each run after its untimed setup
+
+    :return: seconds taken by the fastest run
+    """
+    setup, run = BENCHMARKS[name](workspace)
+    timings = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def load_baseline(baseline_path: str) -> Dict:
+    """
+    :return: the stored baseline, empty if there is none
+    """
+    try:
+        with open(baseline_path, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('version') == _BASELINE_FORMAT_VERSION:
+            return baseline
+    except (OSError, ValueError):
+        pass
+    return {'version': _BASELINE_FORMAT_VERSION, 'scales': {}}
+
+
+def write_baseline(baseline_path: str, baseline: Dict, package_count: int,
+                   results: Dict[str, float]):
+    """
+    Stores the results as the baseline for 'package_count' packages, the baseline of the
+    benchmarks that were not run is kept
+
+    :return: None
+    """
+    seconds = baseline['scales'].get(str(package_count), {}).get('seconds', {})
+    seconds.update({name: round(result, 4) for name, result in results.items()})
+    baseline['scales'][str(package_count)] = {
+        'python': platform.python_version(), 'machine': platform.machine(),
+        'cpus': os.cpu_count(), 'seconds': seconds}
+    with open(baseline_path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def parse_arguments(arguments=None) -> argparse.Namespace:
+    """
+    :return: the parsed command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the model '
+                                                 'image tools against a synthetic repository')
+    parser.add_argument('--packages', type=int, default=1000,
+                        help='number of packages in the synthetic repository')
+    parser.add_argument('--jars-per-package', type=int, default=2)
+    parser.add_argument('--jar-size', type=int, default=4096, help='size of every jar in bytes')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of every benchmark, the fastest is reported')
+    parser.add_argument('--benchmark', action='append', choices=sorted(BENCHMARKS),
+                        help='benchmark to run, all by default')
+    parser.add_argument('--baseline', default=_DEFAULT_BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown relative to the baseline reported as a regression')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store the results as the baseline')
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None) -> int:
+    """
+    Runs the benchmarks and prints the results next to the baseline
+
+    :return: the exit code, 1 if a benchmark regressed
+    """
+    args = parse_arguments(arguments)
+    logging.disable(logging.INFO)
+    names = args.benchmark or list(BENCHMARKS)
+
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        workspace = create_workspace(root, args.packages, args.jars_per_package, args.jar_size)
+        print(f'Synthetic repository of {args.packages} packages, '
+              f'{args.packages * args.jars_per_package} jars, generated in '
+              f'{time.perf_counter() - start:.1f}s')
+        with use_workspace(workspace):
+            results = {name: time_benchmark(workspace, name, args.repeat) for name in names}
+
+    baseline = load_baseline(args.baseline)
+    baseline_seconds = baseline['scales'].get(str(args.packages), {}).get('seconds', {})
+    regressions = []
+    print(f'{"benchmark":<18}{"seconds":>10}{"baseline":>10}{"ratio":>8}')
+    for name, seconds in results.items():
+        if name not in baseline_seconds:
+            print(f'{name:<18}{seconds:>10.3f}{"-":>10}{"-":>8}')
+            continue
+        ratio = seconds / max(baseline_seconds[name], 1e-4)
+        regressed = ratio > 1 + args.tolerance and \
+            seconds - baseline_seconds[name] > _MIN_REGRESSION_SECONDS
+        if regressed:
+            regressions.append(name)
+        print(f'{name:<18}{seconds:>10.3f}{baseline_seconds[name]:>10.3f}{ratio:>7.2f}x'
+              f'{"  REGRESSION" if regressed else ""}')
+
+    if args.update_baseline:
+        write_baseline(args.baseline, baseline, args.packages, results)
+        print(f'Baseline for {args.packages} packages written to {args.baseline}')
+        return 0
+    if regressions:
+        print(f'Slower than baseline by more than {args.tolerance:.0%}: {regressions}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
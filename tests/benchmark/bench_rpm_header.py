@@ -0,0 +1,89 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+
+Benchmark comparing the in-process RPM header reader against 'rpm -qpl' for
+classifying a synthetic repo cache.
+
+Usage (from the project root):
+    PYTHONPATH=src:tests python3 tests/benchmark/bench_rpm_header.py [number_of_rpms]
+
+When the 'rpm' binary is not installed the fork cost of '/bin/true' is measured
+instead, which is a lower bound for the cost of forking 'rpm -qpl'.
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from rpm_factory import write_rpm
+from rpm_header import get_rpm_file_names
+
+_DEFAULT_RPM_COUNT = 1000
+_JARS_PER_RPM = 5
+
+
+def create_synthetic_repo(directory: str, rpm_count: int):
+    """
+    Writes 'rpm_count' model RPMs into 'directory'
+
+    :return: list of the RPM paths written
+    """
+    rpm_paths = []
+    for rpm_number in range(rpm_count):
+        model_directory = 'post_install' if rpm_number % 10 == 0 else 'install'
+        file_names = [f'/var/opt/ericsson/ERICmodeldeployment/data/{model_directory}/'
+                      f'model-{rpm_number}-{jar}.jar' for jar in range(_JARS_PER_RPM)]
+        rpm_paths.append(write_rpm(directory, f'ERICnodemodel{rpm_number}_CXP9000000',
+                                   '1.0.1', file_names))
+    return rpm_paths
+
+
+def time_header_reader(rpm_paths) -> float:
+    """
+    :return: seconds taken to read the file list of every RPM in-process
+    """
+    start = time.perf_counter()
+    for rpm_path in rpm_paths:
+        get_rpm_file_names(rpm_path)
+    return time.perf_counter() - start
+
+
+def time_forked_query(rpm_paths) -> float:
+    """
+    :return: seconds taken to fork a query for every RPM
+    """
+    rpm_binary = shutil.which('rpm')
+    start = time.perf_counter()
+    for rpm_path in rpm_paths:
+        command = [rpm_binary, '-qpl', rpm_path] if rpm_binary else ['/bin/true', rpm_path]
+        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Runs the benchmark and prints the results
+    """
+    rpm_count = int(sys.argv[1]) if len(sys.argv) > 1 else _DEFAULT_RPM_COUNT
+    with tempfile.TemporaryDirectory() as repo_directory:
+        rpm_paths = create_synthetic_repo(repo_directory, rpm_count)
+        header_seconds = time_header_reader(rpm_paths)
+        forked_seconds = time_forked_query(rpm_paths)
+
+    forked_label = 'rpm -qpl' if shutil.which('rpm') else 'fork of /bin/true'
+    print(f'RPMs in synthetic repo : {rpm_count}')
+    print(f'In-process header read : {header_seconds:.3f}s '
+          f'({rpm_count / header_seconds:.0f} RPMs/s)')
+    print(f'{forked_label:<23}: {forked_seconds:.3f}s '
+          f'({rpm_count / forked_seconds:.0f} RPMs/s)')
+    print(f'Speed up               : {forked_seconds / header_seconds:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+
+Generators of the synthetic inputs used by the benchmarks: a zypper repo cache with its
+rpm-md metadata, a deployment descriptor, a model-deploy file and the model jar
+directories laid out and copied by the tools.
+"""
+import gzip
+import json
+import os
+from typing import List, NamedTuple
+from xml.sax.saxutils import escape
+
+from rpm_factory import write_rpm
+
+PACKAGE_VERSION = '1.0.1'
+PACKAGE_RELEASE = '1'
+MODEL_DATA_PATH = '/var/opt/ericsson/ERICmodeldeployment/data'
+
+
+class SyntheticPackage(NamedTuple):
+    """
+    A model package of the synthetic repository
+    """
+    name: str
+    model_directory_type: str
+    jar_names: List[str]
+
+
+def get_synthetic_packages(package_count: int, jars_per_package: int) -> List[SyntheticPackage]:
+    """
+    Describes 'package_count' model packages: a third are node models, a tenth install
+    into post_install and the rest are service models. Jar names start with the name of
+    their package so that the stand-in 'rpm' can answer ownership queries.
+
+    :param package_count: the number of packages
+    :param jars_per_package: the number of jars in every package
+    :return: the :class:`SyntheticPackage` of every package
+    """
+    packages = []
+    for package_number in range(package_count):
+        if package_number % 10 == 0:
+            name, model_directory_type = f'ERICpostinstall{package_number}_CXP9000000', \
+                'post_install'
+        elif package_number % 3 == 0:
+            name, model_directory_type = f'ERICnodemodel{package_number}_CXP9000000', 'install'
+        else:
+            name, model_directory_type = f'ERICservicemodel{package_number}_CXP9000000', \
+                'install'
+        packages.append(SyntheticPackage(name=name, model_directory_type=model_directory_type,
+                                         jar_names=[f'{name}-{jar}.jar'
+                                                    for jar in range(jars_per_package)]))
+    return packages
+
+
+def get_package_file_names(package: SyntheticPackage) -> List[str]:
+    """
+    :param package: a synthetic package
+    :return: the installed paths of the jars of the package
+    """
+    return [f'{MODEL_DATA_PATH}/{package.model_directory_type}/{jar_name}'
+            for jar_name in package.jar_names]
+
+
+def create_repo_cache(directory: str, packages: List[SyntheticPackage]) -> List[str]:
+    """
+    Writes an RPM for every package into 'directory'
+
+    :return: the paths of the RPMs written
+    """
+    os.makedirs(directory, exist_ok=True)
+    return [write_rpm(directory, package.name, PACKAGE_VERSION, get_package_file_names(package),
+                      release=PACKAGE_RELEASE) for package in packages]
+
+
+def create_repo_metadata(directory: str, packages: List[SyntheticPackage]):
+    """
+    Writes gzip compressed rpm-md metadata, primary and filelists, listing every package
+    into 'directory'/repodata
+
+    :return: None
+    """
+    repodata = os.path.join(directory, 'repodata')
+    os.makedirs(repodata, exist_ok=True)
+    with open(os.path.join(repodata, 'repomd.xml'), 'w') as repomd_file:
+        repomd_file.write('<repomd xmlns="http://linux.duke.edu/metadata/repo">'
+                          '<data type="primary"><location href="repodata/primary.xml.gz"/></data>'
+                          '<data type="filelists"><location href="repodata/filelists.xml.gz"/>'
+                          '</data></repomd>')
+    with gzip.open(os.path.join(repodata, 'primary.xml.gz'), 'wt') as primary_file:
+        primary_file.write('<metadata xmlns="http://linux.duke.edu/metadata/common">')
+        for package in packages:
+            primary_file.write(f'<package type="rpm"><name>{escape(package.name)}</name>'
+                               f'<version ver="{PACKAGE_VERSION}" rel="{PACKAGE_RELEASE}"/>'
+                               f'</package>')
+        primary_file.write('</metadata>')
+    with gzip.open(os.path.join(repodata, 'filelists.xml.gz'), 'wt') as filelists_file:
+        filelists_file.write('<filelists xmlns="http://linux.duke.edu/metadata/filelists">')
+        for package in packages:
+            filelists_file.write(f'<package name="{escape(package.name)}">' + ''.join(
+                f'<file>{escape(file_name)}</file>'
+                for file_name in get_package_file_names(package)) + '</package>')
+        filelists_file.write('</filelists>')
+
+
+def create_deployment_descriptor(path: str, packages: List[SyntheticPackage]):
+    """
+    Writes a LITP deployment descriptor listing every package as a model package
+
+    :return: None
+    """
+    with open(path, 'w') as descriptor_file:
+        descriptor_file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<litp:root xmlns:litp="http://www.ericsson.com/litp" id="root">'
+            '<litp:software id="software"><litp:software-items-collection id="items">'
+            '<litp:package-list id="model_package"><name>models</name>'
+            '<litp:package-list-packages-collection id="packages">')
+        for package in packages:
+            descriptor_file.write(f'<litp:model-package id="{escape(package.name)}">'
+                                  f'<name>{escape(package.name)}</name></litp:model-package>')
+        descriptor_file.write('</litp:package-list-packages-collection></litp:package-list>'
+                              '</litp:software-items-collection></litp:software></litp:root>')
+
+
+def create_deploy_file(path: str, model_category: str):
+    """
+    Writes a model-deploy file selecting a model category
+
+    :return: None
+    """
+    with open(path, 'w') as deploy_file:
+        json.dump({'deploy': {'model-category': model_category}}, deploy_file)
+
+
+def create_jar_directory(directory: str, packages: List[SyntheticPackage], jar_size: int):
+    """
+    Writes the jars of every package, 'jar_size' bytes each, flat into 'directory'. The
+    content of every jar is unique so that no jar is deduplicated by the MDT jar store.
+
+    :return: the number of jars written
+    """
+    os.makedirs(directory, exist_ok=True)
+    content = os.urandom(jar_size)
+    jars = 0
+    for package in packages:
+        for jar_name in package.jar_names:
+            with open(os.path.join(directory, jar_name), 'wb') as jar_file:
+                jar_file.write(jar_name.encode() + content[len(jar_name):])
+            jars += 1
+    return jars
+
+
+def create_layout_directory(directory: str, packages: List[SyntheticPackage], jar_size: int):
+    """
+    Writes the jars of every package laid out as /<rpm_name>/<rpm_version>/<jars>, as
+    create_model_layout.py leaves them for trigger_mdt.py
+
+    :return: the number of jars written
+    """
+    jars = 0
+    for package in packages:
+        jars += create_jar_directory(os.path.join(directory, package.name, PACKAGE_VERSION),
+                                     [package], jar_size)
+    return jars
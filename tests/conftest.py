@@ -10,12 +10,23 @@ Pytest file for generic test 'fixtures'.
 """
 import pytest
 
+import logger_utils
+import query_cache
+
 
 @pytest.fixture(autouse=True)
-def override_logger_rsyslog_call(fake_process):
+def override_logger_rsyslog_call(fake_process, monkeypatch):
     """
-    Mock 'logger_utils' rsyslog call
+    Mock 'logger_utils' rsyslog check
     """
     fake_process.allow_unregistered(True)
-    fake_process.register_subprocess(['/usr/bin/pgrep', 'rsyslogd'], returncode=0)
     fake_process.keep_last_process(True)
+    monkeypatch.setattr(logger_utils, "_is_process_running", lambda process_name: True)
+
+
+@pytest.fixture(autouse=True)
+def empty_query_cache(monkeypatch):
+    """
+    Give every test an empty, memory only, rpm query cache
+    """
+    monkeypatch.setattr(query_cache, "_QUERY_CACHE", query_cache.QueryCache())
@@ -0,0 +1,150 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+
+Helper used by the tests and benchmarks to build minimal, valid RPM package files.
+"""
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+import struct
+from typing import List, Optional, Sequence
+
+_STRING_TYPE = 6
+_STRING_ARRAY_TYPE = 8
+_INT32_TYPE = 4
+_BIN_TYPE = 7
+
+_SIGTAG_SHA256 = 273
+_SIGTAG_SIZE = 1000
+_SIGTAG_MD5 = 1004
+_RPMTAG_NAME = 1000
+_RPMTAG_VERSION = 1001
+_RPMTAG_RELEASE = 1002
+_RPMTAG_ARCH = 1022
+_RPMTAG_DIRINDEXES = 1116
+_RPMTAG_BASENAMES = 1117
+_RPMTAG_DIRNAMES = 1118
+_RPMTAG_PAYLOADCOMPRESSOR = 1125
+_RPMTAG_PAYLOADDIGEST = 5092
+_RPMTAG_PAYLOADDIGESTALGO = 5093
+_PAYLOADDIGESTALGO_SHA256 = 8
+_COMPRESSORS = {'gzip': gzip.compress, 'bzip2': bz2.compress, 'xz': lzma.compress,
+                'lzma': lambda data: lzma.compress(data, format=lzma.FORMAT_ALONE),
+                'zstd': lambda data: b'\x28\xb5\x2f\xfd' + data}
+
+
+def _build_header(entries: List) -> bytes:
+    """
+    Builds an RPM header structure from (tag, type, value) entries
+    """
+    index = b''
+    store = b''
+    for tag, tag_type, value in entries:
+        if tag_type == _INT32_TYPE:
+            store += b'\x00' * ((4 - len(store) % 4) % 4)
+            data = struct.pack(f'>{len(value)}i', *value)
+            count = len(value)
+        elif tag_type == _STRING_TYPE:
+            data = value.encode() + b'\x00'
+            count = 1
+        elif tag_type == _BIN_TYPE:
+            data = value
+            count = len(value)
+        else:
+            data = b''.join(item.encode() + b'\x00' for item in value)
+            count = len(value)
+        index += struct.pack('>iiii', tag, tag_type, len(store), count)
+        store += data
+    intro = b'\x8e\xad\xe8\x01' + b'\x00' * 4 + struct.pack('>II', len(entries), len(store))
+    return intro + index + store
+
+
+def build_cpio(members: Sequence[Sequence]) -> bytes:
+    """
+    Builds a 'newc' cpio archive from (name, data) or (name, data, inode, links) members,
+    the data of a hard linked file is stored in its last member as rpm does
+    """
+    archive = b''
+    for number, member in enumerate([*members, ('TRAILER!!!', b'', 0, 1)]):
+        name, data = member[0], member[1]
+        inode, links = member[2:] if len(member) == 4 else (number + 1, 1)
+        name = (name if name == 'TRAILER!!!' else '.' + name).encode() + b'\x00'
+        fields = [inode, 0o100644 if name != b'TRAILER!!!\x00' else 0, 0, 0, links,
+                  1600000000, len(data), 0, 0, 0, 0, len(name), 0]
+        archive += b'070701' + ''.join(f'{field:08x}' for field in fields).encode() + name
+        archive += b'\x00' * ((4 - len(archive) % 4) % 4) + data
+        archive += b'\x00' * ((4 - len(archive) % 4) % 4)
+    return archive
+
+
+def build_rpm(name: str, version: str, file_names: List[str], release: str = '1',
+              payload: bytes = b'', digests: bool = True,
+              payload_compressor: Optional[str] = None) -> bytes:
+    """
+    Builds the bytes of an RPM package with the supplied name, version and file list,
+    with the header and payload digests rpm records unless 'digests' is False. With a
+    'payload_compressor' the payload is a cpio archive of the files holding 'payload',
+    compressed with it.
+    """
+    if payload_compressor is not None:
+        payload = _COMPRESSORS[payload_compressor](
+            build_cpio([(file_name, payload) for file_name in file_names]))
+    lead = b'\xed\xab\xee\xdb\x03\x00\x00\x00\x00\x01'
+    lead += f'{name}-{version}-{release}'.encode()[:65].ljust(66, b'\x00')
+    lead += struct.pack('>hh', 1, 5) + b'\x00' * 16
+
+    dir_names = []
+    dir_indexes = []
+    base_names = []
+    for file_name in file_names:
+        dir_name = os.path.dirname(file_name) + '/'
+        if dir_name not in dir_names:
+            dir_names.append(dir_name)
+        dir_indexes.append(dir_names.index(dir_name))
+        base_names.append(os.path.basename(file_name))
+
+    entries = [(_RPMTAG_NAME, _STRING_TYPE, name),
+               (_RPMTAG_VERSION, _STRING_TYPE, version),
+               (_RPMTAG_RELEASE, _STRING_TYPE, release),
+               (_RPMTAG_ARCH, _STRING_TYPE, 'noarch')]
+    if payload_compressor is not None:
+        entries += [(_RPMTAG_PAYLOADCOMPRESSOR, _STRING_TYPE, payload_compressor)]
+    if file_names:
+        entries += [(_RPMTAG_DIRINDEXES, _INT32_TYPE, dir_indexes),
+                    (_RPMTAG_BASENAMES, _STRING_ARRAY_TYPE, base_names),
+                    (_RPMTAG_DIRNAMES, _STRING_ARRAY_TYPE, dir_names)]
+    if digests:
+        entries += [(_RPMTAG_PAYLOADDIGEST, _STRING_ARRAY_TYPE,
+                     [hashlib.sha256(payload).hexdigest()]),
+                    (_RPMTAG_PAYLOADDIGESTALGO, _INT32_TYPE, [_PAYLOADDIGESTALGO_SHA256])]
+    header = _build_header(entries)
+
+    signature_entries = [(_SIGTAG_SIZE, _INT32_TYPE, [len(header) + len(payload)])]
+    if digests:
+        signature_entries = [(_SIGTAG_SHA256, _STRING_TYPE, hashlib.sha256(header).hexdigest()),
+                             *signature_entries,
+                             (_SIGTAG_MD5, _BIN_TYPE, hashlib.md5(header + payload).digest())]
+    signature = _build_header(signature_entries)
+    signature += b'\x00' * ((8 - len(signature) % 8) % 8)
+
+    return lead + signature + header + payload
+
+
+def write_rpm(directory, name: str, version: str, file_names: List[str], **kwargs) -> str:
+    """
+    Writes an RPM package named '<name>-<version>-<release>.noarch.rpm' into 'directory'
+
+    :return: the path of the written RPM
+    """
+    release = kwargs.get('release', '1')
+    rpm_path = os.path.join(str(directory), f'{name}-{version}-{release}.noarch.rpm')
+    with open(rpm_path, 'wb') as rpm_file:
+        rpm_file.write(build_rpm(name, version, file_names, **kwargs))
+    return rpm_path
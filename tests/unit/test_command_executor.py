@@ -6,11 +6,17 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
-from subprocess import CalledProcessError
+import os
+import time
+from subprocess import CalledProcessError, TimeoutExpired
 
+import pytest
 from pytest import raises
 
-from command_executor import execute_subprocess_command, call_subprocess_command
+import command_executor
+from command_executor import execute_subprocess_command, call_subprocess_command, \
+    call_subprocess_command_with_stderr, get_timeout, run_command, run_commands, \
+    OutputTruncatedError
 
 
 class TestCommandExecutor:
@@ -39,3 +45,78 @@ class TestCommandExecutor:
 
     def test_call_command_failure(self):
         assert 2 == call_subprocess_command(self.failure_command)
+
+    def test_call_command_with_stderr_returns_stderr_tail(self):
+        returncode, stderr = call_subprocess_command_with_stderr(
+            ["sh", "-c", "echo first >&2; echo second >&2; exit 3"], max_stderr_lines=1)
+        assert 3 == returncode
+        assert "second\n" == stderr
+
+    def test_call_command_with_stderr_timeout(self):
+        returncode, stderr = call_subprocess_command_with_stderr(["sleep", "10"], timeout=0.2)
+        assert 124 == returncode
+        assert "timed out" in stderr
+
+    def test_execute_command_timeout(self):
+        with raises(TimeoutExpired):
+            execute_subprocess_command(["sleep", "10"], timeout=0.2)
+
+    def test_run_command_records_output_and_wall_time(self):
+        lines = []
+        result = run_command(["sh", "-c", "echo one; echo two; echo err >&2"],
+                             stdout_callback=lines.append)
+        assert result.returncode == 0
+        assert result.stdout == b"one\ntwo\n"
+        assert result.stderr == b"err\n"
+        assert lines == [b"one\n", b"two\n"]
+        assert result.seconds > 0
+        assert not result.timed_out
+
+    def test_run_command_bounds_stdout(self):
+        result = run_command(["sh", "-c", "echo one; echo two; echo three"], max_output_bytes=8)
+        assert result.stdout == b"one\ntwo\n"
+        assert result.stdout_truncated
+
+    def test_execute_subprocess_command_when_output_truncated_raise_error(self, monkeypatch):
+        monkeypatch.setattr(command_executor, "_MAX_OUTPUT_BYTES", 8)
+        with raises(OutputTruncatedError):
+            execute_subprocess_command(["sh", "-c", "echo one; echo two; echo three"], True)
+        assert execute_subprocess_command(["sh", "-c", "echo one; echo two"], True) == \
+            b"one\ntwo\n"
+
+    def test_run_command_timeout_kills_process_group(self, tmp_path):
+        pid_file = tmp_path.joinpath("pid")
+        result = run_command(["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"], timeout=0.5)
+
+        assert result.timed_out
+        assert result.returncode == 124
+        assert result.seconds < 10
+        child_pid = int(pid_file.read_text())
+        for _ in range(50):
+            try:
+                os.kill(child_pid, 0)
+            except ProcessLookupError:
+                break
+            time.sleep(0.1)
+        else:
+            pytest.fail("background child of the timed out command is still running")
+
+    def test_run_commands_in_order_and_concurrently(self):
+        start = time.monotonic()
+        results = run_commands([["sh", "-c", f"sleep 0.5; echo {number}"] for number in range(4)],
+                               max_concurrent=4)
+        assert [result.stdout for result in results] == [b"0\n", b"1\n", b"2\n", b"3\n"]
+        assert time.monotonic() - start < 1.5
+
+    @pytest.mark.parametrize("value, expected", [(None, 300), ("20", 20), ("0", None)])
+    def test_get_timeout(self, monkeypatch, value, expected):
+        if value is None:
+            monkeypatch.delenv("TEST_TIMEOUT", raising=False)
+        else:
+            monkeypatch.setenv("TEST_TIMEOUT", value)
+        assert get_timeout("TEST_TIMEOUT", 300) == expected
+
+    def test_get_timeout_when_invalid_raise_value_error(self, monkeypatch):
+        monkeypatch.setenv("TEST_TIMEOUT", "never")
+        with raises(ValueError):
+            get_timeout("TEST_TIMEOUT", 300)
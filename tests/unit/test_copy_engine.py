@@ -0,0 +1,135 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import errno
+from unittest import mock
+
+import pytest
+
+from copy_engine import ParallelCopier, is_env_enabled
+
+TEST_JARS = {
+    "ERICnodemodelrpm_CX1234567/1.0.1/models.jar": b"a" * 3000,
+    "ERICnodemodelrpm_CX1234567/1.0.1/models-2.jar": b"",
+    "ERICservicemodelrpm_CX1234567/1.0.2/models.jar": b"b" * 70000
+}
+
+
+@pytest.fixture
+def source_directory(tmp_path):
+    """
+    Creates a source directory of test jars
+
+    :return: path of the source directory
+    """
+    source = tmp_path.joinpath("source")
+    for jar, content in TEST_JARS.items():
+        source.joinpath(jar).parent.mkdir(parents=True, exist_ok=True)
+        source.joinpath(jar).write_bytes(content)
+    return source
+
+
+def assert_tree_copied(destination):
+    for jar, content in TEST_JARS.items():
+        assert destination.joinpath(jar).read_bytes() == content
+
+
+class TestCopyEngine:
+    """
+    Test class for script `copy_engine`.
+    """
+
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_copy_tree_success(self, source_directory, tmp_path, workers):
+        destination = tmp_path.joinpath("destination")
+        stats = ParallelCopier(workers=workers, buffer_size=1024).copy_tree(source_directory,
+                                                                            destination)
+        assert_tree_copied(destination)
+        assert stats.files == 3
+        assert stats.skipped_files == 0
+        assert stats.bytes == 73000
+        assert stats.files_per_second > 0
+
+    @pytest.mark.parametrize("unsupported", ["copy_file_range", "sendfile"])
+    def test_copy_tree_when_kernel_copy_unsupported_then_buffered_copy(self, source_directory,
+                                                                       tmp_path, unsupported):
+        destination = tmp_path.joinpath("destination")
+        with mock.patch("os.copy_file_range", side_effect=OSError(errno.EXDEV, "xdev"),
+                        create=True), \
+                mock.patch("os." + unsupported, side_effect=OSError(errno.ENOSYS, "nosys"),
+                           create=True):
+            ParallelCopier(workers=1, buffer_size=1024).copy_tree(source_directory, destination)
+        assert_tree_copied(destination)
+
+    def test_copy_tree_when_write_fails_raise_os_error(self, source_directory, tmp_path):
+        with mock.patch("os.copy_file_range", side_effect=OSError(errno.ENOSPC, "full"),
+                        create=True):
+            with pytest.raises(OSError):
+                ParallelCopier(workers=1).copy_tree(source_directory, tmp_path.joinpath("dest"))
+
+    def test_copy_tree_when_source_missing_raise_error(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            ParallelCopier().copy_tree(tmp_path.joinpath("missing"), tmp_path.joinpath("dest"))
+
+    def test_copy_tree_resume_skips_present_files_and_removes_extra_files(self, source_directory,
+                                                                          tmp_path):
+        destination = tmp_path.joinpath("destination")
+        copier = ParallelCopier(workers=2, resume=True)
+        copier.copy_tree(source_directory, destination)
+
+        partial_jar = destination.joinpath("ERICservicemodelrpm_CX1234567/1.0.2/models.jar")
+        partial_jar.write_bytes(b"b" * 100)
+        extra_jar = destination.joinpath("ERICservicemodelrpm_CX1234567/1.0.2/old.jar")
+        extra_jar.write_bytes(b"old")
+
+        stats = copier.copy_tree(source_directory, destination)
+
+        assert stats.files == 1
+        assert stats.skipped_files == 2
+        assert stats.bytes == 70000
+        assert not extra_jar.exists()
+        assert_tree_copied(destination)
+
+    def test_copy_tree_given_subdirectories_copies_and_keeps_only_them(self, source_directory,
+                                                                       tmp_path):
+        destination = tmp_path.joinpath("destination")
+        copier = ParallelCopier(workers=2, resume=True)
+        copier.copy_tree(source_directory, destination)
+
+        stats = copier.copy_tree(source_directory, destination,
+                                 ["ERICservicemodelrpm_CX1234567/1.0.2", "ERICmissing/1.0.0"])
+
+        assert stats.files + stats.skipped_files == 1
+        assert [str(jar.relative_to(destination)) for jar in destination.rglob("*.jar")] == \
+            ["ERICservicemodelrpm_CX1234567/1.0.2/models.jar"]
+
+    def test_copy_tree_without_resume_copies_all_files(self, source_directory, tmp_path):
+        destination = tmp_path.joinpath("destination")
+        copier = ParallelCopier(workers=2, resume=False)
+        copier.copy_tree(source_directory, destination)
+        assert copier.copy_tree(source_directory, destination).files == 3
+
+    def test_copier_configured_from_env(self, monkeypatch):
+        monkeypatch.setenv("MDT_COPY_WORKERS", "3")
+        monkeypatch.setenv("MDT_COPY_BUFFER_SIZE", "65536")
+        monkeypatch.setenv("MDT_COPY_RESUME", "true")
+        copier = ParallelCopier()
+        assert (copier.workers, copier.buffer_size, copier.resume) == (3, 65536, True)
+
+    def test_copier_does_not_resume_by_default(self, monkeypatch):
+        monkeypatch.delenv("MDT_COPY_RESUME", raising=False)
+        assert not ParallelCopier().resume
+
+    @pytest.mark.parametrize("value,expected", [(None, True), ("", True), ("TRUE", True),
+                                                ("1", True), ("no", False)])
+    def test_is_env_enabled(self, monkeypatch, value, expected):
+        if value is None:
+            monkeypatch.delenv("TEST_FLAG", raising=False)
+        else:
+            monkeypatch.setenv("TEST_FLAG", value)
+        assert is_env_enabled("TEST_FLAG", True) == expected
@@ -6,18 +6,24 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+import json
+import os
 import pathlib
 from typing import Dict
+from unittest import mock
 
 import pytest
 
-from create_model_layout import validate_input_directories, get_model_type, ModelLayoutTool
+from create_model_layout import validate_input_directories, get_model_type, get_rpm_owners, \
+    get_layout_mode, get_package_file_owners, load_layout_manifest, ModelLayoutTool
+from rpm_factory import write_rpm
 
 JAR_PATH = "valid/path/install"
 TEST_INVALID_PATH = "invalid/path"
 TEST_JAR_FILE_TEMPLATE = "models-{}.jar"
 TEST_RPM_NAME_ONE = "ERICrpm_CXP1234567-1.0.1"
 TEST_RPM_NAME_TWO = "ERICotherrpm_CXP1234567-1.0.2"
+RPM_OWNER_QUERY_FORMAT = "%{NAME} %{VERSION}\\n"
 
 
 @pytest.fixture
@@ -43,13 +49,17 @@ def setup_jars(monkeypatch, tmp_path, fake_process, rpm_name_to_jars: Dict):
 
     jar_directory.mkdir(parents=True)
     jar_number = 0
+    jar_files = []
+    owners = []
     for rpm, num_of_jars in rpm_name_to_jars.items():
         for jar in range(0, num_of_jars):
             jar_file = jar_directory.joinpath(TEST_JAR_FILE_TEMPLATE.format(jar_number))
             jar_file.touch()
-            fake_process.register_subprocess(['rpm', '-qf', str(jar_file)],
-                                             stdout=bytes(rpm, encoding='utf8'))
+            jar_files.append(str(jar_file))
+            owners.append(rpm.replace('-', ' ') + '\n')
             jar_number += 1
+    fake_process.register_subprocess(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                      *jar_files], stdout=''.join(owners))
 
 
 @pytest.fixture
@@ -126,3 +136,188 @@ class TestCreateModelLayout:
         assert rpm_one_jar_one.exists()
         assert rpm_one_jar_two.exists()
         assert rpm_two_jar_one.exists()
+
+    @pytest.mark.parametrize('rpm_name_to_jars', [{TEST_RPM_NAME_ONE: 2}])
+    def test_create_layout_link_mode_keeps_source_jars(self, test_layout_tool, tmp_path,
+                                                       set_models_type_env, monkeypatch):
+        monkeypatch.setenv("MODELS_LAYOUT_MODE", "link")
+        source_jar = tmp_path.joinpath(JAR_PATH, "models-0.jar")
+        installed_jar = test_layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY\
+            .joinpath("ERICrpm_CXP1234567", "1.0.1", "models-0.jar")
+
+        test_layout_tool.generate_layout()
+        test_layout_tool.generate_layout()
+
+        assert source_jar.exists()
+        assert installed_jar.exists()
+        assert installed_jar.stat().st_ino == source_jar.stat().st_ino
+
+    @pytest.mark.parametrize('layout_mode,source_kept', [("move", False), ("link", True)])
+    @pytest.mark.parametrize('rpm_name_to_jars', [{TEST_RPM_NAME_ONE: 2, TEST_RPM_NAME_TWO: 1}])
+    def test_create_layout_across_filesystems_copies_jars(self, test_layout_tool, tmp_path,
+                                                          set_models_type_env, monkeypatch,
+                                                          layout_mode, source_kept):
+        monkeypatch.setenv("MODELS_LAYOUT_MODE", layout_mode)
+        source_jar = tmp_path.joinpath(JAR_PATH, "models-2.jar")
+        installed_jar = test_layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY\
+            .joinpath("ERICotherrpm_CXP1234567", "1.0.2", "models-2.jar")
+
+        with mock.patch("create_model_layout.is_same_filesystem", return_value=False):
+            test_layout_tool.generate_layout()
+
+        assert installed_jar.exists()
+        assert source_jar.exists() == source_kept
+
+    @pytest.mark.parametrize('rpm_name_to_jars', [{TEST_RPM_NAME_ONE: 1, TEST_RPM_NAME_TWO: 1}])
+    def test_create_layout_with_known_owners_queries_other_jars(self, test_layout_tool, tmp_path,
+                                                                set_models_type_env,
+                                                                fake_process):
+        jar_directory = tmp_path.joinpath(JAR_PATH)
+        known_owners = {str(jar_directory.joinpath("models-0.jar")): ("ERICknown_CXP1234567",
+                                                                      "2.0.0")}
+        fake_process.register_subprocess(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                          str(jar_directory.joinpath("models-1.jar"))],
+                                         stdout="ERICotherrpm_CXP1234567 1.0.2\n")
+        install_dir = test_layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY
+
+        test_layout_tool.generate_layout(str(jar_directory) + "/", known_owners)
+
+        assert install_dir.joinpath("ERICknown_CXP1234567", "2.0.0", "models-0.jar").exists()
+        assert install_dir.joinpath("ERICotherrpm_CXP1234567", "1.0.2", "models-1.jar").exists()
+
+    def test_extract_layout_returns_rpms_extracted(self, tmp_path, set_models_type_env):
+        model_directory = str(tmp_path.joinpath(JAR_PATH))
+        rpm_paths = [write_rpm(tmp_path, "ERICrpm_CXP1234567", "1.0.1",
+                               [model_directory + "/models-0.jar"], payload=b"jar content",
+                               payload_compressor="xz"),
+                     write_rpm(tmp_path, "ERICotherrpm_CXP1234567", "1.0.2",
+                               [model_directory + "/models-1.jar"], payload_compressor="zstd")]
+        layout_tool = ModelLayoutTool()
+        layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY = tmp_path.joinpath("test_install_dir")
+
+        assert layout_tool.extract_layout(rpm_paths, model_directory) == ["ERICrpm_CXP1234567"]
+        assert layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY.joinpath(
+            "ERICrpm_CXP1234567", "1.0.1", "models-0.jar").read_bytes() == b"jar content"
+        assert not layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY.joinpath(
+            "ERICotherrpm_CXP1234567").exists()
+
+    def test_get_package_file_owners(self, tmp_path):
+        rpm_one = write_rpm(tmp_path, "ERICrpm_CXP1234567", "1.0.1",
+                            ["/install/models-0.jar", "/install/shared.jar"])
+        rpm_two = write_rpm(tmp_path, "ERICotherrpm_CXP1234567", "1.0.2",
+                            ["/install/models-1.jar", "/install/shared.jar"])
+        truncated_rpm = tmp_path.joinpath("ERICtruncated_CXP1234567-1.0.0-1.noarch.rpm")
+        truncated_rpm.write_bytes(b"\xed\xab\xee\xdb")
+
+        assert get_package_file_owners([rpm_one, rpm_two, str(truncated_rpm)]) == {
+            "/install/models-0.jar": ("ERICrpm_CXP1234567", "1.0.1"),
+            "/install/models-1.jar": ("ERICotherrpm_CXP1234567", "1.0.2")
+        }
+
+    @pytest.mark.parametrize('rpm_name_to_jars', [{TEST_RPM_NAME_ONE: 2}])
+    def test_create_layout_again_skips_unchanged_jars(self, test_layout_tool, tmp_path,
+                                                      set_models_type_env, monkeypatch,
+                                                      fake_process):
+        monkeypatch.setenv("MODELS_LAYOUT_MODE", "link")
+        installed_jar = test_layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY\
+            .joinpath("ERICrpm_CXP1234567", "1.0.1", "models-0.jar")
+
+        test_layout_tool.generate_layout()
+        test_layout_tool.generate_layout()
+
+        assert installed_jar.exists()
+        assert fake_process.call_count(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                        fake_process.any()]) == 1
+        manifest = load_layout_manifest(str(tmp_path.joinpath("layout_manifest.json")))
+        laid_out_jar = manifest[str(tmp_path.joinpath(JAR_PATH, "models-0.jar"))]
+        assert (laid_out_jar.rpm_name, laid_out_jar.rpm_version, laid_out_jar.size) == \
+            ("ERICrpm_CXP1234567", "1.0.1", 0)
+
+    @pytest.mark.parametrize('rpm_name_to_jars', [{TEST_RPM_NAME_ONE: 2}])
+    def test_create_layout_again_lays_out_changed_and_removes_stale_jars(
+            self, test_layout_tool, tmp_path, set_models_type_env, monkeypatch, fake_process):
+        monkeypatch.setenv("MODELS_LAYOUT_MODE", "link")
+        jar_directory = tmp_path.joinpath(JAR_PATH)
+        install_dir = test_layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY
+        test_layout_tool.generate_layout()
+        jar_directory.joinpath("models-0.jar").write_bytes(b"upgraded")
+        jar_directory.joinpath("models-1.jar").unlink()
+        fake_process.register_subprocess(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                          str(jar_directory.joinpath("models-0.jar"))],
+                                         stdout="ERICrpm_CXP1234567 1.0.2\n")
+
+        test_layout_tool.generate_layout()
+
+        assert install_dir.joinpath("ERICrpm_CXP1234567", "1.0.2", "models-0.jar")\
+            .read_bytes() == b"upgraded"
+        assert not install_dir.joinpath("ERICrpm_CXP1234567", "1.0.1").exists()
+        manifest = load_layout_manifest(str(tmp_path.joinpath("layout_manifest.json")))
+        assert list(manifest) == [str(jar_directory.joinpath("models-0.jar"))]
+
+    @pytest.mark.parametrize('rpm_name_to_jars', [{TEST_RPM_NAME_ONE: 1}])
+    def test_create_layout_again_in_move_mode_keeps_moved_jars(self, test_layout_tool, tmp_path,
+                                                               set_models_type_env):
+        installed_jar = test_layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY\
+            .joinpath("ERICrpm_CXP1234567", "1.0.1", "models-0.jar")
+        test_layout_tool.generate_layout()
+        tmp_path.joinpath(JAR_PATH, "models-0.jar").touch()
+        os.utime(str(tmp_path.joinpath(JAR_PATH, "models-0.jar")),
+                 ns=(installed_jar.stat().st_atime_ns, installed_jar.stat().st_mtime_ns))
+
+        test_layout_tool.generate_layout()
+
+        assert installed_jar.exists()
+        assert not tmp_path.joinpath(JAR_PATH, "models-0.jar").exists()
+        assert len(load_layout_manifest(str(tmp_path.joinpath("layout_manifest.json")))) == 1
+
+    @pytest.mark.parametrize('rpm_name_to_jars', [{TEST_RPM_NAME_ONE: 2}])
+    def test_create_layout_again_in_move_mode_keeps_unchanged_jars(self, test_layout_tool,
+                                                                   tmp_path, set_models_type_env,
+                                                                   fake_process):
+        install_dir = test_layout_tool._TO_BE_INSTALLED_ROOT_DIRECTORY
+        changed_jar = tmp_path.joinpath(JAR_PATH, "models-1.jar")
+        test_layout_tool.generate_layout()
+        changed_jar.write_bytes(b"upgraded")
+        fake_process.register_subprocess(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                          str(changed_jar)], stdout="ERICrpm_CXP1234567 1.0.2\n")
+
+        test_layout_tool.generate_layout()
+
+        assert install_dir.joinpath("ERICrpm_CXP1234567", "1.0.1", "models-0.jar").exists()
+        assert install_dir.joinpath("ERICrpm_CXP1234567", "1.0.2", "models-1.jar")\
+            .read_bytes() == b"upgraded"
+        assert not install_dir.joinpath("ERICrpm_CXP1234567", "1.0.1", "models-1.jar").exists()
+        assert len(load_layout_manifest(str(tmp_path.joinpath("layout_manifest.json")))) == 2
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_get_rpm_owners_queries_in_chunks(self, fake_process, workers):
+        jar_files = ["/install/models-0.jar", "/install/models-1.jar"]
+        for number, jar_file in enumerate(jar_files):
+            fake_process.register_subprocess(['rpm', '-qf', '--queryformat',
+                                              RPM_OWNER_QUERY_FORMAT, jar_file],
+                                             stdout=f"ERICrpm{number}_CXP1234567 1.0.1\n")
+
+        assert get_rpm_owners(jar_files, chunk_size=1, workers=workers) == {
+            jar_file: (f"ERICrpm{number}_CXP1234567", "1.0.1")
+            for number, jar_file in enumerate(jar_files)
+        }
+
+    def test_get_rpm_owners_when_file_has_several_owners_queries_each_file(self, fake_process):
+        jar_files = ["/install/models-0.jar", "/install/models-1.jar"]
+        fake_process.register_subprocess(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                          *jar_files],
+                                         stdout="ERICrpm-two_CXP1234567 1.0.1\n"
+                                                "ERICrpm-two_CXP1234567 1.0.1\n"
+                                                "ERICother-rpm_CXP1234567 2.0.0\n")
+        fake_process.register_subprocess(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                          jar_files[0]],
+                                         stdout="ERICrpm-two_CXP1234567 1.0.1\n")
+        fake_process.register_subprocess(['rpm', '-qf', '--queryformat', RPM_OWNER_QUERY_FORMAT,
+                                          jar_files[1]],
+                                         stdout="ERICrpm-two_CXP1234567 1.0.1\n"
+                                                "ERICother-rpm_CXP1234567 2.0.0\n")
+
+        assert get_rpm_owners(jar_files) == {
+            jar_files[0]: ("ERICrpm-two_CXP1234567", "1.0.1"),
+            jar_files[1]: ("ERICrpm-two_CXP1234567", "1.0.1")
+        }
@@ -6,11 +6,31 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+import json
+import os
+from unittest import mock
+
 import pytest
 
-from download_rpms import RpmDownloadTool
+from download_rpms import CachedRpm, PackageDelta, RpmDownloadTool, get_cached_rpms, \
+    get_chunk_size, get_model_package_versions, get_model_packages, get_package_delta, \
+    is_same_version, load_package_manifest, parse_arguments, read_allow_list, split_into_chunks, \
+    write_package_manifest
+from rpm_factory import write_rpm
+from rpm_header import read_rpm_header_values
 
 TEST_DD_PATH = "tests/resources/test_dd.xml"
+SECOND_DD = """<?xml version="1.0" encoding="UTF-8"?>
+<litp:root xmlns:litp="http://www.ericsson.com/litp" id="root">
+  <litp:software id="software">
+    <litp:model-package id="nodemodel"><name>ERICnodemodelrpm_CX1234567</name></litp:model-package>
+    <litp:model-package-list id="not_a_package"><name>ERICnotamodel_CX1234567</name>
+    </litp:model-package-list>
+    <litp:package id="package"><name>ERICnotamodel_CX1234567</name></litp:package>
+    <litp:model-package id="extra"><name> ERICextramodelrpm_CX1234567 </name></litp:model-package>
+  </litp:software>
+</litp:root>
+"""
 TEST_MODEL_PACKAGES = [
     "ERICnodemodelcommonrpm_CX1234567",
     "ERICnodemodelrpm_CX1234567",
@@ -18,6 +38,37 @@ TEST_MODEL_PACKAGES = [
     "ERICservicemodelrpm_CX1234567"
 ]
 
+INSTALL_PATH = "/var/opt/ericsson/ERICmodeldeployment/data/install/"
+POST_INSTALL_PATH = "/var/opt/ericsson/ERICmodeldeployment/data/post_install/"
+TEST_MODEL_PACKAGE_FILES = {
+    "ERICnodemodelcommonrpm_CX1234567": [INSTALL_PATH + "nodemodelcommon.jar"],
+    "ERICnodemodelrpm_CX1234567": [INSTALL_PATH + "nodemodel.jar"],
+    "ERICpostinstallrpm_CX1234567": [POST_INSTALL_PATH + "postinstall.jar"],
+    "ERICservicemodelrpm_CX1234567": [INSTALL_PATH + "servicemodel.jar"]
+}
+
+
+def write_repo_metadata(repo_metadata_path, versions=None):
+    """
+    Writes uncompressed repodata listing the files and versions of the test packages
+    """
+    repodata = repo_metadata_path.joinpath("repodata")
+    repodata.mkdir(parents=True)
+    repodata.joinpath("repomd.xml").write_text(
+        '<repomd xmlns="http://linux.duke.edu/metadata/repo"><data type="filelists">'
+        '<location href="repodata/filelists.xml"/></data><data type="primary">'
+        '<location href="repodata/primary.xml"/></data></repomd>')
+    primary_packages = "".join(
+        f'<package type="rpm"><name>{name}</name><version ver="{version}" rel="1"/></package>'
+        for name, version in (versions or {}).items())
+    repodata.joinpath("primary.xml").write_text(
+        f'<metadata xmlns="http://linux.duke.edu/metadata/common">{primary_packages}</metadata>')
+    packages = "".join(f'<package name="{name}">' + "".join(f"<file>{file_name}</file>"
+                                                         for file_name in file_names) +
+                       "</package>" for name, file_names in TEST_MODEL_PACKAGE_FILES.items())
+    repodata.joinpath("filelists.xml").write_text(
+        f'<filelists xmlns="http://linux.duke.edu/metadata/filelists">{packages}</filelists>')
+
 
 @pytest.fixture
 def fake_success_download_process(fake_process):
@@ -37,6 +88,23 @@ def fake_failure_download_process(fake_process):
                                       *TEST_MODEL_PACKAGES], returncode=1)
 
 
+@pytest.fixture(autouse=True)
+def zypper_cache(monkeypatch, tmp_path):
+    """
+    Point the tool at an empty zypper cache and retry failed downloads without delay
+
+    :return: the path of the zypper cache
+    """
+    cache_path = tmp_path.joinpath("zypper_cache")
+    cache_path.mkdir()
+    monkeypatch.setattr(RpmDownloadTool, "_ZYPPER_CACHE_PATH", str(cache_path))
+    monkeypatch.setattr(RpmDownloadTool, "_REPO_METADATA_PATH", str(tmp_path.joinpath("raw")))
+    monkeypatch.setattr(RpmDownloadTool, "_PACKAGE_MANIFEST_PATH",
+                        str(tmp_path.joinpath("manifest.json")))
+    monkeypatch.setenv("MODELS_DOWNLOAD_RETRY_INITIAL_DELAY", "0")
+    return cache_path
+
+
 @pytest.fixture
 def test_download_rpm_tool(monkeypatch):
     """
@@ -70,3 +138,212 @@ class TestDownloadRPMs:
         with pytest.raises(FileNotFoundError) as error:
             rpm_download_tool.download_model_rpms()
         assert error
+
+    def test_get_model_packages_from_several_descriptors_without_duplicates(self, tmp_path):
+        second_dd = tmp_path.joinpath("second_dd.xml")
+        second_dd.write_text(SECOND_DD)
+
+        assert get_model_packages([TEST_DD_PATH, str(second_dd)]) == \
+            TEST_MODEL_PACKAGES + ["ERICextramodelrpm_CX1234567"]
+
+    def test_download_model_rpms_from_supplied_descriptors(self, fake_success_download_process):
+        RpmDownloadTool([TEST_DD_PATH, TEST_DD_PATH]).download_model_rpms()
+
+    def test_download_model_rpms_skips_complete_cached_rpms(self, fake_process, zypper_cache,
+                                                            test_download_rpm_tool):
+        write_rpm(zypper_cache, TEST_MODEL_PACKAGES[0], "1.0.0", [])
+        write_rpm(zypper_cache, TEST_MODEL_PACKAGES[2], "1.0.0", [])
+        truncated_rpm = write_rpm(zypper_cache, TEST_MODEL_PACKAGES[3], "1.0.0", [],
+                                  payload=b"payload")
+        os.truncate(truncated_rpm, os.path.getsize(truncated_rpm) - 1)
+        fake_process.register_subprocess(['zypper', 'in', "--download-only", "-y",
+                                          TEST_MODEL_PACKAGES[1], TEST_MODEL_PACKAGES[3]])
+
+        test_download_rpm_tool.download_model_rpms()
+
+        assert fake_process.call_count(['zypper', fake_process.any()]) == 1
+        assert not os.path.exists(truncated_rpm)
+
+    def test_download_model_rpms_all_cached_does_not_run_zypper(self, fake_process, zypper_cache,
+                                                                test_download_rpm_tool):
+        for package in TEST_MODEL_PACKAGES:
+            write_rpm(zypper_cache, package, "1.0.0", [])
+
+        test_download_rpm_tool.download_model_rpms()
+
+        assert fake_process.call_count(['zypper', fake_process.any()]) == 0
+
+    def test_download_model_rpms_reads_cached_rpm_headers_once(self, zypper_cache, tmp_path):
+        for package in TEST_MODEL_PACKAGES:
+            write_rpm(zypper_cache, package, "1.0.0", [])
+        previous_packages = dict.fromkeys(TEST_MODEL_PACKAGES, "1.0.0-1")
+
+        with mock.patch("download_rpms.read_rpm_header_values",
+                        wraps=read_rpm_header_values) as read_header:
+            RpmDownloadTool([TEST_DD_PATH],
+                            previous_packages=previous_packages).download_model_rpms()
+
+        assert read_header.call_count == len(TEST_MODEL_PACKAGES)
+        assert load_package_manifest(str(tmp_path.joinpath("manifest.json"))) == \
+            dict.fromkeys(TEST_MODEL_PACKAGES, "1.0.0-1")
+
+    def test_download_model_rpms_retries_only_failed_chunk(self, fake_process, monkeypatch,
+                                                           test_download_rpm_tool):
+        monkeypatch.setenv("MODELS_DOWNLOAD_CHUNK_SIZE", "2")
+        first_chunk = ['zypper', 'in', "--download-only", "-y", *TEST_MODEL_PACKAGES[:2]]
+        second_chunk = ['zypper', 'in', "--download-only", "-y", *TEST_MODEL_PACKAGES[2:]]
+        fake_process.register_subprocess(first_chunk, returncode=0)
+        fake_process.register_subprocess(second_chunk, returncode=4)
+        fake_process.register_subprocess(second_chunk, returncode=0)
+
+        test_download_rpm_tool.download_model_rpms()
+
+        assert fake_process.call_count(first_chunk) == 1
+        assert fake_process.call_count(second_chunk) == 2
+
+    def test_download_model_rpms_package_not_found_is_not_retried(self, fake_process,
+                                                                  test_download_rpm_tool):
+        command = ['zypper', 'in', "--download-only", "-y", *TEST_MODEL_PACKAGES]
+        fake_process.register_subprocess(command, returncode=104)
+
+        with pytest.raises(SystemExit):
+            test_download_rpm_tool.download_model_rpms()
+        assert fake_process.call_count(command) == 1
+
+    def test_get_cached_rpms_ignores_other_files(self, zypper_cache):
+        rpm_path = write_rpm(zypper_cache, "ERICmodel_CX1", "1.0.0", [])
+        zypper_cache.joinpath("notes.txt").write_text("not an rpm")
+        zypper_cache.joinpath("corrupt.rpm").write_bytes(b"not an rpm")
+
+        assert get_cached_rpms(str(zypper_cache)) == {
+            "ERICmodel_CX1": CachedRpm(path=rpm_path, version="1.0.0-1")}
+        assert not zypper_cache.joinpath("corrupt.rpm").exists()
+
+    def test_get_cached_rpms_does_not_read_known_rpms_again(self, zypper_cache):
+        known_rpms = get_cached_rpms(str(zypper_cache))
+        rpm_path = write_rpm(zypper_cache, "ERICmodel_CX1", "1.0.0", [])
+
+        with mock.patch("download_rpms.read_rpm_header_values",
+                        wraps=read_rpm_header_values) as read_header:
+            assert get_cached_rpms(str(zypper_cache), {
+                "ERICknown_CX1": CachedRpm(path=rpm_path, version="2.0.0-1"), **known_rpms}) == {
+                    "ERICknown_CX1": CachedRpm(path=rpm_path, version="2.0.0-1")}
+        read_header.assert_not_called()
+
+    def test_split_into_chunks(self):
+        assert split_into_chunks(["a", "b", "c"], 2) == [["a", "b"], ["c"]]
+
+    @pytest.mark.parametrize("value", ["0", "many"])
+    def test_get_chunk_size_when_invalid_raise_value_error(self, monkeypatch, value):
+        monkeypatch.setenv("MODELS_DOWNLOAD_CHUNK_SIZE", value)
+        with pytest.raises(ValueError):
+            get_chunk_size()
+
+    def test_download_model_rpms_of_category_from_repo_metadata(self, fake_process, tmp_path):
+        write_repo_metadata(tmp_path.joinpath("raw"))
+        command = ['zypper', 'in', "--download-only", "-y", "ERICnodemodelcommonrpm_CX1234567",
+                   "ERICnodemodelrpm_CX1234567"]
+        fake_process.register_subprocess(command)
+
+        RpmDownloadTool([TEST_DD_PATH], category="nrm_models").download_model_rpms()
+
+        assert fake_process.call_count(command) == 1
+
+    def test_download_model_rpms_of_category_without_metadata_prune_cache(self, zypper_cache):
+        for name, file_names in TEST_MODEL_PACKAGE_FILES.items():
+            write_rpm(zypper_cache, name, "1.0.0", file_names)
+        write_rpm(zypper_cache, "ERIClibrary_CX1234567", "1.0.0", ["/usr/lib/library.so"])
+
+        RpmDownloadTool([TEST_DD_PATH], category="post_install").download_model_rpms()
+
+        assert sorted(os.listdir(str(zypper_cache))) == [
+            "ERIClibrary_CX1234567-1.0.0-1.noarch.rpm",
+            "ERICpostinstallrpm_CX1234567-1.0.0-1.noarch.rpm"]
+
+    def test_download_model_rpms_in_allow_list(self, fake_process):
+        command = ['zypper', 'in', "--download-only", "-y", "ERICservicemodelrpm_CX1234567"]
+        fake_process.register_subprocess(command)
+
+        RpmDownloadTool([TEST_DD_PATH], allow_list=["ERICservicemodelrpm_CX1234567",
+                                                    "ERICunknownrpm_CX1"]).download_model_rpms()
+
+        assert fake_process.call_count(command) == 1
+
+    def test_rpm_download_tool_when_unknown_category_raise_value_error(self):
+        with pytest.raises(ValueError):
+            RpmDownloadTool(category="unknown")
+
+    def test_parse_arguments_and_read_allow_list(self, tmp_path):
+        allow_list = tmp_path.joinpath("allow_list.txt")
+        allow_list.write_text("# service models\nERICservicemodelrpm_CX1234567\n\n")
+
+        arguments = parse_arguments(["--category", "nrm_models", "--allow-list", str(allow_list),
+                                     TEST_DD_PATH])
+
+        assert arguments.deployment_descriptors == [TEST_DD_PATH]
+        assert arguments.category == "nrm_models"
+        assert read_allow_list(arguments.allow_list) == ["ERICservicemodelrpm_CX1234567"]
+
+    def test_download_model_rpms_upgrade_downloads_only_delta(self, fake_process, tmp_path,
+                                                              zypper_cache):
+        write_repo_metadata(tmp_path.joinpath("raw"), {"ERICnodemodelcommonrpm_CX1234567": "1.0.0",
+                                                       "ERICnodemodelrpm_CX1234567": "1.0.1"})
+        write_rpm(zypper_cache, "ERICnodemodelcommonrpm_CX1234567", "1.0.0", [])
+        stale_rpm = write_rpm(zypper_cache, "ERICnodemodelrpm_CX1234567", "1.0.0", [])
+        removed_rpm = write_rpm(zypper_cache, "ERICremovedrpm_CX1", "1.0.0", [])
+        previous_packages = {"ERICnodemodelcommonrpm_CX1234567": "1.0.0-1",
+                             "ERICnodemodelrpm_CX1234567": "1.0.0-1",
+                             "ERICremovedrpm_CX1": "1.0.0-1"}
+        command = ['zypper', 'in', "--download-only", "-y", *TEST_MODEL_PACKAGES[1:]]
+        fake_process.register_subprocess(command)
+
+        RpmDownloadTool([TEST_DD_PATH], previous_packages=previous_packages).download_model_rpms()
+
+        assert fake_process.call_count(command) == 1
+        assert not os.path.exists(stale_rpm)
+        assert not os.path.exists(removed_rpm)
+        assert load_package_manifest(str(tmp_path.joinpath("manifest.json"))) == {
+            "ERICnodemodelcommonrpm_CX1234567": "1.0.0-1", "ERICnodemodelrpm_CX1234567": None,
+            "ERICpostinstallrpm_CX1234567": None, "ERICservicemodelrpm_CX1234567": None}
+
+    def test_get_model_package_versions(self, tmp_path):
+        descriptor = tmp_path.joinpath("dd.xml")
+        descriptor.write_text(
+            '<root><model-package><name>ERICa_CX1</name><version>1.2.0</version>'
+            '<release>3</release></model-package><model-package><name>ERICb_CX1</name>'
+            '<version>2.0.0</version></model-package><model-package><name>ERICc_CX1</name>'
+            '</model-package></root>')
+
+        assert get_model_package_versions([str(descriptor)]) == {
+            "ERICa_CX1": "1.2.0-3", "ERICb_CX1": "2.0.0", "ERICc_CX1": None}
+
+    def test_get_package_delta(self):
+        delta = get_package_delta({"a": "1.0.0-1", "b": "1.0.0-1", "c": None, "d": "1.0.0-1"},
+                                  {"a": "1.0.0-1", "b": "1.0.1-1", "c": "1.0.0-1", "e": None})
+
+        assert delta == PackageDelta(added=["e"], removed=["d"], changed=["b"],
+                                     unchanged=["a", "c"])
+
+    @pytest.mark.parametrize("expected_version, version, same", [
+        ("1.0.0-1", "1.0.0-1", True), ("1.0.0", "1.0.0-2", True), ("1.0.0-1", "1.0.0-2", False),
+        ("1.0.10", "1.0.9-1", False)])
+    def test_is_same_version(self, expected_version, version, same):
+        assert is_same_version(expected_version, version) == same
+
+    def test_package_manifest_round_trip(self, tmp_path):
+        manifest_path = str(tmp_path.joinpath("manifest.json"))
+        write_package_manifest(manifest_path, {"ERICa_CX1": "1.0.0-1", "ERICb_CX1": None})
+
+        assert load_package_manifest(manifest_path) == {"ERICa_CX1": "1.0.0-1", "ERICb_CX1": None}
+
+    def test_load_package_manifest_when_unknown_format_raise_value_error(self, tmp_path):
+        manifest_path = tmp_path.joinpath("manifest.json")
+        manifest_path.write_text(json.dumps({"version": 99, "packages": {}}))
+
+        with pytest.raises(ValueError):
+            load_package_manifest(str(manifest_path))
+
+    def test_parse_arguments_previous_build_options_are_exclusive(self):
+        with pytest.raises(SystemExit):
+            parse_arguments(["--previous-manifest", "manifest.json",
+                             "--previous-descriptor", TEST_DD_PATH])
@@ -0,0 +1,61 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import threading
+from unittest import mock
+
+import pytest
+
+from file_watcher import wait_for_file
+
+
+def create_file_later(file_path, delay):
+    """
+    Creates 'file_path' after 'delay' seconds in a background thread
+    """
+    timer = threading.Timer(delay, file_path.touch)
+    timer.start()
+    return timer
+
+
+class TestFileWatcher:
+    """
+    Test class for script `file_watcher`.
+    """
+
+    def test_wait_for_file_when_exists_returns_immediately(self, tmp_path):
+        service_file = tmp_path.joinpath("ModelDeploymentService")
+        service_file.touch()
+        assert wait_for_file(service_file, timeout=1) < 1
+
+    def test_wait_for_file_returns_when_created(self, tmp_path):
+        service_file = tmp_path.joinpath("ModelDeploymentService")
+        create_file_later(service_file, 0.2)
+        waited = wait_for_file(service_file, timeout=10, max_poll_interval=5)
+        assert 0.1 < waited < 2
+
+    def test_wait_for_file_polling_fallback_returns_when_created(self, tmp_path):
+        service_file = tmp_path.joinpath("ModelDeploymentService")
+        create_file_later(service_file, 0.2)
+        with mock.patch("file_watcher._Inotify.watch", return_value=False):
+            waited = wait_for_file(service_file, timeout=10, max_poll_interval=0.2)
+        assert 0.1 < waited < 2
+
+    def test_wait_for_file_when_parent_created_later(self, tmp_path):
+        service_file = tmp_path.joinpath("data", "ModelDeploymentService")
+        timer = threading.Timer(0.1, service_file.parent.mkdir)
+        timer.start()
+        create_file_later(service_file, 0.3)
+        assert wait_for_file(service_file, timeout=10, max_poll_interval=0.2) < 2
+
+    def test_wait_for_file_when_deadline_passed_raise_timeout_error(self, tmp_path):
+        progress = mock.Mock()
+        with pytest.raises(TimeoutError):
+            wait_for_file(tmp_path.joinpath("never"), timeout=0.3, max_poll_interval=0.05,
+                          progress_callback=progress, progress_interval=0.1)
+        assert progress.called
@@ -0,0 +1,146 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import errno
+import os
+from unittest import mock
+
+import pytest
+
+from copy_engine import ParallelCopier
+from jar_store import JarStore, hash_file
+
+NRM_JAR = "ERICnodemodelrpm_CX1234567/1.0.1/models.jar"
+NRM_COMMON_JAR = "ERICnodemodelcommonrpm_CX1234567/1.0.1/models.jar"
+SERVICE_JAR = "ERICservicemodelrpm_CX1234567/1.0.2/models.jar"
+TEST_JARS = {NRM_JAR: b"same content", NRM_COMMON_JAR: b"same content", SERVICE_JAR: b"other"}
+
+
+@pytest.fixture
+def source_directory(tmp_path):
+    """
+    Creates a source directory of test jars, two of which are identical
+
+    :return: path of the source directory
+    """
+    source = tmp_path.joinpath("source")
+    for jar, content in TEST_JARS.items():
+        source.joinpath(jar).parent.mkdir(parents=True, exist_ok=True)
+        source.joinpath(jar).write_bytes(content)
+    return source
+
+
+@pytest.fixture
+def jar_store(tmp_path):
+    """
+    :return: a test jar store
+    """
+    return JarStore(tmp_path.joinpath("mount", "store"), ParallelCopier(workers=2), workers=2)
+
+
+class TestJarStore:
+    """
+    Test class for script `jar_store`.
+    """
+
+    def test_stage_tree_stores_identical_jars_once(self, source_directory, jar_store, tmp_path):
+        staging = tmp_path.joinpath("mount", "staging")
+        stats = jar_store.stage_tree(source_directory, staging)
+
+        assert stats.files == 3
+        assert stats.stored_files == 2
+        assert stats.linked_files == 3
+        for jar, content in TEST_JARS.items():
+            assert staging.joinpath(jar).read_bytes() == content
+        assert staging.joinpath(NRM_JAR).stat().st_ino == \
+            staging.joinpath(NRM_COMMON_JAR).stat().st_ino
+        stored_path = jar_store.get_store_path(hash_file(str(source_directory.joinpath(NRM_JAR))))
+        assert os.path.samefile(stored_path, staging.joinpath(NRM_JAR))
+
+    def test_stage_tree_across_runs_writes_nothing_new(self, source_directory, jar_store,
+                                                       tmp_path):
+        jar_store.stage_tree(source_directory, tmp_path.joinpath("mount", "staging1"))
+        stats = jar_store.stage_tree(source_directory, tmp_path.joinpath("mount", "staging2"))
+
+        assert stats.stored_files == 0
+        assert stats.stored_bytes == 0
+        assert stats.linked_files == 3
+
+    def test_stage_tree_reused_staging_dir_removes_extra_files(self, source_directory, jar_store,
+                                                               tmp_path):
+        staging = tmp_path.joinpath("mount", "staging")
+        extra_jar = staging.joinpath("ERIColdrpm_CX1234567", "1.0.0", "old.jar")
+        extra_jar.parent.mkdir(parents=True)
+        extra_jar.write_bytes(b"old")
+
+        jar_store.stage_tree(source_directory, staging)
+        jar_store.stage_tree(source_directory, staging)
+
+        assert not extra_jar.exists()
+        assert staging.joinpath(SERVICE_JAR).read_bytes() == b"other"
+
+    def test_stage_tree_given_subdirectories_stages_only_them(self, source_directory, jar_store,
+                                                              tmp_path):
+        staging = tmp_path.joinpath("mount", "staging")
+        stats = jar_store.stage_tree(source_directory, staging, [os.path.dirname(SERVICE_JAR)])
+
+        assert stats.files == 1
+        assert staging.joinpath(SERVICE_JAR).read_bytes() == b"other"
+        assert not staging.joinpath(NRM_JAR).exists()
+
+    def test_stage_tree_when_links_unsupported_then_copy(self, source_directory, jar_store,
+                                                         tmp_path):
+        staging = tmp_path.joinpath("mount", "staging")
+        with mock.patch("os.link", side_effect=OSError(errno.EPERM, "not permitted")):
+            stats = jar_store.stage_tree(source_directory, staging)
+
+        assert stats.linked_files == 0
+        assert staging.joinpath(SERVICE_JAR).read_bytes() == b"other"
+
+    def test_stage_tree_when_stored_jar_pruned_before_link_then_store_again(
+            self, source_directory, tmp_path):
+        jar_store = JarStore(tmp_path.joinpath("mount", "store"), ParallelCopier(workers=1))
+        staging = tmp_path.joinpath("mount", "staging")
+        link = os.link
+        pruned = []
+
+        def prune_then_link(store_path, staging_path):
+            if not pruned:
+                pruned.append(jar_store.prune(retention_days=-1))
+            link(store_path, staging_path)
+
+        with mock.patch("os.link", side_effect=prune_then_link):
+            stats = jar_store.stage_tree(source_directory, staging)
+
+        assert pruned == [2]
+        assert stats.linked_files == 3
+        for jar, content in TEST_JARS.items():
+            assert staging.joinpath(jar).read_bytes() == content
+
+    def test_stage_tree_writes_no_temporary_files(self, source_directory, jar_store, tmp_path):
+        jar_store.stage_tree(source_directory, tmp_path.joinpath("mount", "staging"))
+
+        assert not [file_name for _, _, file_names in os.walk(jar_store.store_directory)
+                    for file_name in file_names if file_name.endswith(".tmp")]
+
+    def test_stage_tree_when_source_missing_raise_error(self, jar_store, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            jar_store.stage_tree(tmp_path.joinpath("missing"), tmp_path.joinpath("staging"))
+
+    def test_prune_removes_only_unlinked_expired_jars(self, source_directory, jar_store,
+                                                      tmp_path, monkeypatch):
+        staging = tmp_path.joinpath("mount", "staging")
+        jar_store.stage_tree(source_directory, staging)
+        assert jar_store.prune(retention_days=0) == 0
+
+        staging.joinpath(SERVICE_JAR).unlink()
+        assert jar_store.prune(retention_days=1) == 0
+
+        monkeypatch.setenv("MDT_JAR_STORE_RETENTION_DAYS", "-1")
+        assert jar_store.prune() == 1
+        assert staging.joinpath(NRM_JAR).exists()
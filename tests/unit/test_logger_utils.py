@@ -0,0 +1,107 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import logging
+import socket
+from logging.handlers import QueueHandler
+
+import pytest
+
+import logger_utils
+
+IS_PROCESS_RUNNING = logger_utils._is_process_running
+
+
+@pytest.fixture
+def root_handlers(monkeypatch):
+    """
+    Reset the logging configuration and capture the handlers given to the root logger
+
+    :return: the list the root logger handlers are added to
+    """
+    handlers = []
+    monkeypatch.setattr(logging, "basicConfig",
+                        lambda **kwargs: handlers.extend(kwargs["handlers"]))
+    add_handler = logging.getLogger().addHandler
+    monkeypatch.setattr(logging.getLogger(), "addHandler", lambda handler: handlers.append(
+        handler) if handler.__module__.startswith("logging") else add_handler(handler))
+    logger_utils._reset_logging()
+    yield handlers
+    logger_utils._reset_logging()
+
+
+class TestLoggerUtils:
+    """
+    Test class for script `logger_utils`.
+    """
+
+    def test_get_logger_configures_logging_once(self, root_handlers, monkeypatch):
+        enable_calls = []
+        monkeypatch.setattr(logger_utils, "_enable_syslog", lambda: enable_calls.append(1))
+        monkeypatch.setattr(logger_utils, "_get_syslog_handler", lambda: None)
+
+        logger_utils.get_logger("First")
+        logger_utils.get_logger("Second")
+
+        assert enable_calls == [1]
+        assert len(root_handlers) == 1
+        assert logger_utils._configure_logging() is None
+
+    def test_get_logger_retries_syslog_when_unavailable(self, root_handlers, monkeypatch):
+        syslog_handlers = [None, logging.NullHandler()]
+        monkeypatch.setattr(logger_utils, "_enable_syslog", lambda: None)
+        monkeypatch.setattr(logger_utils, "_get_syslog_handler",
+                            lambda: syslog_handlers.pop(0))
+        monkeypatch.setattr(logger_utils, "_SYSLOG_RETRY_INTERVAL", 0)
+
+        logger_utils.get_logger("First")
+        assert len(root_handlers) == 1
+
+        logger_utils.get_logger("Second")
+        logger_utils.get_logger("Third")
+        assert len(root_handlers) == 2
+        assert isinstance(root_handlers[1], QueueHandler)
+        assert logger_utils._configure_logging() is not None
+
+    def test_get_logger_sends_syslog_records_through_queue(self, root_handlers,
+                                                           monkeypatch, tmp_path):
+        syslog_address = str(tmp_path.joinpath("log"))
+        syslog_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        syslog_socket.bind(syslog_address)
+        syslog_socket.settimeout(5)
+        monkeypatch.setattr(logger_utils, "_SYSLOG_ADDRESS", syslog_address)
+
+        logger_utils.get_logger("QueueTest")
+
+        queue_handler = next(handler for handler in root_handlers
+                             if isinstance(handler, QueueHandler))
+        queue_handler.handle(logging.makeLogRecord({"name": "QueueTest", "lineno": 1,
+                                                    "levelno": logging.INFO,
+                                                    "levelname": "INFO",
+                                                    "msg": "queued %s", "args": ("record",)}))
+        assert syslog_socket.recv(4096).endswith(b"(QueueTest:1) INFO - queued record\x00")
+        syslog_socket.close()
+
+    def test_is_process_running_reads_proc(self, monkeypatch, tmp_path):
+        for pid, comm in (("1", "init\n"), ("42", "rsyslogd\n")):
+            tmp_path.joinpath(pid).mkdir()
+            tmp_path.joinpath(pid, "comm").write_text(comm)
+        tmp_path.joinpath("self").mkdir()
+        tmp_path.joinpath("99").mkdir()
+        monkeypatch.setattr(logger_utils, "_PROC_PATH", str(tmp_path))
+
+        assert IS_PROCESS_RUNNING("rsyslogd")
+        assert not IS_PROCESS_RUNNING("sshd")
+
+    def test_enable_syslog_starts_rsyslogd_when_not_running(self, monkeypatch, fake_process):
+        monkeypatch.setattr(logger_utils, "_is_process_running", lambda process_name: False)
+        fake_process.register_subprocess("/sbin/rsyslogd")
+
+        logger_utils._enable_syslog()
+
+        assert fake_process.call_count("/sbin/rsyslogd") == 1
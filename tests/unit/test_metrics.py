@@ -0,0 +1,101 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import json
+
+import pytest
+
+import metrics
+from metrics import Metrics, export_metrics, recorded_run, run_tool
+
+
+@pytest.fixture
+def process_metrics(monkeypatch):
+    """
+    Replace the process metrics with an empty registry
+
+    :return: the registry
+    """
+    test_metrics = Metrics()
+    monkeypatch.setattr(metrics, "_METRICS", test_metrics)
+    return test_metrics
+
+
+class TestMetrics:
+    """
+    Test class for script `metrics`.
+    """
+
+    def test_span_and_counters_in_trace(self):
+        test_metrics = Metrics()
+        with test_metrics.span("zypper_install", rpms=3):
+            pass
+        test_metrics.increment("rpms_installed", 3)
+        test_metrics.increment("rpms_installed", 2)
+
+        trace = test_metrics.to_trace("model_installer")
+
+        assert [(event["name"], event["ph"], event["args"]) for event in trace["traceEvents"]] == \
+            [("zypper_install", "X", {"rpms": 3})]
+        assert trace["otherData"] == {"job": "model_installer", "counters": {"rpms_installed": 5}}
+
+    def test_span_recorded_when_body_raises(self):
+        test_metrics = Metrics()
+        with pytest.raises(ValueError):
+            with test_metrics.span("failing"):
+                raise ValueError("failed")
+
+        assert [recorded_span.name for recorded_span in test_metrics.spans] == ["failing"]
+
+    def test_to_prometheus(self):
+        test_metrics = Metrics()
+        for _ in range(2):
+            with test_metrics.span("download_chunk"):
+                pass
+        test_metrics.increment("bytes-downloaded", 10)
+
+        lines = test_metrics.to_prometheus("download_rpms").splitlines()
+
+        assert 'models_phase_count{job="download_rpms",phase="download_chunk"} 2' in lines
+        assert any(line.startswith('models_phase_duration_seconds{job="download_rpms",'
+                                   'phase="download_chunk"} ') for line in lines)
+        assert "# TYPE models_bytes_downloaded_total counter" in lines
+        assert 'models_bytes_downloaded_total{job="download_rpms"} 10' in lines
+
+    def test_recorded_run_exports_to_metrics_dir(self, process_metrics, monkeypatch, tmp_path):
+        monkeypatch.setenv("MODELS_METRICS_DIR", str(tmp_path.joinpath("metrics")))
+
+        with pytest.raises(SystemExit):
+            with recorded_run("trigger_mdt"):
+                metrics.increment("mdc_attempts", 2)
+                raise SystemExit(2)
+
+        trace = json.loads(tmp_path.joinpath("metrics", "trigger_mdt.trace.json").read_text())
+        assert [event["name"] for event in trace["traceEvents"]] == ["total"]
+        assert 'models_mdc_attempts_total{job="trigger_mdt"} 2' in \
+            tmp_path.joinpath("metrics", "trigger_mdt.prom").read_text()
+
+    def test_run_tool_passes_arguments_and_exports(self, process_metrics, monkeypatch, tmp_path):
+        monkeypatch.setenv("MODELS_METRICS_DIR", str(tmp_path))
+        tool_arguments = []
+
+        run_tool("verify_rpms", tool_arguments.append, ["--workers", "2"])
+
+        assert tool_arguments == [["--workers", "2"]]
+        assert tmp_path.joinpath("verify_rpms.prom").exists()
+
+    def test_export_metrics_not_configured(self, process_metrics, monkeypatch):
+        monkeypatch.delenv("MODELS_METRICS_DIR", raising=False)
+
+        assert export_metrics("trigger_mdt") == []
+
+    def test_export_metrics_failure_is_not_raised(self, process_metrics, tmp_path):
+        not_a_directory = tmp_path.joinpath("file")
+        not_a_directory.write_text("")
+
+        assert export_metrics("trigger_mdt", str(not_a_directory)) == []
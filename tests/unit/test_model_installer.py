@@ -6,9 +6,12 @@ permission from Ericsson Inc. or in accordance with the terms and
 conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
+from subprocess import TimeoutExpired
+
 import pytest
 
-from model_installer import ModelInstaller
+import model_installer as model_installer_module
+from model_installer import ModelInstaller, get_install_mode
 
 INSTALL_DIRECTORY = "rpms"
 TEST_MODEL_PACKAGES = [
@@ -51,3 +54,34 @@ class TestModelInstaller:
         with pytest.raises(SystemExit) as error:
             model_installer._install_model_rpms(TEST_MODEL_PACKAGES)
         assert error
+
+    def test_install_model_rpm_when_install_times_out_system_exit(self, monkeypatch):
+        monkeypatch.setenv("MODELS_INSTALL_TIMEOUT", "60")
+        timeouts = []
+
+        def time_out(command, timeout=None):
+            timeouts.append(timeout)
+            raise TimeoutExpired(command, timeout, stderr=b"")
+
+        monkeypatch.setattr(model_installer_module, "execute_subprocess_command", time_out)
+        model_installer = ModelInstaller("deploy_file")
+        with pytest.raises(SystemExit):
+            model_installer._install_model_rpms(TEST_MODEL_PACKAGES)
+        assert timeouts == [60]
+
+    @pytest.mark.parametrize("install_mode, expected_mode", [(None, "zypper"),
+                                                             ("extract", "extract")])
+    def test_get_install_mode(self, monkeypatch, install_mode, expected_mode):
+        if install_mode is None:
+            monkeypatch.delenv("MODELS_INSTALL_MODE", raising=False)
+        else:
+            monkeypatch.setenv("MODELS_INSTALL_MODE", install_mode)
+
+        assert get_install_mode() == expected_mode
+
+    def test_get_install_mode_when_invalid_raise_value_error(self, monkeypatch):
+        monkeypatch.setenv("MODELS_INSTALL_MODE", "rpm")
+        with pytest.raises(ValueError) as error:
+            get_install_mode()
+        assert "MODELS_INSTALL_MODE must be 'zypper' or 'extract'. rpm supplied" == \
+            error.value.args[0]
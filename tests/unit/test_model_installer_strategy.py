@@ -9,6 +9,7 @@ program(s) have been supplied.
 import pytest
 
 from model_installer_strategy import FilterStrategy, ModelInstallerStrategy
+from rpm_factory import write_rpm
 
 RPM_CACHE = "tests/resources/zypper_cache/"
 DEPLOY_FILES_DIR = "tests/resources/deploy_files/"
@@ -55,6 +56,20 @@ def setup_zypper_cache(fake_process, monkeypatch):
     monkeypatch.setattr(FilterStrategy, "_ENM_ISO_REPO_PATH", RPM_CACHE)
 
 
+@pytest.fixture
+def setup_rpm_header_cache(tmp_path, monkeypatch):
+    """
+    Creates a repo cache of valid RPMs that can be read without the 'rpm' command
+    """
+    install = "/var/opt/ericsson/ERICmodeldeployment/data/install/model.jar"
+    post_install = "/var/opt/ericsson/ERICmodeldeployment/data/post_install/model.jar"
+    write_rpm(tmp_path, "ERICnodemodelrpm_CX1234567", "1.0.1", [install])
+    write_rpm(tmp_path, "ERICpostinstallrpm_CX1234567", "1.0.1", [post_install])
+    write_rpm(tmp_path, "ERICservicemodelrpm_CX1234567", "1.0.1", [install])
+
+    monkeypatch.setattr(FilterStrategy, "_ENM_ISO_REPO_PATH", str(tmp_path) + "/")
+
+
 class TestModelInstallerStrategy:
     """
     Test class for class model_installer_strategy.ModelInstallStrategy
@@ -66,6 +81,27 @@ class TestModelInstallerStrategy:
         actual = ModelInstallerStrategy.get_models_to_deploy(deploy_file_path)
         assert actual == expected_output
 
+    @pytest.mark.parametrize("deploy_file_path,expected_output", [
+        (NRM_DEPLOY_FILE_PATH, ["ERICnodemodelrpm_CX1234567"]),
+        (POST_INSTALL_DEPLOY_FILE_PATH, ["ERICpostinstallrpm_CX1234567"]),
+        (SERVICE_MODELS_DEPLOY_FILE_PATH, ["ERICservicemodelrpm_CX1234567"])
+    ])
+    def test_get_models_to_deploy_from_rpm_headers_success(self, deploy_file_path, expected_output,
+                                                           setup_rpm_header_cache, fake_process):
+        fake_process.allow_unregistered(False)
+        actual = ModelInstallerStrategy.get_models_to_deploy(deploy_file_path)
+        assert actual == expected_output
+
+    def test_get_cached_rpm_paths_leaves_out_rpms_with_two_versions(self, setup_rpm_header_cache,
+                                                                  tmp_path, fake_process):
+        fake_process.allow_unregistered(False)
+        write_rpm(tmp_path, "ERICservicemodelrpm_CX1234567", "1.0.2",
+                  ["/var/opt/ericsson/ERICmodeldeployment/data/install/model.jar"])
+
+        assert FilterStrategy.get_cached_rpm_paths(
+            ["ERICnodemodelrpm_CX1234567", "ERICservicemodelrpm_CX1234567", "ERICmissing"]) == \
+            [str(tmp_path.joinpath("ERICnodemodelrpm_CX1234567-1.0.1-1.noarch.rpm"))]
+
     def test_get_models_to_deploy_given_invalid_model_category_raise_value_error(self):
         with pytest.raises(ValueError) as error:
             ModelInstallerStrategy.get_models_to_deploy(INVALID_CATEGORY_DEPLOY_FILE_PATH)
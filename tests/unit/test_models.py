@@ -0,0 +1,103 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import json
+
+import pytest
+
+import model_installer
+from create_model_layout import ModelLayoutTool
+from model_installer_strategy import FilterStrategy
+from models import main
+from rpm_factory import write_rpm
+
+RPM_OWNER_QUERY_FORMAT = "%{NAME} %{VERSION}\\n"
+
+
+@pytest.fixture
+def setup_pipeline(tmp_path, monkeypatch, fake_process):
+    """
+    Creates a repo cache of one model RPM, a deploy file installing it and the installed
+    model directory holding its jar and a jar of another RPM
+    """
+    repo_directory = tmp_path.joinpath("repo")
+    repo_directory.mkdir()
+    model_directory = tmp_path.joinpath("data", "install")
+    model_directory.mkdir(parents=True)
+    model_directory.joinpath("model.jar").touch()
+    model_directory.joinpath("other.jar").touch()
+    write_rpm(repo_directory, "ERICnodemodelrpm_CX1234567", "1.0.1",
+              [str(model_directory.joinpath("model.jar"))])
+    deploy_file = tmp_path.joinpath("model-deploy.json")
+    deploy_file.write_text(json.dumps({"deploy": {"rpms": ["ERICnodemodelrpm_CX1234567"]}}))
+
+    monkeypatch.setattr(FilterStrategy, "_ENM_ISO_REPO_PATH", str(repo_directory) + "/")
+    monkeypatch.setattr(ModelLayoutTool, "_TO_BE_INSTALLED_ROOT_DIRECTORY",
+                        str(tmp_path.joinpath("toBeInstalled")))
+    monkeypatch.setenv("MODELS_TYPE", "nrm_models")
+    monkeypatch.delenv("MODELS_METRICS_DIR", raising=False)
+    fake_process.allow_unregistered(False)
+    fake_process.register_subprocess(["zypper", "in", "-y", "ERICnodemodelrpm_CX1234567"])
+    fake_process.register_subprocess(["rpm", "-qf", "--queryformat", RPM_OWNER_QUERY_FORMAT,
+                                      str(model_directory.joinpath("other.jar"))],
+                                     stdout="ERICotherrpm_CX1234567 1.0.2\n")
+    return str(deploy_file), str(model_directory) + "/"
+
+
+class TestModels:
+    """
+    Test class for script `models`.
+    """
+
+    def test_main_runs_command_of_tool(self, monkeypatch):
+        monkeypatch.delenv("MODELS_METRICS_DIR", raising=False)
+        tool_arguments = []
+        monkeypatch.setattr(model_installer, "main", tool_arguments.append)
+
+        main(["install", "model-deploy.json"])
+
+        assert tool_arguments == [["model-deploy.json"]]
+
+    @pytest.mark.parametrize("arguments", [[], ["deploy"]])
+    def test_main_given_unknown_command_system_exit(self, arguments):
+        with pytest.raises(SystemExit) as error:
+            main(arguments)
+        assert error.value.code == 2
+
+    def test_pipeline_queries_owners_of_jars_not_installed(self, setup_pipeline, tmp_path,
+                                                           fake_process):
+        deploy_file, model_directory = setup_pipeline
+
+        main(["pipeline", deploy_file, model_directory])
+
+        to_be_installed = tmp_path.joinpath("toBeInstalled")
+        assert to_be_installed.joinpath("ERICnodemodelrpm_CX1234567", "1.0.1",
+                                        "model.jar").exists()
+        assert to_be_installed.joinpath("ERICotherrpm_CX1234567", "1.0.2", "other.jar").exists()
+        assert fake_process.call_count(["rpm", "-qf", "--queryformat", RPM_OWNER_QUERY_FORMAT,
+                                        fake_process.any()]) == 1
+
+    def test_pipeline_extract_mode_installs_rpms_that_cannot_be_extracted(self, setup_pipeline,
+                                                                          tmp_path, monkeypatch):
+        deploy_file, model_directory = setup_pipeline
+        monkeypatch.setenv("MODELS_INSTALL_MODE", "extract")
+        write_rpm(tmp_path.joinpath("repo"), "ERICservicemodelrpm_CX1234567", "2.0.0",
+                  [model_directory + "service.jar"], payload=b"jar content",
+                  payload_compressor="gzip")
+        with open(deploy_file, "w") as deploy:
+            json.dump({"deploy": {"rpms": ["ERICnodemodelrpm_CX1234567",
+                                           "ERICservicemodelrpm_CX1234567"]}}, deploy)
+
+        main(["pipeline", deploy_file, model_directory])
+
+        to_be_installed = tmp_path.joinpath("toBeInstalled")
+        assert to_be_installed.joinpath("ERICservicemodelrpm_CX1234567", "2.0.0",
+                                        "service.jar").read_bytes() == b"jar content"
+        assert to_be_installed.joinpath("ERICnodemodelrpm_CX1234567", "1.0.1",
+                                        "model.jar").exists()
+        assert to_be_installed.joinpath("ERICotherrpm_CX1234567", "1.0.2", "other.jar").exists()
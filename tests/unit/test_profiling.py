@@ -0,0 +1,94 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import pstats
+import tracemalloc
+
+import pytest
+
+from metrics import recorded_run
+from profiling import get_profilers, profiled_run
+
+
+def _allocate():
+    return [bytearray(1024) for _ in range(100)]
+
+
+class TestProfiling:
+    """
+    Test class for script `profiling`.
+    """
+
+    @pytest.mark.parametrize("profile, expected_profilers", [
+        (None, []), ("", []), ("cpu", ["cpu"]), ("MEM", ["mem"]), (" both ", ["cpu", "mem"]),
+        ("gpu", [])])
+    def test_get_profilers(self, monkeypatch, profile, expected_profilers):
+        if profile is None:
+            monkeypatch.delenv("MODELS_PROFILE", raising=False)
+        else:
+            monkeypatch.setenv("MODELS_PROFILE", profile)
+
+        assert get_profilers() == expected_profilers
+
+    def test_profiled_run_disabled_writes_nothing(self, monkeypatch, tmp_path):
+        monkeypatch.delenv("MODELS_PROFILE", raising=False)
+
+        with profiled_run("model_installer", str(tmp_path)):
+            _allocate()
+
+        assert list(tmp_path.iterdir()) == []
+
+    def test_profiled_run_cpu(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("MODELS_PROFILE", "cpu")
+
+        with profiled_run("model_installer", str(tmp_path)):
+            _allocate()
+
+        profile_files = sorted(path.name for path in tmp_path.iterdir())
+        assert len(profile_files) == 2
+        assert profile_files[0].startswith("model_installer-")
+        assert profile_files[0].endswith(".cpu.txt")
+        assert profile_files[1] == profile_files[0].replace(".cpu.txt", ".prof")
+        prof_file = next(tmp_path.glob("*.prof"))
+        assert any(function[2] == "_allocate" for function in pstats.Stats(str(prof_file)).stats)
+        assert "_allocate" in next(tmp_path.glob("*.cpu.txt")).read_text()
+
+    def test_profiled_run_both_when_body_raises(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("MODELS_PROFILE", "both")
+        monkeypatch.setenv("MODELS_PROFILE_DIR", str(tmp_path))
+
+        with pytest.raises(SystemExit):
+            with profiled_run("trigger_mdt"):
+                _allocate()
+                raise SystemExit(2)
+
+        assert len(list(tmp_path.glob("trigger_mdt-*.prof"))) == 1
+        memory_report = next(tmp_path.glob("trigger_mdt-*.mem.txt")).read_text()
+        assert memory_report.startswith("Peak traced memory:")
+        assert "test_profiling.py" in memory_report
+        assert not tracemalloc.is_tracing()
+
+    def test_profiled_run_write_failure_is_not_raised(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("MODELS_PROFILE", "mem")
+        not_a_directory = tmp_path.joinpath("file")
+        not_a_directory.write_text("")
+
+        with profiled_run("download_rpms", str(not_a_directory)):
+            _allocate()
+
+        assert not tracemalloc.is_tracing()
+
+    def test_recorded_run_profiles(self, monkeypatch, tmp_path):
+        monkeypatch.delenv("MODELS_METRICS_DIR", raising=False)
+        monkeypatch.setenv("MODELS_PROFILE", "cpu")
+        monkeypatch.setenv("MODELS_PROFILE_DIR", str(tmp_path))
+
+        with recorded_run("repo_classifier"):
+            _allocate()
+
+        assert len(list(tmp_path.glob("repo_classifier-*.prof"))) == 1
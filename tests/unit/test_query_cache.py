@@ -0,0 +1,117 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import os
+
+import pytest
+
+import query_cache
+from create_model_layout import get_rpm_owners, RPM_OWNER_QUERY
+from query_cache import execute_cached_query, get_query_cache, QueryCache
+
+
+@pytest.fixture
+def rpm_file(tmp_path):
+    """
+    :return: path of a file queried in the tests
+    """
+    file_path = tmp_path.joinpath("ERICrpm_CXP1234567-1.0.1-1.noarch.rpm")
+    file_path.write_bytes(b"rpm")
+    return str(file_path)
+
+
+class TestQueryCache:
+    """
+    Test class for script `query_cache`.
+    """
+
+    def test_key_changes_with_file(self, rpm_file):
+        key = QueryCache.get_key(["rpm", "-qpl", rpm_file], [rpm_file])
+        assert key == QueryCache.get_key(["rpm", "-qpl", rpm_file], [rpm_file])
+
+        with open(rpm_file, "ab") as appended_file:
+            appended_file.write(b"changed")
+        assert key != QueryCache.get_key(["rpm", "-qpl", rpm_file], [rpm_file])
+        assert key != QueryCache.get_key(["rpm", "-qpl", rpm_file], [rpm_file], [["rpmdb"]])
+
+    def test_key_of_missing_file_is_none(self, tmp_path):
+        missing_file = str(tmp_path.joinpath("missing"))
+        assert QueryCache.get_key(["rpm", "-qf", missing_file], [missing_file]) is None
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_entries=2)
+        cache.put("first", b"1")
+        cache.put("second", b"2")
+        assert cache.get("first") == b"1"
+        cache.put("third", b"3")
+
+        assert cache.get("second") is None
+        assert cache.get("first") == b"1"
+        assert cache.get("third") == b"3"
+        assert (cache.hits, cache.misses) == (3, 1)
+
+    def test_save_and_load(self, tmp_path):
+        cache_path = str(tmp_path.joinpath("cache", "rpm_query_cache.json"))
+        cache = QueryCache(path=cache_path)
+        cache.put("key", b"\x00answer\n")
+        cache.save()
+
+        loaded_cache = QueryCache(path=cache_path)
+        loaded_cache.load()
+        assert loaded_cache.get("key") == b"\x00answer\n"
+
+    def test_load_when_corrupt_is_empty(self, tmp_path):
+        cache_path = tmp_path.joinpath("rpm_query_cache.json")
+        cache_path.write_text("{not json")
+        cache = QueryCache(path=str(cache_path))
+        cache.load()
+        assert len(cache) == 0
+
+    def test_get_query_cache_from_env(self, monkeypatch, tmp_path):
+        cache_path = str(tmp_path.joinpath("rpm_query_cache.json"))
+        QueryCache(path=cache_path).put("unsaved", b"")
+        saved_cache = QueryCache(path=cache_path)
+        saved_cache.put("key", b"answer")
+        saved_cache.save()
+        monkeypatch.setattr(query_cache, "_QUERY_CACHE", None)
+        monkeypatch.setenv("MODELS_QUERY_CACHE_PATH", cache_path)
+        monkeypatch.setenv("MODELS_QUERY_CACHE_SIZE", "5")
+        monkeypatch.setattr(query_cache.atexit, "register", lambda function: None)
+
+        cache = get_query_cache()
+        assert cache.max_entries == 5
+        assert cache.get("key") == b"answer"
+        assert get_query_cache() is cache
+
+    def test_execute_cached_query_runs_once(self, fake_process, rpm_file):
+        command = ["rpm", "-qpl", rpm_file]
+        fake_process.register_subprocess(command, stdout="/install/model.jar\n")
+        fake_process.keep_last_process(False)
+
+        assert execute_cached_query(command, [rpm_file]) == b"/install/model.jar\n"
+        assert execute_cached_query(command, [rpm_file]) == b"/install/model.jar\n"
+        assert fake_process.call_count(command) == 1
+
+    def test_get_rpm_owners_queries_only_uncached_files(self, fake_process, tmp_path):
+        jar_files = [str(tmp_path.joinpath(f"model-{number}.jar")) for number in range(3)]
+        for jar_file in jar_files:
+            with open(jar_file, "w"):
+                pass
+        fake_process.register_subprocess([*RPM_OWNER_QUERY, *jar_files[:2]],
+                                          stdout="ERICone_CXP1 1.0.1\nERICtwo_CXP2 1.0.2\n")
+        fake_process.register_subprocess([*RPM_OWNER_QUERY, *jar_files[1:]],
+                                         stdout="ERICtwo_CXP2 1.0.3\nERICthree_CXP3 1.0.3\n")
+        get_rpm_owners(jar_files[:2])
+        os.utime(jar_files[1], (0, 0))
+
+        assert get_rpm_owners(jar_files) == {
+            jar_files[0]: ("ERICone_CXP1", "1.0.1"),
+            jar_files[1]: ("ERICtwo_CXP2", "1.0.3"),
+            jar_files[2]: ("ERICthree_CXP3", "1.0.3")
+        }
+        assert fake_process.call_count([*RPM_OWNER_QUERY, *jar_files[:2]]) == 1
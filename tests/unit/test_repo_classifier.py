@@ -0,0 +1,116 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+from unittest import mock
+
+import pytest
+
+import repo_classifier
+from repo_classifier import ModelCategory, RepoClassifier, RepoIndexTool, classify_repo, \
+    get_model_categories, load_index, write_index
+from rpm_factory import write_rpm
+
+INSTALL_JAR = "/var/opt/ericsson/ERICmodeldeployment/data/install/model.jar"
+POST_INSTALL_JAR = "/var/opt/ericsson/ERICmodeldeployment/data/post_install/model.jar"
+
+
+@pytest.fixture
+def test_index_path(tmp_path):
+    """
+    :return: path of a test classification index
+    """
+    return str(tmp_path.joinpath("index.json"))
+
+
+@pytest.fixture
+def test_repo(tmp_path):
+    """
+    Creates a repo cache with one RPM of each model category and one non model RPM
+
+    :return: path of the repo cache
+    """
+    repo_path = tmp_path.joinpath("repo")
+    repo_path.mkdir()
+    write_rpm(repo_path, "ERICnodemodelrpm_CX1234567", "1.0.1", [INSTALL_JAR])
+    write_rpm(repo_path, "ERICpostinstallrpm_CX1234567", "1.0.1", [POST_INSTALL_JAR])
+    write_rpm(repo_path, "ERICservicemodelrpm_CX1234567", "1.0.1", [INSTALL_JAR])
+    write_rpm(repo_path, "ERICnotamodelrpm_CX1234567", "1.0.1", ["/opt/ericsson/file.txt"])
+    return str(repo_path)
+
+
+class TestRepoClassifier:
+    """
+    Test class for script `repo_classifier`.
+    """
+
+    def test_classify_all_categories_in_one_pass(self, test_repo):
+        with mock.patch("repo_classifier._read_rpm", wraps=repo_classifier._read_rpm) as read_rpm:
+            classification = RepoClassifier(test_repo).classify()
+
+        assert read_rpm.call_count == 4
+        assert classification.get_rpms("nrm_models") == ["ERICnodemodelrpm_CX1234567"]
+        assert classification.get_rpms("service_models") == ["ERICservicemodelrpm_CX1234567"]
+        assert classification.get_rpms("post_install") == ["ERICpostinstallrpm_CX1234567"]
+
+    def test_classify_custom_category(self, test_repo):
+        categories = get_model_categories()
+        categories["service_only"] = ModelCategory("service_only", "install",
+                                                   lambda name: name.startswith("ERICservice"))
+        classification = RepoClassifier(test_repo, categories).classify()
+
+        assert classification.get_rpms("service_only") == ["ERICservicemodelrpm_CX1234567"]
+        assert classification.get_categories("ERICservicemodelrpm_CX1234567") == \
+            ["service_models", "service_only"]
+
+    def test_classify_repo_scans_once(self, test_repo):
+        with mock.patch("repo_classifier._read_rpm", wraps=repo_classifier._read_rpm) as read_rpm:
+            classify_repo(test_repo)
+            classify_repo(test_repo)
+
+        assert read_rpm.call_count == 4
+
+    def test_write_index_then_classify_reads_no_rpms(self, test_repo, test_index_path):
+        repo_classifier_with_index = RepoClassifier(test_repo, index_path=test_index_path)
+        classification = repo_classifier_with_index.classify()
+        write_index(classification, repo_classifier_with_index.get_category_directory_types(),
+                    test_index_path)
+
+        with mock.patch("repo_classifier._read_rpm") as read_rpm:
+            indexed_classifier = RepoClassifier(test_repo, index_path=test_index_path)
+            indexed_classification = indexed_classifier.classify()
+
+        read_rpm.assert_not_called()
+        assert indexed_classifier.reused_count == 4
+        assert indexed_classification.get_rpms("nrm_models") == ["ERICnodemodelrpm_CX1234567"]
+        assert indexed_classification.rpms[0].version == "1.0.1"
+
+    def test_classify_with_index_rescans_only_stale_and_new_rpms(self, test_repo,
+                                                                 test_index_path, monkeypatch):
+        repo_index_tool = RepoIndexTool()
+        monkeypatch.setattr(repo_index_tool, "_ENM_ISO_REPO_PATH", test_repo)
+        monkeypatch.setattr(repo_index_tool, "_REPO_INDEX_PATH", test_index_path)
+        repo_index_tool.build_index()
+
+        write_rpm(test_repo, "ERICnodemodelrpm_CX1234567", "1.0.1", [POST_INSTALL_JAR],
+                  payload=b"changed")
+        write_rpm(test_repo, "ERICnewnodemodelrpm_CX1234567", "1.0.2", [INSTALL_JAR])
+
+        indexed_classifier = RepoClassifier(test_repo, index_path=test_index_path)
+        classification = indexed_classifier.classify()
+
+        assert indexed_classifier.scanned_count == 2
+        assert indexed_classifier.reused_count == 3
+        assert classification.get_rpms("nrm_models") == ["ERICnewnodemodelrpm_CX1234567"]
+        assert "ERICnodemodelrpm_CX1234567" in classification.get_rpms("post_install")
+
+    def test_load_index_when_missing_or_invalid_then_empty(self, test_index_path):
+        assert load_index(test_index_path, ["install"]) == {}
+
+        with open(test_index_path, "w") as index_file:
+            index_file.write("{not json")
+        assert load_index(test_index_path, ["install"]) == {}
@@ -0,0 +1,123 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import gzip
+
+import pytest
+
+from repo_metadata import RepoMetadataError, compare_versions, get_metadata_path, \
+    read_package_file_lists, read_package_versions
+
+REPOMD = """<?xml version="1.0" encoding="UTF-8"?>
+<repomd xmlns="http://linux.duke.edu/metadata/repo">
+  <data type="primary"><location href="repodata/primary.xml"/></data>
+  <data type="filelists"><location href="repodata/{filelists}"/></data>
+</repomd>
+"""
+FILELISTS = """<?xml version="1.0" encoding="UTF-8"?>
+<filelists xmlns="http://linux.duke.edu/metadata/filelists" packages="3">
+  <package pkgid="1" name="ERICnodemodelrpm_CX1" arch="noarch">
+    <version epoch="0" ver="1.0.0" rel="1"/>
+    <file>/var/opt/ericsson/ERICmodeldeployment/data/install/nodemodel.jar</file>
+  </package>
+  <package pkgid="2" name="ERICnodemodelrpm_CX1" arch="noarch">
+    <version epoch="0" ver="1.0.1" rel="1"/>
+    <file>/var/opt/ericsson/ERICmodeldeployment/data/install/nodemodel-1.jar</file>
+  </package>
+  <package pkgid="3" name="ERICpostinstallrpm_CX1" arch="noarch">
+    <version epoch="0" ver="1.0.0" rel="1"/>
+    <file type="dir">/var/opt/ericsson/ERICmodeldeployment/data/post_install</file>
+  </package>
+</filelists>
+"""
+
+PRIMARY = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" packages="3">
+  <package type="rpm"><name>ERICnodemodelrpm_CX1</name><version epoch="0" ver="1.0.10" rel="1"/>
+  </package>
+  <package type="rpm"><name>ERICnodemodelrpm_CX1</name><version epoch="0" ver="1.0.9" rel="2"/>
+  </package>
+  <package type="rpm"><name>ERICpostinstallrpm_CX1</name><version epoch="0" ver="2.0.0" rel="1"/>
+  </package>
+</metadata>
+"""
+
+
+def write_repo_metadata(repo_metadata_path, filelists_name="filelists.xml.gz"):
+    """
+    Writes the repodata of a test repository
+
+    :return: the path of the repository metadata
+    """
+    repodata = repo_metadata_path.joinpath("repodata")
+    repodata.mkdir(parents=True)
+    repodata.joinpath("repomd.xml").write_text(REPOMD.format(filelists=filelists_name))
+    repodata.joinpath("primary.xml").write_text(PRIMARY)
+    if filelists_name.endswith(".gz"):
+        with gzip.open(str(repodata.joinpath(filelists_name)), "wt") as filelists_file:
+            filelists_file.write(FILELISTS)
+    else:
+        repodata.joinpath(filelists_name).write_text(FILELISTS)
+    return repo_metadata_path
+
+
+class TestRepoMetadata:
+    """
+    Test class for script `repo_metadata`.
+    """
+
+    @pytest.mark.parametrize("filelists_name", ["filelists.xml.gz", "filelists.xml"])
+    def test_read_package_file_lists(self, tmp_path, filelists_name):
+        write_repo_metadata(tmp_path, filelists_name)
+
+        assert read_package_file_lists(str(tmp_path)) == {
+            "ERICnodemodelrpm_CX1": [
+                "/var/opt/ericsson/ERICmodeldeployment/data/install/nodemodel.jar",
+                "/var/opt/ericsson/ERICmodeldeployment/data/install/nodemodel-1.jar"],
+            "ERICpostinstallrpm_CX1": ["/var/opt/ericsson/ERICmodeldeployment/data/post_install"]
+        }
+
+    def test_read_package_file_lists_of_selected_packages(self, tmp_path):
+        write_repo_metadata(tmp_path)
+
+        assert list(read_package_file_lists(str(tmp_path), {"ERICpostinstallrpm_CX1"})) == \
+            ["ERICpostinstallrpm_CX1"]
+
+    def test_get_metadata_path(self, tmp_path):
+        write_repo_metadata(tmp_path)
+
+        assert get_metadata_path(str(tmp_path), "filelists") == \
+            str(tmp_path.joinpath("repodata", "filelists.xml.gz"))
+
+    def test_get_metadata_path_when_no_metadata_raise_error(self, tmp_path):
+        with pytest.raises(RepoMetadataError):
+            get_metadata_path(str(tmp_path), "filelists")
+
+    @pytest.mark.parametrize("filelists_name", ["filelists.xml.zst", "missing.xml.gz"])
+    def test_read_package_file_lists_when_unreadable_raise_error(self, tmp_path, filelists_name):
+        repodata = tmp_path.joinpath("repodata")
+        repodata.mkdir()
+        repodata.joinpath("repomd.xml").write_text(REPOMD.format(filelists=filelists_name))
+
+        with pytest.raises(RepoMetadataError):
+            read_package_file_lists(str(tmp_path))
+
+    def test_read_package_versions_returns_latest_version(self, tmp_path):
+        write_repo_metadata(tmp_path)
+
+        assert read_package_versions(str(tmp_path)) == {"ERICnodemodelrpm_CX1": "1.0.10-1",
+                                                        "ERICpostinstallrpm_CX1": "2.0.0-1"}
+
+    @pytest.mark.parametrize("first, second, expected", [
+        ("1.0.0-1", "1.0.0-1", 0), ("1.0.10-1", "1.0.9-1", 1), ("1.0.0-1", "1.0.0-2", -1),
+        ("1.0.01-1", "1.0.1-1", 0), ("1.0.0a-1", "1.0.0-1", 1), ("1.0.0~rc1-1", "1.0.0-1", -1),
+        ("1.0a-1", "1.0.1-1", -1)])
+    def test_compare_versions(self, first, second, expected):
+        result = compare_versions(first, second)
+
+        assert (result > 0) - (result < 0) == expected
@@ -0,0 +1,130 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import logging
+from unittest import mock
+
+import pytest
+
+from retry_policy import FATAL, RETRYABLE, FailureClassifier, RetryError, RetryPolicy, \
+    run_with_retry
+
+TEST_COMMAND = ["java", "-cp", "lib/*", "MainClass", "models"]
+TEST_LOGGER = logging.getLogger("TestRetryPolicy")
+
+
+@pytest.fixture
+def no_sleep():
+    """
+    Replaces time.sleep so that retries do not wait
+
+    :return: the time.sleep mock
+    """
+    with mock.patch("time.sleep", return_value=None) as sleep:
+        yield sleep
+
+
+def register_attempts(fake_process, *attempts):
+    """
+    Registers one fake process per (returncode, stderr) attempt, in order
+    """
+    for returncode, stderr in attempts:
+        fake_process.register_subprocess(TEST_COMMAND, returncode=returncode, stderr=stderr)
+
+
+class TestRetryPolicy:
+    """
+    Test class for script `retry_policy`.
+    """
+
+    def test_run_with_retry_success_first_attempt_does_not_sleep(self, fake_process, no_sleep):
+        register_attempts(fake_process, (0, ""))
+        assert run_with_retry(TEST_COMMAND, RetryPolicy(), TEST_LOGGER) == 1
+        no_sleep.assert_not_called()
+
+    def test_run_with_retry_retries_until_success(self, fake_process, no_sleep):
+        register_attempts(fake_process, (1, "java.rmi.ConnectException: refused"),
+                          (1, "java.net.SocketTimeoutException: Read timed out"), (0, ""))
+        policy = RetryPolicy(initial_delay=1, multiplier=2, jitter=0)
+
+        assert run_with_retry(TEST_COMMAND, policy, TEST_LOGGER) == 3
+        assert [call.args[0] for call in no_sleep.call_args_list] == [1, 2]
+
+    @pytest.mark.parametrize("returncode,stderr", [
+        (127, ""),
+        (1, "Error: Could not find or load main class MainClass"),
+        (1, "unknown failure")
+    ])
+    def test_run_with_retry_fatal_failure_raise_retry_error(self, fake_process, no_sleep,
+                                                            returncode, stderr):
+        register_attempts(fake_process, (returncode, stderr))
+        with pytest.raises(RetryError) as error:
+            run_with_retry(TEST_COMMAND, RetryPolicy(), TEST_LOGGER)
+        assert error.value.returncode == returncode
+        no_sleep.assert_not_called()
+
+    def test_run_with_retry_max_attempts_raise_retry_error(self, fake_process, no_sleep):
+        register_attempts(fake_process, (1, "Connection refused"))
+        with pytest.raises(RetryError) as error:
+            run_with_retry(TEST_COMMAND, RetryPolicy(max_attempts=3), TEST_LOGGER)
+        assert "after 3 attempts" in error.value.args[0]
+        assert error.value.attempts == 3
+        assert no_sleep.call_count == 2
+
+    def test_run_with_retry_deadline_raise_retry_error(self, fake_process, no_sleep):
+        register_attempts(fake_process, (1, "Connection refused"))
+        policy = RetryPolicy(max_attempts=0, initial_delay=10, jitter=0, deadline=15)
+        with pytest.raises(RetryError) as error:
+            run_with_retry(TEST_COMMAND, policy, TEST_LOGGER)
+        assert "deadline" in error.value.args[0]
+
+    def test_run_with_retry_attempt_timeout_is_retried(self, no_sleep):
+        policy = RetryPolicy(max_attempts=2, attempt_timeout=0.2)
+        with pytest.raises(RetryError) as error:
+            run_with_retry(["sleep", "10"], policy, TEST_LOGGER)
+        assert error.value.returncode == 124
+        assert error.value.attempts == 2
+
+    def test_get_delay_is_exponential_bounded_and_jittered(self):
+        policy = RetryPolicy(initial_delay=2, multiplier=3, max_delay=10, jitter=0.5)
+        assert 1 <= policy.get_delay(1) <= 3
+        assert 3 <= policy.get_delay(2) <= 9
+        assert 5 <= policy.get_delay(5) <= 15
+
+    def test_from_env(self, monkeypatch):
+        monkeypatch.setenv("MDC_RETRY_MAX_ATTEMPTS", "4")
+        monkeypatch.setenv("MDC_RETRY_INITIAL_DELAY", "0.5")
+        monkeypatch.setenv("MDC_RETRY_DEADLINE", "0")
+        monkeypatch.setenv("MDC_RETRY_ATTEMPT_TIMEOUT", "30")
+        policy = RetryPolicy.from_env(max_delay=7)
+
+        assert policy.max_attempts == 4
+        assert policy.initial_delay == 0.5
+        assert policy.max_delay == 7
+        assert policy.deadline is None
+        assert policy.attempt_timeout == 30
+
+    def test_from_env_when_invalid_raise_value_error(self, monkeypatch):
+        monkeypatch.setenv("MDC_RETRY_JITTER", "lots")
+        with pytest.raises(ValueError):
+            RetryPolicy.from_env()
+
+    @pytest.mark.parametrize("returncode,stderr,expected", [
+        (126, "ConnectException", FATAL),
+        (1, "NoClassDefFoundError then ConnectException", RETRYABLE),
+        (1, "java.lang.NoClassDefFoundError", FATAL),
+        (124, "", RETRYABLE),
+        (1, "", FATAL)
+    ])
+    def test_failure_classifier(self, returncode, stderr, expected):
+        assert FailureClassifier().classify(returncode, stderr) == expected
+
+    def test_failure_classifier_unclassified_retryable(self):
+        classifier = FailureClassifier(unclassified=RETRYABLE)
+        assert classifier.classify(1, "") == RETRYABLE
+        assert classifier.classify(127, "") == FATAL
@@ -0,0 +1,85 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import os
+
+import pytest
+
+from rpm_factory import build_rpm, write_rpm
+from rpm_header import RpmHeaderError, get_rpm_file_names, is_rpm_complete, read_rpm_header
+
+TEST_RPM_NAME = "ERICnodemodelrpm_CX1234567"
+TEST_RPM_VERSION = "1.0.1"
+TEST_FILE_NAMES = [
+    "/var/opt/ericsson/ERICmodeldeployment/data/install/models-0.jar",
+    "/var/opt/ericsson/ERICmodeldeployment/data/install/models-1.jar",
+    "/opt/ericsson/other/readme.txt"
+]
+
+
+@pytest.fixture
+def test_rpm_path(tmp_path):
+    """
+    Writes a valid test RPM
+
+    :return: path of the test RPM
+    """
+    return write_rpm(tmp_path, TEST_RPM_NAME, TEST_RPM_VERSION, TEST_FILE_NAMES,
+                     payload=b'payload is never read')
+
+
+class TestRpmHeader:
+    """
+    Test class for script `rpm_header`.
+    """
+
+    def test_read_rpm_header_success(self, test_rpm_path):
+        header = read_rpm_header(test_rpm_path)
+
+        assert header.name == TEST_RPM_NAME
+        assert header.version == TEST_RPM_VERSION
+        assert header.release == "1"
+        assert header.arch == "noarch"
+        assert header.file_names == TEST_FILE_NAMES
+
+    def test_read_rpm_header_no_files_success(self, tmp_path):
+        rpm_path = write_rpm(tmp_path, TEST_RPM_NAME, TEST_RPM_VERSION, [])
+        assert read_rpm_header(rpm_path).file_names == []
+
+    def test_read_rpm_header_when_empty_file_raise_error(self, tmp_path):
+        rpm_path = tmp_path.joinpath("empty.rpm")
+        rpm_path.touch()
+        with pytest.raises(RpmHeaderError):
+            read_rpm_header(str(rpm_path))
+
+    def test_read_rpm_header_when_not_rpm_raise_error(self, tmp_path):
+        rpm_path = tmp_path.joinpath("not_an.rpm")
+        rpm_path.write_bytes(b"x" * 200)
+        with pytest.raises(RpmHeaderError) as error:
+            read_rpm_header(str(rpm_path))
+        assert "is not an RPM package" in error.value.args[0]
+
+    def test_read_rpm_header_when_truncated_raise_error(self, tmp_path):
+        rpm_path = tmp_path.joinpath("truncated.rpm")
+        rpm_path.write_bytes(build_rpm(TEST_RPM_NAME, TEST_RPM_VERSION, TEST_FILE_NAMES)[:150])
+        with pytest.raises(RpmHeaderError):
+            read_rpm_header(str(rpm_path))
+
+    def test_get_rpm_file_names_success(self, test_rpm_path):
+        assert get_rpm_file_names(test_rpm_path) == TEST_FILE_NAMES
+
+    def test_get_rpm_file_names_when_invalid_then_none(self, tmp_path):
+        assert get_rpm_file_names(str(tmp_path.joinpath("doesnt_exist.rpm"))) is None
+
+    def test_is_rpm_complete(self, tmp_path):
+        rpm_path = write_rpm(tmp_path, "ERICmodel_CX1", "1.0.0", [], payload=b"payload")
+        assert is_rpm_complete(rpm_path)
+
+        os.truncate(rpm_path, os.path.getsize(rpm_path) - 1)
+        assert not is_rpm_complete(rpm_path)
+        assert not is_rpm_complete(str(tmp_path.joinpath("missing.rpm")))
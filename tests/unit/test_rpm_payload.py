@@ -0,0 +1,93 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import gzip
+import io
+
+import pytest
+
+from rpm_factory import build_cpio, write_rpm
+from rpm_payload import RpmPayloadError, extract_cpio_files, extract_rpm_files
+
+TEST_RPM_NAME = "ERICnodemodelrpm_CX1234567"
+TEST_RPM_VERSION = "1.0.1"
+MODEL_DIRECTORY = "/var/opt/ericsson/ERICmodeldeployment/data/install"
+TEST_FILE_NAMES = [
+    MODEL_DIRECTORY + "/models-0.jar",
+    MODEL_DIRECTORY + "/models-1.jar",
+    MODEL_DIRECTORY + "/nested/models-2.jar",
+    "/opt/ericsson/other/readme.txt"
+]
+
+
+class TestRpmPayload:
+    """
+    Test class for script `rpm_payload`.
+    """
+
+    @pytest.mark.parametrize("compressor", ["gzip", "bzip2", "xz", "lzma"])
+    def test_extract_rpm_files_writes_files_of_model_directory(self, tmp_path, compressor):
+        rpm_path = write_rpm(tmp_path, TEST_RPM_NAME, TEST_RPM_VERSION, TEST_FILE_NAMES,
+                             payload=b"jar content", payload_compressor=compressor)
+        target_root = tmp_path.joinpath("toBeInstalled")
+
+        extracted_rpm = extract_rpm_files(rpm_path, MODEL_DIRECTORY + "/", str(target_root))
+
+        target_directory = target_root.joinpath(TEST_RPM_NAME, TEST_RPM_VERSION)
+        assert extracted_rpm.name == TEST_RPM_NAME
+        assert extracted_rpm.version == TEST_RPM_VERSION
+        assert extracted_rpm.file_paths == [str(target_directory.joinpath("models-0.jar")),
+                                            str(target_directory.joinpath("models-1.jar"))]
+        assert sorted(path.name for path in target_directory.iterdir()) == \
+            ["models-0.jar", "models-1.jar"]
+        assert target_directory.joinpath("models-0.jar").read_bytes() == b"jar content"
+        assert target_directory.joinpath("models-0.jar").stat().st_mtime == 1600000000
+
+    def test_extract_rpm_files_given_zstd_payload_raise_payload_error(self, tmp_path):
+        rpm_path = write_rpm(tmp_path, TEST_RPM_NAME, TEST_RPM_VERSION, TEST_FILE_NAMES,
+                             payload_compressor="zstd")
+
+        with pytest.raises(RpmPayloadError) as error:
+            extract_rpm_files(rpm_path, MODEL_DIRECTORY, str(tmp_path.joinpath("target")))
+
+        assert "Unsupported payload compressor zstd" in error.value.args[0]
+        assert not tmp_path.joinpath("target").exists()
+
+    def test_extract_rpm_files_given_truncated_payload_remove_written_files(self, tmp_path):
+        rpm_path = write_rpm(tmp_path, TEST_RPM_NAME, TEST_RPM_VERSION, TEST_FILE_NAMES,
+                             payload=b"jar content", payload_compressor="gzip")
+        with open(rpm_path, "r+b") as rpm_file:
+            rpm_file.truncate(len(rpm_file.read()) - 20)
+        target_root = tmp_path.joinpath("toBeInstalled")
+
+        with pytest.raises(RpmPayloadError):
+            extract_rpm_files(rpm_path, MODEL_DIRECTORY, str(target_root))
+
+        assert list(target_root.joinpath(TEST_RPM_NAME, TEST_RPM_VERSION).iterdir()) == []
+
+    def test_extract_cpio_files_writes_every_hard_link(self, tmp_path):
+        archive = build_cpio([("/install/first.jar", b"", 7, 3),
+                              ("/install/skipped.jar", b"", 7, 3),
+                              ("/install/last.jar", b"shared content", 7, 3),
+                              ("/install/empty.jar", b"", 8, 2),
+                              ("/install/empty-link.jar", b"", 8, 2)])
+
+        written_paths = extract_cpio_files(
+            io.BytesIO(archive),
+            lambda name: None if "skipped" in name else str(tmp_path.joinpath(name[9:])))
+
+        assert sorted(written_paths) == sorted(str(tmp_path.joinpath(name)) for name in [
+            "first.jar", "last.jar", "empty.jar", "empty-link.jar"])
+        assert tmp_path.joinpath("first.jar").read_bytes() == b"shared content"
+        assert tmp_path.joinpath("last.jar").read_bytes() == b"shared content"
+        assert tmp_path.joinpath("empty-link.jar").read_bytes() == b""
+
+    def test_extract_cpio_files_given_unknown_format_raise_payload_error(self):
+        with pytest.raises(RpmPayloadError):
+            extract_cpio_files(io.BytesIO(gzip.compress(b"not a cpio archive" * 10)),
+                               lambda name: None)
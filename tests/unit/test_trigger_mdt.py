@@ -7,15 +7,19 @@ conditions stipulated in the agreement/contract under which the
 program(s) have been supplied.
 """
 from unittest import mock
-from os import path
+from os import path, stat
 
 import pytest
 
-from trigger_mdt import MdtTool
+import trigger_mdt
+from retry_policy import RetryError
+from trigger_mdt import DeployedPackage, MdtTool, get_model_packages, \
+    load_deployment_record, write_deployment_record
 
 TEST_SERVICE_FILE_PATH = "temp/test_service_file_path"
 MDC_CLASSPATH = 'opt/ericsson/ERICmodeldeploymentclient/lib/*'
-MDC_MAINCLASS = 'com.ericsson.oss.itpf.modeling.model.deployment.client.main.ModelDeploymentClientStart'
+MDC_MAINCLASS = 'com.ericsson.oss.itpf.modeling.model.deployment.client.main.' \
+                'ModelDeploymentClientStart'
 MODELLING_MOUNT_POINT = 'etc/opt/ericsson/ERICmodeldeployment/'
 MODEL_DEPLOYMENT_SERVICE_FILE = MODELLING_MOUNT_POINT + 'data/ModelDeploymentService'
 MDT_MODELS_DIR = MODELLING_MOUNT_POINT + "data/execution/toBeInstalled/model_type/timestamp"
@@ -103,21 +107,51 @@ def test_mdt_tool(monkeypatch, tmp_path):
     """
     mdt_tool = MdtTool()
     monkeypatch.setattr(mdt_tool, "_MDC_CLASSPATH", str(tmp_path.joinpath(MDC_CLASSPATH)))
-    monkeypatch.setattr(mdt_tool, "_MODELLING_MOUNT_POINT", str(tmp_path.joinpath(MODELLING_MOUNT_POINT)))
+    monkeypatch.setattr(mdt_tool, "_MODELLING_MOUNT_POINT",
+                        str(tmp_path.joinpath(MODELLING_MOUNT_POINT)))
     monkeypatch.setattr(mdt_tool, "_MODEL_DEPLOYMENT_SERVICE_FILE",
                         str(tmp_path.joinpath(MODEL_DEPLOYMENT_SERVICE_FILE)))
     monkeypatch.setattr(mdt_tool, "_SLEEP_INTERVAL", 0)
     return mdt_tool
 
 
+@pytest.fixture
+def setup_delta_deployment(tmp_path, monkeypatch, fake_process, test_mdt_tool):
+    """
+    Creates a local to be installed directory with 2 rpms, the ModelDeploymentService file
+    and a fake java subprocess for any staging directory
+
+    :return: the local to be installed directory
+    """
+    local_to_be_installed_dir = tmp_path.joinpath("local", "toBeInstalled")
+    for rpm_dir in ("ERICnodemodelrpm_CX1234567/1.0.1", "ERICnodemodelcommonrpm_CX1234567/1.0.1"):
+        local_to_be_installed_dir.joinpath(rpm_dir).mkdir(parents=True)
+        local_to_be_installed_dir.joinpath(rpm_dir, TO_BE_INSTALLED_JAR).write_text(rpm_dir)
+    tmp_path.joinpath(MODEL_DEPLOYMENT_SERVICE_FILE).mkdir(parents=True)
+    monkeypatch.setattr(test_mdt_tool, "_LOCAL_TO_BE_INSTALLED_DIR", str(local_to_be_installed_dir))
+    monkeypatch.setenv("MODELS_TYPE", "model_type")
+    fake_process.register_subprocess(['java', '-cp', str(tmp_path.joinpath(MDC_CLASSPATH)),
+                                      MDC_MAINCLASS, fake_process.any()], returncode=0,
+                                     occurrences=10)
+    return local_to_be_installed_dir
+
+
+def get_staged_package_directories(copy_model_jars_to_mdt_mount):
+    """
+    :return: the package directories each call of the mocked copy was restricted to
+    """
+    return [call[0][2] if len(call[0]) > 2 else None
+            for call in copy_model_jars_to_mdt_mount.call_args_list]
+
+
 class TestTriggerMdt:
     """
     Test class for script trigger_mdt
     """
 
     def test_copy_model_jars_to_model_mount_success(self, test_to_be_installed_dir,
-                                                    setup_test_to_be_installed_directory, test_mdt_models_dir,
-                                                    test_mdt_tool):
+                                                    setup_test_to_be_installed_directory,
+                                                    test_mdt_models_dir, test_mdt_tool):
         assert not path.exists(test_mdt_models_dir)
         jar1 = test_mdt_models_dir.joinpath(TO_BE_INSTALLED_RPM_1_DIR).joinpath(TO_BE_INSTALLED_JAR)
         jar2 = test_mdt_models_dir.joinpath(TO_BE_INSTALLED_RPM_2_DIR).joinpath(TO_BE_INSTALLED_JAR)
@@ -128,17 +162,30 @@ class TestTriggerMdt:
         assert path.exists(jar1)
         assert path.exists(jar2)
 
-    def test_copy_model_jars_to_mdt_mount_when_oserror_then_system_exit(self, test_to_be_installed_dir,
-                                                                        test_mdt_models_dir, test_mdt_tool):
-        with mock.patch('shutil.copytree', side_effect=OSError("OSError: Copy Failed")):
+    def test_copy_model_jars_to_mdt_mount_when_jar_store_enabled_then_hard_link(
+            self, test_to_be_installed_dir, setup_test_to_be_installed_directory,
+            test_mdt_models_dir, test_mdt_tool, monkeypatch):
+        jar = test_mdt_models_dir.joinpath(TO_BE_INSTALLED_RPM_1_DIR).joinpath(TO_BE_INSTALLED_JAR)
+
+        test_mdt_tool._copy_model_jars_to_mdt_mount(test_to_be_installed_dir, test_mdt_models_dir)
+        assert stat(jar).st_nlink == 1
+
+        monkeypatch.setenv("MDT_JAR_STORE", "true")
+        test_mdt_tool._copy_model_jars_to_mdt_mount(test_to_be_installed_dir, test_mdt_models_dir)
+        assert stat(jar).st_nlink > 1
+
+    def test_copy_model_jars_to_mdt_mount_when_oserror_then_system_exit(
+            self, test_to_be_installed_dir, test_mdt_models_dir, test_mdt_tool):
+        with mock.patch('copy_engine.ParallelCopier.copy_file',
+                        side_effect=OSError("OSError: Copy Failed")):
             with pytest.raises(SystemExit) as exit_after_copy_error:
-                test_mdt_tool._copy_model_jars_to_mdt_mount(test_to_be_installed_dir, test_mdt_models_dir)
+                test_mdt_tool._copy_model_jars_to_mdt_mount(test_to_be_installed_dir,
+                                                            test_mdt_models_dir)
             assert exit_after_copy_error
 
-    def test_copy_twice_no_errors_cleanup_removes_all_timestamp_dirs(self, test_to_be_installed_dir,
-                                                                     setup_test_to_be_installed_directory,
-                                                                     test_mdt_models_dir, test_mdt_models_dir2,
-                                                                     test_mdt_tool):
+    def test_copy_twice_no_errors_cleanup_removes_all_timestamp_dirs(
+            self, test_to_be_installed_dir, setup_test_to_be_installed_directory,
+            test_mdt_models_dir, test_mdt_models_dir2, test_mdt_tool):
         test_mdt_tool._copy_model_jars_to_mdt_mount(test_to_be_installed_dir, test_mdt_models_dir)
         test_mdt_tool._copy_model_jars_to_mdt_mount(test_to_be_installed_dir, test_mdt_models_dir2)
 
@@ -151,15 +198,48 @@ class TestTriggerMdt:
         assert not path.exists(test_mdt_models_dir)
         assert not path.exists(path.dirname(test_mdt_models_dir))
 
-    def test_wait_for_model_deployment_service_file_success(self, test_service_file_path, test_mdt_tool):
+    def test_get_mdt_models_dir_reuses_incomplete_staging_dir(self, test_mdt_models_dir,
+                                                               test_mdt_models_dir2, test_mdt_tool,
+                                                               monkeypatch):
+        to_be_installed_dir = path.dirname(test_mdt_models_dir)
+        assert test_mdt_tool._get_mdt_models_dir(to_be_installed_dir, "now") == \
+            to_be_installed_dir + "/now"
+
+        test_mdt_models_dir.mkdir(parents=True)
+        test_mdt_models_dir2.mkdir(parents=True)
+        assert test_mdt_tool._get_mdt_models_dir(to_be_installed_dir, "now") == \
+            to_be_installed_dir + "/now"
+
+        monkeypatch.setenv("MDT_COPY_RESUME", "true")
+        assert test_mdt_tool._get_mdt_models_dir(to_be_installed_dir, "now") == \
+            str(test_mdt_models_dir2)
+
+    def test_wait_for_model_deployment_service_file_success(self, test_service_file_path,
+                                                            test_mdt_tool):
         test_service_file_path.mkdir(parents=True)
         test_mdt_tool._wait_for_model_deployment_service_file(test_service_file_path)
 
-    def test_invoke_mdt_via_model_deployment_client_success(self, override_java_command, test_mdt_tool):
+    def test_wait_for_model_deployment_service_file_when_timeout_then_system_exit(
+            self, test_service_file_path, test_mdt_tool, monkeypatch):
+        monkeypatch.setenv("MDT_SERVICE_FILE_TIMEOUT", "0.1")
+        with pytest.raises(SystemExit) as error:
+            test_mdt_tool._wait_for_model_deployment_service_file(test_service_file_path)
+        assert error.value.code == 2
+
+    def test_wait_for_model_deployment_service_file_when_invalid_timeout_then_system_exit(
+            self, test_service_file_path, test_mdt_tool, monkeypatch):
+        monkeypatch.setenv("MDT_SERVICE_FILE_TIMEOUT", "one hour")
+        with pytest.raises(SystemExit) as error:
+            test_mdt_tool._wait_for_model_deployment_service_file(test_service_file_path)
+        assert error.value.code == 2
+
+    def test_invoke_mdt_via_model_deployment_client_success(self, override_java_command,
+                                                            test_mdt_tool):
         with mock.patch("time.sleep", return_value=None):
             test_mdt_tool._invoke_mdt_via_model_deployment_client("test")
 
-    def test_clean_up_old_model_jars_success(self, tmp_path, test_mdt_tool, test_to_be_installed_dir,
+    def test_clean_up_old_model_jars_success(self, tmp_path, test_mdt_tool,
+                                             test_to_be_installed_dir,
                                              setup_test_to_be_installed_directory):
         assert path.exists(test_to_be_installed_dir)
         test_mdt_tool._clean_up_old_model_jars(test_to_be_installed_dir)
@@ -172,3 +252,86 @@ class TestTriggerMdt:
             with pytest.raises(SystemExit) as error:
                 test_mdt_tool._clean_up_old_model_jars(test_to_be_installed_dir)
             assert error
+
+    def test_write_deployment_record_then_load_same_packages(
+            self, tmp_path, test_to_be_installed_dir, setup_test_to_be_installed_directory):
+        record_path = str(tmp_path.joinpath("records", "model_type.json"))
+        packages = get_model_packages(
+            str(test_to_be_installed_dir.joinpath(TEST_TO_BE_INSTALLED_DIR)))
+
+        write_deployment_record(record_path, packages.values())
+
+        assert sorted(packages) == ["ERICnodemodelcommonrpm_CX1234567/1.0.1",
+                                    "ERICnodemodelrpm_CX1234567/1.0.1"]
+        assert load_deployment_record(record_path) == packages
+
+    @pytest.mark.parametrize("record", ["", "{}", '{"version": 0, "packages": []}',
+                                        '{"version": 1, "packages": [{"name": "rpm"}]}'])
+    def test_load_deployment_record_given_unreadable_record_return_empty(self, tmp_path, record):
+        tmp_path.joinpath("model_type.json").write_text(record)
+        assert load_deployment_record(str(tmp_path.joinpath("model_type.json"))) == {}
+        assert load_deployment_record(str(tmp_path.joinpath("missing.json"))) == {}
+
+    def test_trigger_mdt_deploys_only_packages_not_deployed_before(self, test_mdt_tool,
+                                                                   setup_delta_deployment,
+                                                                   fake_process):
+        local_to_be_installed_dir = setup_delta_deployment
+        copy = mock.Mock(wraps=test_mdt_tool._copy_model_jars_to_mdt_mount)
+        with mock.patch.object(test_mdt_tool, "_copy_model_jars_to_mdt_mount", copy):
+            test_mdt_tool.trigger_mdt()
+            test_mdt_tool.trigger_mdt()
+            local_to_be_installed_dir.joinpath("ERICnodemodelrpm_CX1234567", "1.0.1").rename(
+                local_to_be_installed_dir.joinpath("ERICnodemodelrpm_CX1234567", "1.0.2"))
+            test_mdt_tool.trigger_mdt()
+
+        assert get_staged_package_directories(copy) == [None, ["ERICnodemodelrpm_CX1234567/1.0.2"]]
+        assert fake_process.call_count(['java', fake_process.any()]) == 2
+        assert sorted(load_deployment_record(test_mdt_tool._get_deployment_record_path(
+            "model_type"))) == ["ERICnodemodelcommonrpm_CX1234567/1.0.1",
+                                "ERICnodemodelrpm_CX1234567/1.0.2"]
+
+    def test_trigger_mdt_given_changed_jar_deploy_package_again(self, test_mdt_tool,
+                                                               setup_delta_deployment):
+        local_to_be_installed_dir = setup_delta_deployment
+        copy = mock.Mock(wraps=test_mdt_tool._copy_model_jars_to_mdt_mount)
+        with mock.patch.object(test_mdt_tool, "_copy_model_jars_to_mdt_mount", copy):
+            test_mdt_tool.trigger_mdt()
+            local_to_be_installed_dir.joinpath("ERICnodemodelcommonrpm_CX1234567", "1.0.1",
+                                               TO_BE_INSTALLED_JAR).write_text("rebuilt jar")
+            test_mdt_tool.trigger_mdt()
+
+        assert get_staged_package_directories(copy) == [
+            None, ["ERICnodemodelcommonrpm_CX1234567/1.0.1"]]
+
+    def test_trigger_mdt_when_mdc_fails_do_not_record_deployment(self, test_mdt_tool,
+                                                                 setup_delta_deployment,
+                                                                 monkeypatch):
+        monkeypatch.setattr(test_mdt_tool, "_invoke_mdt_via_model_deployment_client",
+                            mock.Mock(side_effect=RuntimeError("MDC failed")))
+
+        test_mdt_tool.trigger_mdt()
+
+        assert load_deployment_record(test_mdt_tool._get_deployment_record_path("model_type")) == {}
+
+    def test_trigger_mdt_given_delta_deploy_disabled_deploy_every_package(self, test_mdt_tool,
+                                                                         setup_delta_deployment,
+                                                                         monkeypatch):
+        monkeypatch.setenv("MDT_DELTA_DEPLOY", "false")
+        copy = mock.Mock(wraps=test_mdt_tool._copy_model_jars_to_mdt_mount)
+        with mock.patch.object(test_mdt_tool, "_copy_model_jars_to_mdt_mount", copy):
+            test_mdt_tool.trigger_mdt()
+            test_mdt_tool.trigger_mdt()
+
+        assert get_staged_package_directories(copy) == [None, None]
+
+    def test_trigger_mdt_when_mdc_retries_exhausted_then_system_exit(self, test_mdt_tool,
+                                                                     setup_delta_deployment,
+                                                                     monkeypatch):
+        monkeypatch.setattr(trigger_mdt, "run_with_retry", mock.Mock(
+            side_effect=RetryError("Command failed with exit code 1 after 30 attempts", 1, 30)))
+
+        with pytest.raises(SystemExit) as error:
+            test_mdt_tool.trigger_mdt()
+
+        assert error.value.code == 2
+        assert load_deployment_record(test_mdt_tool._get_deployment_record_path("model_type")) == {}
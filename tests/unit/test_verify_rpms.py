@@ -0,0 +1,139 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import os
+
+import pytest
+
+from download_rpms import RpmDownloadTool
+from rpm_factory import build_rpm, write_rpm
+from verify_rpms import RpmVerifyTool, load_verified_manifest, verify_rpm
+
+TEST_PAYLOAD = b"compressed payload" * 100
+
+
+def corrupt_rpm(rpm_path, offset_from_end):
+    """
+    Flips a byte of an RPM file, counted from its end
+    """
+    with open(rpm_path, "r+b") as rpm_file:
+        rpm_file.seek(-offset_from_end, os.SEEK_END)
+        byte = rpm_file.read(1)
+        rpm_file.seek(-offset_from_end, os.SEEK_END)
+        rpm_file.write(bytes([byte[0] ^ 0xff]))
+
+
+@pytest.fixture
+def test_verify_rpm_tool(monkeypatch, tmp_path):
+    """
+    Create a test verify rpm tool on an empty repo cache
+
+    :return: A test rpm verify tool
+    """
+    repo_path = tmp_path.joinpath("enm_iso_repo")
+    repo_path.mkdir()
+    monkeypatch.setattr(RpmVerifyTool, "_ENM_ISO_REPO_PATH", str(repo_path))
+    monkeypatch.setattr(RpmVerifyTool, "_VERIFIED_MANIFEST_PATH",
+                        str(tmp_path.joinpath("verified.json")))
+    monkeypatch.setattr(RpmDownloadTool, "_ZYPPER_CACHE_PATH", str(repo_path))
+    monkeypatch.setattr(RpmDownloadTool, "_REPO_METADATA_PATH", str(tmp_path.joinpath("raw")))
+    monkeypatch.setenv("MODELS_DOWNLOAD_RETRY_INITIAL_DELAY", "0")
+    return RpmVerifyTool(workers=2)
+
+
+class TestVerifyRPMs:
+    """
+    Test class for script `verify_rpms`.
+    """
+
+    def test_verify_rpm_intact(self, tmp_path):
+        rpm_path = write_rpm(tmp_path, "ERICmodel_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+
+        assert verify_rpm(rpm_path) is None
+
+    @pytest.mark.parametrize("offset_from_end, expected_error", [
+        (1, "header and payload md5 digest mismatch"),
+        (len(TEST_PAYLOAD) + 10, "header sha256 digest mismatch")])
+    def test_verify_rpm_corrupt(self, tmp_path, offset_from_end, expected_error):
+        rpm_path = write_rpm(tmp_path, "ERICmodel_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+        corrupt_rpm(rpm_path, offset_from_end)
+
+        assert verify_rpm(rpm_path) == expected_error
+
+    def test_verify_rpm_truncated(self, tmp_path):
+        rpm_path = write_rpm(tmp_path, "ERICmodel_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+        os.truncate(rpm_path, os.path.getsize(rpm_path) - 1)
+
+        assert verify_rpm(rpm_path) == "size mismatch"
+
+    def test_verify_rpm_without_digests(self, tmp_path):
+        rpm_path = tmp_path.joinpath("ERICmodel_CX1-1.0.0-1.noarch.rpm")
+        rpm_path.write_bytes(build_rpm("ERICmodel_CX1", "1.0.0", [], digests=False))
+
+        assert verify_rpm(str(rpm_path)) == "no digest recorded"
+
+    def test_verify_rpm_not_an_rpm(self, tmp_path):
+        rpm_path = tmp_path.joinpath("corrupt.rpm")
+        rpm_path.write_bytes(b"not an rpm")
+
+        assert verify_rpm(str(rpm_path)).startswith("unreadable")
+
+    def test_verify_cache_writes_manifest_and_skips_verified_rpms(self, test_verify_rpm_tool,
+                                                                  monkeypatch):
+        repo_path = test_verify_rpm_tool._ENM_ISO_REPO_PATH
+        write_rpm(repo_path, "ERICgood_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+        bad_rpm = write_rpm(repo_path, "ERICbad_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+        corrupt_rpm(bad_rpm, 1)
+
+        assert [rpm.error for rpm in test_verify_rpm_tool.verify_cache()] == \
+            ["header and payload md5 digest mismatch", None]
+        assert list(load_verified_manifest(test_verify_rpm_tool._VERIFIED_MANIFEST_PATH)) == \
+            ["ERICgood_CX1-1.0.0-1.noarch.rpm"]
+
+        verified_files = []
+        monkeypatch.setattr("verify_rpms.verify_rpm",
+                            lambda rpm_path: verified_files.append(rpm_path))
+        test_verify_rpm_tool.verify_cache()
+        assert verified_files == [bad_rpm]
+
+    def test_verify_removes_corrupt_rpms_and_exits(self, test_verify_rpm_tool):
+        bad_rpm = write_rpm(test_verify_rpm_tool._ENM_ISO_REPO_PATH, "ERICbad_CX1", "1.0.0", [],
+                            payload=TEST_PAYLOAD)
+        corrupt_rpm(bad_rpm, 1)
+
+        with pytest.raises(SystemExit):
+            test_verify_rpm_tool.verify()
+        assert not os.path.exists(bad_rpm)
+
+    def test_verify_redownloads_corrupt_rpms(self, test_verify_rpm_tool, fake_process):
+        repo_path = test_verify_rpm_tool._ENM_ISO_REPO_PATH
+        write_rpm(repo_path, "ERICgood_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+        bad_rpm = write_rpm(repo_path, "ERICbad_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+        corrupt_rpm(bad_rpm, 1)
+        command = ["zypper", "in", "--download-only", "-y", "ERICbad_CX1"]
+        fake_process.register_subprocess(
+            command, callback=lambda _: write_rpm(repo_path, "ERICbad_CX1", "1.0.0", [],
+                                                  payload=TEST_PAYLOAD))
+
+        test_verify_rpm_tool.verify(redownload=True)
+
+        assert fake_process.call_count(command) == 1
+        assert verify_rpm(bad_rpm) is None
+
+    def test_verify_when_redownload_still_corrupt_system_exit(self, test_verify_rpm_tool,
+                                                              fake_process):
+        repo_path = test_verify_rpm_tool._ENM_ISO_REPO_PATH
+        bad_rpm = write_rpm(repo_path, "ERICbad_CX1", "1.0.0", [], payload=TEST_PAYLOAD)
+        corrupt_rpm(bad_rpm, 1)
+        fake_process.register_subprocess(
+            ["zypper", "in", "--download-only", "-y", "ERICbad_CX1"],
+            callback=lambda _: corrupt_rpm(write_rpm(repo_path, "ERICbad_CX1", "1.0.0", [],
+                                                     payload=TEST_PAYLOAD), 1))
+
+        with pytest.raises(SystemExit):
+            test_verify_rpm_tool.verify(redownload=True)
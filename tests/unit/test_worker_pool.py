@@ -0,0 +1,73 @@
+"""
+COPYRIGHT Ericsson 2022
+The copyright to the computer program(s) herein is the property of
+Ericsson Inc. The programs may be used and/or copied only with written
+permission from Ericsson Inc. or in accordance with the terms and
+conditions stipulated in the agreement/contract under which the
+program(s) have been supplied.
+"""
+import time
+
+import pytest
+
+import worker_pool
+from worker_pool import get_available_cpus, get_cpu_quota, get_worker_count, map_in_order
+
+
+@pytest.fixture
+def cgroup_v2_cpu_max(tmp_path, monkeypatch):
+    """
+    Overrides the cgroup v2 cpu.max file with a test file
+
+    :return: path of the test cpu.max file
+    """
+    cpu_max = tmp_path.joinpath("cpu.max")
+    monkeypatch.setattr(worker_pool, "_CGROUP_V2_CPU_MAX", str(cpu_max))
+    monkeypatch.setattr(worker_pool, "_CGROUP_V1_CPU_QUOTA", str(tmp_path.joinpath("quota")))
+    monkeypatch.setattr(worker_pool, "_CGROUP_V1_CPU_PERIOD", str(tmp_path.joinpath("period")))
+    return cpu_max
+
+
+class TestWorkerPool:
+    """
+    Test class for script `worker_pool`.
+    """
+
+    def test_get_cpu_quota_from_cgroup_v2(self, cgroup_v2_cpu_max):
+        cgroup_v2_cpu_max.write_text("150000 100000\n")
+        assert get_cpu_quota() == 1.5
+
+    def test_get_cpu_quota_when_unlimited_then_none(self, cgroup_v2_cpu_max):
+        cgroup_v2_cpu_max.write_text("max 100000\n")
+        assert get_cpu_quota() is None
+
+    def test_get_cpu_quota_from_cgroup_v1(self, cgroup_v2_cpu_max, tmp_path):
+        tmp_path.joinpath("quota").write_text("200000")
+        tmp_path.joinpath("period").write_text("100000")
+        assert get_cpu_quota() == 2
+
+    def test_get_available_cpus_limited_by_quota(self, cgroup_v2_cpu_max):
+        cgroup_v2_cpu_max.write_text("50000 100000\n")
+        assert get_available_cpus() == 1
+
+    def test_get_worker_count_from_env(self, monkeypatch):
+        monkeypatch.setenv("MODELS_WORKERS", "3")
+        assert get_worker_count() == 3
+
+    def test_get_worker_count_when_env_invalid_raise_value_error(self, monkeypatch):
+        monkeypatch.setenv("MODELS_WORKERS", "many")
+        with pytest.raises(ValueError):
+            get_worker_count()
+
+    def test_get_worker_count_default(self, monkeypatch):
+        monkeypatch.delenv("MODELS_WORKERS", raising=False)
+        assert get_worker_count(default=2) == 2
+        assert get_worker_count() >= 1
+
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_map_in_order_keeps_item_order(self, workers):
+        def slow_square(item):
+            time.sleep(0.001 * (10 - item))
+            return item * item
+
+        assert map_in_order(slow_square, range(10), workers) == [item * item for item in range(10)]